@@ -3,22 +3,32 @@ import time
 import traceback
 from pathlib import Path
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 import numpy as np
-import cv2
 from deepface import DeepFace
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from logger import setup_logger
-from api.init import model_loader, setup_manager
+from api.init import inference_scheduler, inflight, model_loader, model_registry, quality_gate, setup_manager
+from api.registry import TenantError
+from api.scheduler import SchedulerError
+from api.singleflight import content_key
+from fast_path import FastPathModel
+from api.upload import ImageRejected, decode_upload, read_upload
+from api.faces import embed_faces, face_box, score_embeddings
+from api.embedding_protocol import ProtocolError, decode_embeddings, encode_scores, request_format
 from api.config import (
-    THRESHOLD, MAX_SIZE_MB, ALLOWED_EXTENSIONS, 
+    THRESHOLD, MAX_SIZE_MB, ALLOWED_EXTENSIONS, MAX_CONTENT_LENGTH, MAX_IMAGE_PIXELS,
+    DECODE_TARGET_SIDE, MAX_FACES, MAX_EMBEDDINGS_PER_REQUEST, TENANT_HEADER,
+    PRIORITY_HEADER, DEFAULT_PRIORITY,
     FACENET_MODEL, DEBUG, HOST, PORT, API_VERSION, API_NAME
 )
 
 logger = setup_logger(__name__)
 
 app = Flask(__name__)
+# Werkzeug rechaza con 413 antes de leer el cuerpo si Content-Length lo excede
+app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
 
 def initialize_app():
@@ -74,7 +84,9 @@ def index():
         'endpoints': {
             'info': 'GET /',
             'health': 'GET /healthz',
-            'verify': 'POST /verify'
+            'verify': 'POST /verify',
+            'verify_all_faces': 'POST /verify?faces=all',
+            'verify_embedding': 'POST /verify/embedding'
         }
     }), 200
 
@@ -87,18 +99,69 @@ def healthz():
         'status': 'healthy' if model_loader.is_ready() else 'degraded',
         'model_loaded': model_loader.model_loaded,
         'scaler_loaded': model_loader.scaler_loaded,
-        'ready': model_loader.is_ready()
+        'ready': model_loader.is_ready(),
+        'tenants': model_registry.stats(),
+        'scheduler': inference_scheduler.stats(),
+        'inflight': inflight.stats(),
+        'fast_path': model_loader.model.stats() if isinstance(model_loader.model, FastPathModel) else None,
+        'quality': quality_gate.stats() if quality_gate is not None else None
     }
     
     http_code = 200 if model_loader.is_ready() else 503
     return jsonify(status), http_code
 
 
+def resolve_model():
+    """
+    (modelo, escalador) de la solicitud: el del tenant indicado en la cabecera
+    X-Tenant-Id (o ?tenant=), o el modelo por defecto. (None, None) si el
+    modelo por defecto no está cargado; TenantError si el tenant no es válido.
+    """
+    tenant = request.headers.get(TENANT_HEADER) or request.args.get('tenant')
+    if tenant:
+        return model_registry.get(tenant)
+    if not model_loader.is_ready():
+        return None, None
+    return model_loader.model, model_loader.scaler
+
+
+def request_priority():
+    """Clase de prioridad de la solicitud (cabecera X-Priority, por defecto interactive)"""
+    priority = (request.headers.get(PRIORITY_HEADER) or DEFAULT_PRIORITY).strip().lower()
+    if priority not in inference_scheduler.priorities:
+        raise SchedulerError(
+            f'Unknown priority: {priority!r} (use {", ".join(inference_scheduler.priorities)})', 400
+        )
+    return priority
+
+
+def scheduler_rejection(error, priority):
+    logger.warning("Solicitud %s sin turno de inferencia: %s", priority, error)
+    response = jsonify({'error': str(error), 'priority': priority})
+    if error.status_code == 503:
+        response.headers['Retry-After'] = '1'
+    return response, error.status_code
+
+
+@app.after_request
+def add_queue_wait_header(response):
+    if 'queue_wait_ms' in g:
+        response.headers['X-Queue-Wait-Ms'] = f'{g.queue_wait_ms:.1f}'
+    return response
+
+
 @app.route('/verify', methods=['POST'])
 def verify():
     logger.info("Solicitud POST /verify recibida")
     
-    if not model_loader.is_ready():
+    try:
+        model, scaler = resolve_model()
+        priority = request_priority()
+    except (TenantError, SchedulerError) as e:
+        logger.warning("Solicitud /verify rechazada: %s", e)
+        return jsonify({'error': str(e)}), e.status_code
+    
+    if model is None:
         logger.error("Solicitud /verify rechazada: recursos no cargados")
         return jsonify({
             'error': 'Model not loaded',
@@ -116,68 +179,62 @@ def verify():
         return jsonify({'error': 'No filename provided'}), 400
     
     if '.' not in file.filename:
-        logger.warning(f"Archivo sin extensión: {file.filename}")
+        logger.warning("Archivo sin extensión: %s", file.filename)
         return jsonify({'error': 'File has no extension'}), 400
     
     file_ext = file.filename.rsplit('.', 1)[1].lower()
     if file_ext not in ALLOWED_EXTENSIONS:
-        logger.warning(f"Extensión no permitida: {file_ext}")
+        logger.warning("Extensión no permitida: %s", file_ext)
         return jsonify({
             'error': f'Only {list(ALLOWED_EXTENSIONS)} allowed'
         }), 400
     
     start_time = time.time()
+    all_faces = request.args.get('faces') == 'all'
     
     try:
-        img_bytes = file.read()
-        logger.debug(f"Imagen recibida: {len(img_bytes)} bytes")
+        try:
+            data = read_upload(file.stream, MAX_SIZE_MB * 1024 * 1024)
+            logger.debug("Imagen recibida: %d bytes", len(data))
+        except ImageRejected as e:
+            logger.warning("Imagen rechazada: %s", e)
+            return jsonify({'error': str(e)}), e.status_code
         
-        if len(img_bytes) > MAX_SIZE_MB * 1024 * 1024:
-            logger.warning(f"Imagen demasiado grande: {len(img_bytes)} bytes")
+        # Copias idénticas en curso (reintentos, fan-out) comparten una sola extracción
+        key = content_key(data, 'all' if all_faces else 'first')
+        try:
+            extracted, shared = inflight.do(key, lambda: extract_embeddings(data, priority, all_faces))
+        except ImageRejected as e:
+            logger.warning("Imagen rechazada: %s", e)
+            return jsonify({'error': str(e)}), e.status_code
+        except SchedulerError as e:
+            return scheduler_rejection(e, priority)
+        except Exception as e:
+            logger.error(f"Error extrayendo embedding: {e}")
             return jsonify({
-                'error': f'Image too large (max {MAX_SIZE_MB}MB)'
+                'error': f'Face extraction failed: {str(e)}'
             }), 400
         
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        if shared:
+            logger.debug("Extracción compartida con una solicitud idéntica en curso")
         
-        if img is None:
-            logger.warning("Error al decodificar imagen")
-            return jsonify({'error': 'Invalid image format'}), 400
+        if all_faces:
+            return verify_all_faces(extracted, start_time, model, scaler)
         
-        logger.debug(f"Imagen decodificada: {img.shape}")
-        
-        # Extraer embedding facial
-        try:
-            logger.debug(f"Extrayendo embedding con modelo: {FACENET_MODEL}")
-            embeddings_objs = DeepFace.represent(
-                img_path=img,
-                model_name=FACENET_MODEL,
-                enforce_detection=False
-            )
-            
-            if not embeddings_objs:
-                logger.warning("No se detectó rostro en la imagen")
-                return jsonify({
-                    'error': 'No face detected in image',
-                    'is_me': False
-                }), 400
-            
-            embedding = embeddings_objs[0]['embedding']
-            logger.debug(f"Embedding extraído: dimensión {len(embedding)}")
-            
-        except Exception as e:
-            logger.error(f"Error extrayendo embedding: {e}")
+        embedding = extracted['embedding']
+        if embedding is None:
+            logger.warning("No se detectó rostro en la imagen")
             return jsonify({
-                'error': f'Face extraction failed: {str(e)}'
+                'error': 'No face detected in image',
+                'is_me': False
             }), 400
         
-        embedding_scaled = model_loader.scaler.transform([embedding])
-        prediction = model_loader.model.predict(embedding_scaled)[0]
-        probabilities = model_loader.model.predict_proba(embedding_scaled)[0]
+        embedding_scaled = scaler.transform([embedding])
+        prediction = model.predict(embedding_scaled)[0]
+        probabilities = model.predict_proba(embedding_scaled)[0]
         confidence = float(probabilities[prediction])
         
-        logger.debug(f"Predicción: {prediction}, Confianza: {confidence:.3f}")
+        logger.debug("Predicción: %s, Confianza: %.3f", prediction, confidence)
         
         is_me = bool(prediction == 1 and confidence >= THRESHOLD)
         
@@ -193,8 +250,8 @@ def verify():
         
         log_status = "✅ IDENTIFICADO" if is_me else "❌ NO IDENTIFICADO"
         logger.info(
-            f"{log_status} - Score: {confidence:.3f} - "
-            f"Tiempo: {elapsed_ms:.1f}ms"
+            "%s - Score: %.3f - Tiempo: %.1fms",
+            log_status, confidence, elapsed_ms
         )
         
         return jsonify(result), 200
@@ -206,6 +263,143 @@ def verify():
         }), 500
 
 
+def extract_embeddings(data, priority, all_faces):
+    """
+    Decodifica y extrae el/los embedding(s) con un turno del planificador.
+    Devuelve solo valores serializables a JSON para poder compartirlos entre
+    workers: {'embedding': [...] o None} o, con all_faces,
+    {'faces': [{'box', 'detection_confidence'}], 'embeddings': [[...]]}.
+    """
+    with inference_scheduler.slot(priority) as wait_s:
+        g.queue_wait_ms = wait_s * 1000
+        logger.debug("Turno de inferencia (%s) tras %.1fms en cola", priority, g.queue_wait_ms)
+        
+        img, info = decode_upload(data, MAX_IMAGE_PIXELS, DECODE_TARGET_SIDE)
+        if info['reduction'] > 1:
+            logger.debug("Imagen %dx%d decodificada a 1/%d", info['width'], info['height'], info['reduction'])
+        
+        logger.debug("Imagen decodificada: %s", img.shape)
+        
+        # Filtros baratos: sin rostro utilizable no se ejecuta el modelo de embeddings
+        if quality_gate is not None:
+            reason, _ = quality_gate.check(img, face_gates=not all_faces)
+            if reason == 'no_face':
+                logger.debug("Detector rápido sin rostros; se omite el modelo de embeddings")
+                return {'faces': [], 'embeddings': []} if all_faces else {'embedding': None}
+            if reason is not None:
+                raise ImageRejected(f'Image rejected by quality gate: {reason}', 422)
+        
+        if all_faces:
+            # Un único forward del modelo de embeddings para todos los rostros
+            face_objs, embeddings = embed_faces(img, FACENET_MODEL, MAX_FACES)
+            return {
+                'faces': [
+                    {
+                        'box': face_box(face_obj, info['reduction']),
+                        'detection_confidence': round(float(face_obj.get('confidence', 0)), 4)
+                    }
+                    for face_obj in face_objs
+                ],
+                'embeddings': embeddings.tolist()
+            }
+        
+        logger.debug("Extrayendo embedding con modelo: %s", FACENET_MODEL)
+        embeddings_objs = DeepFace.represent(
+            img_path=img,
+            model_name=FACENET_MODEL,
+            enforce_detection=False
+        )
+        if not embeddings_objs:
+            return {'embedding': None}
+        
+        embedding = embeddings_objs[0]['embedding']
+        logger.debug("Embedding extraído: dimensión %d", len(embedding))
+        return {'embedding': list(embedding)}
+
+
+def verify_all_faces(extracted, start_time, model, scaler):
+    """Puntúa todos los rostros de la imagen en una sola llamada al clasificador"""
+    if not extracted['faces']:
+        logger.warning("No se detectó rostro en la imagen")
+        return jsonify({
+            'error': 'No face detected in image',
+            'is_me': False
+        }), 400
+    
+    # p_me es P(yo) para todos los rostros (el 'score' de /verify es la
+    # confianza de la clase predicha, que para un rostro ajeno es P(no yo))
+    scores, matches = score_embeddings(model, scaler, np.asarray(extracted['embeddings']), THRESHOLD)
+    best = int(np.argmax(scores))
+    faces = [
+        {
+            **face,
+            'p_me': round(float(score), 4),
+            'is_me': bool(match)
+        }
+        for face, score, match in zip(extracted['faces'], scores, matches)
+    ]
+    
+    elapsed_ms = (time.time() - start_time) * 1000
+    result = {
+        'is_me': faces[best]['is_me'],
+        'p_me': faces[best]['p_me'],
+        'best_face': best,
+        'faces': faces,
+        'threshold': THRESHOLD,
+        'timing_ms': round(elapsed_ms, 1),
+        'model_version': API_VERSION
+    }
+    
+    logger.info(
+        "%d rostro(s) - Mejor P(yo): %.3f - Coincidencias: %d - Tiempo: %.1fms",
+        len(faces), faces[best]['p_me'], int(matches.sum()), elapsed_ms
+    )
+    return jsonify(result), 200
+
+
+@app.route('/verify/embedding', methods=['POST'])
+def verify_embedding():
+    """Puntúa embeddings ya calculados por el cliente (binario float32, msgpack o JSON)"""
+    try:
+        model, scaler = resolve_model()
+        priority = request_priority()
+    except (TenantError, SchedulerError) as e:
+        logger.warning("Solicitud /verify/embedding rechazada: %s", e)
+        return jsonify({'error': str(e)}), e.status_code
+    
+    if model is None:
+        logger.error("Solicitud /verify/embedding rechazada: recursos no cargados")
+        return jsonify({
+            'error': 'Model not loaded',
+            'message': 'Por favor reinicia la API'
+        }), 503
+    
+    try:
+        fmt = request_format(request.content_type)
+        embeddings = decode_embeddings(
+            fmt, request.get_data(cache=False),
+            scaler.n_features_in_, MAX_EMBEDDINGS_PER_REQUEST
+        )
+    except ProtocolError as e:
+        logger.warning("Solicitud /verify/embedding rechazada: %s", e)
+        return jsonify({'error': str(e)}), e.status_code
+    
+    try:
+        with inference_scheduler.slot(priority) as wait_s:
+            g.queue_wait_ms = wait_s * 1000
+            scores, matches = score_embeddings(model, scaler, embeddings, THRESHOLD)
+    except SchedulerError as e:
+        return scheduler_rejection(e, priority)
+    
+    body, mimetype = encode_scores(fmt, scores, matches, THRESHOLD)
+    logger.debug("/verify/embedding: %d embedding(s) en %s", len(embeddings), fmt)
+    
+    response = Response(body, mimetype=mimetype)
+    response.headers['X-Threshold'] = str(THRESHOLD)
+    response.headers['X-Model-Version'] = API_VERSION
+    return response
+
+
 @app.errorhandler(404)
 def not_found(error):
     logger.warning(f"Ruta no encontrada: {request.path}")
@@ -215,6 +409,14 @@ def not_found(error):
     }), 404
 
 
+@app.errorhandler(413)
+def request_too_large(error):
+    logger.warning(f"Solicitud demasiado grande: {request.content_length} bytes")
+    return jsonify({
+        'error': f'Image too large (max {MAX_SIZE_MB}MB)'
+    }), 413
+
+
 @app.errorhandler(500)
 def internal_error(error):
     logger.error(f"Error interno: {error}")
@@ -228,6 +430,8 @@ if __name__ == '__main__':
         logger.info("   - GET  / (información)")
         logger.info("   - GET  /healthz (estado)")
         logger.info("   - POST /verify (verificación)")
+        logger.info("   - POST /verify?faces=all (todos los rostros)")
+        logger.info("   - POST /verify/embedding (embeddings del cliente)")
         logger.info("=" * 60)
         logger.info(f"🚀 Servidor iniciado en http://{HOST}:{PORT}")
         logger.info("=" * 60)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 # Rutas base
@@ -11,6 +12,47 @@ LOGS_DIR = BASE_DIR / 'logs'
 MODEL_PATH = MODELS_DIR / 'model.joblib'
 SCALER_PATH = MODELS_DIR / 'scaler.joblib'
 
+# Artefactos mapeados en memoria (compartidos entre workers); ME_VERIFIER_MMAP=0 los desactiva
+SERVING_DIR = MODELS_DIR / 'serving'
+USE_MMAP_ARTIFACTS = os.environ.get('ME_VERIFIER_MMAP', '1') != '0'
+
+# Vía rápida por prototipos (models/prototypes.npz); el SVC solo decide en la banda dudosa
+USE_FAST_PATH = os.environ.get('ME_VERIFIER_FAST_PATH', '1') != '0'
+
+# Modelos por tenant en models/<tenant>/, en una caché LRU por worker
+TENANT_CACHE_MAX_MODELS = int(os.environ.get('ME_VERIFIER_TENANT_CACHE_MODELS', '64'))
+TENANT_CACHE_MAX_MB = int(os.environ.get('ME_VERIFIER_TENANT_CACHE_MB', '512'))
+PINNED_TENANTS = [t for t in os.environ.get('ME_VERIFIER_PINNED_TENANTS', '').split(',') if t]
+TENANT_HEADER = 'X-Tenant-Id'
+
+# Planificación de la inferencia por clase de prioridad (cabecera X-Priority)
+PRIORITY_HEADER = 'X-Priority'
+DEFAULT_PRIORITY = 'interactive'
+# Weighted fair queuing entre estas clases; 'bulk' solo usa capacidad ociosa
+PRIORITY_WEIGHTS = {'interactive': 4, 'batch': 1}
+IDLE_ONLY_PRIORITIES = ('bulk',)
+# Inferencias simultáneas por worker (el resto de hilos de gthread esperan en cola)
+INFERENCE_SLOTS = int(os.environ.get('ME_VERIFIER_INFERENCE_SLOTS', '1'))
+MAX_QUEUED_PER_PRIORITY = 64
+QUEUE_TIMEOUT_S = float(os.environ.get('ME_VERIFIER_QUEUE_TIMEOUT_S', '30'))
+
+
+def default_inflight_dir():
+    """Directorio de ejecución del servicio (systemd/XDG) o, si no hay, uno por usuario en el temporal"""
+    runtime_dir = os.environ.get('RUNTIME_DIRECTORY') or os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return str(Path(runtime_dir.split(':')[0]) / 'me-verifier-inflight')
+    uid = os.getuid() if hasattr(os, 'getuid') else os.getpid()
+    return str(Path(tempfile.gettempdir()) / f'me-verifier-inflight-{uid}')
+
+
+# Coalescencia de imágenes idénticas en curso; el directorio (0700, del usuario
+# del servicio) la extiende entre workers (bloqueo por clave + resultado
+# compartido). ME_VERIFIER_INFLIGHT_DIR= la limita al worker
+INFLIGHT_DIR = os.environ.get('ME_VERIFIER_INFLIGHT_DIR', default_inflight_dir()) or None
+# Vida del resultado compartido: solo sirve a copias que llegan mientras se calcula
+INFLIGHT_RESULT_TTL_S = 2.0
+
 # Crear directorios si no existen
 MODELS_DIR.mkdir(exist_ok=True)
 LOGS_DIR.mkdir(exist_ok=True)
@@ -22,6 +64,18 @@ LOG_FILE = LOGS_DIR / 'app.log'
 # Parámetros de verificación
 THRESHOLD = 0.75
 MAX_SIZE_MB = 5
+# Margen para las cabeceras multipart sobre el tamaño máximo de imagen
+MAX_CONTENT_LENGTH = MAX_SIZE_MB * 1024 * 1024 + 64 * 1024
+# Límite de dimensiones leído de la cabecera, antes de decodificar
+MAX_IMAGE_PIXELS = 40_000_000
+# Las imágenes se decodifican reducidas (1/2, 1/4, 1/8) mientras el lado menor supere esto
+DECODE_TARGET_SIDE = 640
+# Cascada de filtros baratos (tamaño, Haar reducido, nitidez/exposición) antes de Facenet
+QUALITY_GATES = os.environ.get('ME_VERIFIER_QUALITY_GATES', '1') != '0'
+# Máximo de rostros puntuados en /verify?faces=all (los de mayor área)
+MAX_FACES = 10
+# Máximo de embeddings por solicitud en /verify/embedding
+MAX_EMBEDDINGS_PER_REQUEST = 1024
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png'}
 FACENET_MODEL = "Facenet"
 
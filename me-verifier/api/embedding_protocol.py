@@ -0,0 +1,105 @@
+"""
+Protocolo de /verify/embedding para clientes que ya calculan el embedding
+
+Formatos (se responde en el mismo que se recibe, según Content-Type):
+- application/octet-stream: n x d float32 little-endian concatenados. La
+  respuesta son n registros de 5 bytes: score float32 LE + is_me uint8.
+- application/msgpack: {"embeddings": [[...], ...] o bytes float32 LE}.
+  Requiere el paquete opcional msgpack.
+- application/json: {"embeddings": [[...], ...]} (orjson si está instalado).
+"""
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+BINARY_TYPES = ('application/octet-stream', 'application/x-float32')
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+JSON_TYPES = ('application/json',)
+RESPONSE_DTYPE = np.dtype([('score', '<f4'), ('is_me', 'u1')])
+
+
+class ProtocolError(ValueError):
+    """Cuerpo inválido; lleva el código HTTP a devolver"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def request_format(content_type):
+    mimetype = (content_type or '').split(';')[0].strip().lower()
+    if mimetype in BINARY_TYPES:
+        return 'binary'
+    if mimetype in MSGPACK_TYPES:
+        if msgpack is None:
+            raise ProtocolError('msgpack is not installed on the server', 415)
+        return 'msgpack'
+    if mimetype in JSON_TYPES:
+        return 'json'
+    raise ProtocolError(f'Unsupported Content-Type: {mimetype or "none"}', 415)
+
+
+def _as_matrix(values, n_features, max_embeddings):
+    if isinstance(values, (bytes, bytearray, memoryview)):
+        if len(values) % (4 * n_features):
+            raise ProtocolError(f'Body must be a multiple of {n_features} float32 values')
+        X = np.frombuffer(values, dtype='<f4').reshape(-1, n_features)
+    else:
+        try:
+            X = np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ProtocolError('Embeddings must be numeric')
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != n_features:
+            raise ProtocolError(f'Embeddings must have dimension {n_features}')
+    if len(X) == 0:
+        raise ProtocolError('No embeddings provided')
+    if len(X) > max_embeddings:
+        raise ProtocolError(f'Too many embeddings (max {max_embeddings})', 413)
+    if not np.isfinite(X).all():
+        raise ProtocolError('Embeddings must be finite')
+    return X
+
+
+def decode_embeddings(fmt, body, n_features, max_embeddings):
+    """Matriz (n, d) a partir del cuerpo de la solicitud"""
+    if fmt == 'binary':
+        return _as_matrix(body, n_features, max_embeddings)
+    try:
+        payload = msgpack.unpackb(body, raw=False) if fmt == 'msgpack' else json.loads(body)
+    except Exception:
+        raise ProtocolError(f'Invalid {fmt} body')
+    if not isinstance(payload, dict) or 'embeddings' not in payload:
+        raise ProtocolError("Body must contain 'embeddings'")
+    return _as_matrix(payload['embeddings'], n_features, max_embeddings)
+
+
+def encode_scores(fmt, scores, matches, threshold):
+    """(cuerpo, mimetype) de la respuesta en el formato de la solicitud"""
+    if fmt == 'binary':
+        records = np.empty(len(scores), dtype=RESPONSE_DTYPE)
+        records['score'] = scores
+        records['is_me'] = matches
+        return records.tobytes(), BINARY_TYPES[0]
+
+    result = {
+        'scores': [round(float(s), 4) for s in scores],
+        'is_me': [bool(m) for m in matches],
+        'threshold': threshold,
+    }
+    if fmt == 'msgpack':
+        return msgpack.packb(result), MSGPACK_TYPES[0]
+    if orjson is not None:
+        return orjson.dumps(result), JSON_TYPES[0]
+    return json.dumps(result, separators=(',', ':')), JSON_TYPES[0]
@@ -0,0 +1,57 @@
+"""
+Verificación de todos los rostros de una imagen
+
+Se detectan todos los rostros, se preprocesan igual que DeepFace.represent y
+se embeben en un único forward del modelo; el clasificador los puntúa en
+una sola llamada.
+"""
+import numpy as np
+from deepface import DeepFace
+from deepface.modules import modeling, preprocessing
+
+
+def detect_faces(img, max_faces, detector_backend='opencv'):
+    """Rostros detectados (los `max_faces` de mayor área), como DeepFace.extract_faces"""
+    face_objs = DeepFace.extract_faces(
+        img_path=img,
+        detector_backend=detector_backend,
+        enforce_detection=False,
+        align=True
+    )
+    face_objs = sorted(face_objs, key=lambda f: f['facial_area']['w'] * f['facial_area']['h'], reverse=True)
+    return face_objs[:max_faces]
+
+
+def preprocess_faces(face_objs, target_size):
+    """Batch (n, alto, ancho, 3) listo para model.forward"""
+    batch = []
+    for face_obj in face_objs:
+        # extract_faces devuelve RGB; el modelo espera BGR como en represent()
+        face = preprocessing.resize_image(face_obj['face'][:, :, ::-1], (target_size[1], target_size[0]))
+        batch.append(preprocessing.normalize_input(face, normalization='base'))
+    return np.concatenate(batch, axis=0)
+
+
+def embed_faces(img, model_name, max_faces, detector_backend='opencv'):
+    """(rostros, embeddings n x d) con un único forward para todos los rostros"""
+    face_objs = detect_faces(img, max_faces, detector_backend)
+    if not face_objs:
+        return [], np.empty((0, 0))
+    model = modeling.build_model(task='facial_recognition', model_name=model_name)
+    batch = preprocess_faces(face_objs, model.input_shape)
+    embeddings = np.asarray(model.forward(batch), dtype=np.float64).reshape(len(face_objs), -1)
+    return face_objs, embeddings
+
+
+def score_embeddings(model, scaler, embeddings, threshold):
+    """(probabilidad de 'yo', es_yo) por rostro, con el mismo criterio que /verify"""
+    X = scaler.transform(embeddings)
+    predictions = np.asarray(model.predict(X))
+    scores = np.asarray(model.predict_proba(X))[:, 1]
+    return scores, (predictions == 1) & (scores >= threshold)
+
+
+def face_box(face_obj, scale=1):
+    """Caja en coordenadas de la imagen original (deshace la reducción al decodificar)"""
+    area = face_obj['facial_area']
+    return {key: int(area[key] * scale) for key in ('x', 'y', 'w', 'h')}
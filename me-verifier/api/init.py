@@ -5,12 +5,22 @@ import sys
 import logging
 import subprocess
 import time
+from functools import partial
 from pathlib import Path
 import joblib
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from logger import setup_logger
-from api.config import MODEL_PATH, SCALER_PATH
+from api.config import (
+    MODEL_PATH, SCALER_PATH, SERVING_DIR, USE_MMAP_ARTIFACTS, USE_FAST_PATH, MODELS_DIR,
+    TENANT_CACHE_MAX_MODELS, TENANT_CACHE_MAX_MB, PINNED_TENANTS,
+    INFERENCE_SLOTS, PRIORITY_WEIGHTS, IDLE_ONLY_PRIORITIES, MAX_QUEUED_PER_PRIORITY, QUEUE_TIMEOUT_S,
+    INFLIGHT_DIR, INFLIGHT_RESULT_TTL_S, QUALITY_GATES, THRESHOLD
+)
+from api.registry import ModelRegistry, load_tenant_model
+from api.scheduler import PriorityScheduler
+from api.singleflight import SingleFlight
+from quality import QualityGate, load_haar_cascade
 
 logger = setup_logger("me_verifier")
 
@@ -22,6 +32,30 @@ class ModelLoader:
         self.scaler = None
         self.model_loaded = False
         self.scaler_loaded = False
+        self.source = None
+    
+    def load_serving_artifacts(self):
+        """Modelo y escalador desde models/serving/ (mmap compartido entre workers)"""
+        from artifacts import is_stale, load_serving_artifacts, read_manifest
+        
+        try:
+            manifest = read_manifest(SERVING_DIR)
+            if manifest is None:
+                return False
+            if is_stale(manifest, MODEL_PATH, SCALER_PATH):
+                logger.warning("⚠️ Artefactos de servicio desactualizados; se usa joblib")
+                logger.info("   Ejecuta: python artifacts.py export")
+                return False
+            
+            self.model, self.scaler = load_serving_artifacts(SERVING_DIR, manifest)
+            self.model_loaded = self.scaler_loaded = True
+            self.source = 'mmap'
+            logger.info(f"✅ Modelo ({manifest['kind']}) y escalador mapeados desde: {SERVING_DIR}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Error al cargar artefactos de servicio: {e}")
+            return False
     
     def load_model(self):
         try:
@@ -34,6 +68,7 @@ class ModelLoader:
             
             self.model = joblib.load(MODEL_PATH)
             self.model_loaded = True
+            self.source = 'joblib'
             logger.info("✅ Modelo cargado exitosamente")
             return True
             
@@ -64,8 +99,14 @@ class ModelLoader:
         logger.info("=== Iniciando carga de recursos ===")
         logger.info("=" * 50)
         
-        model_ok = self.load_model()
-        scaler_ok = self.load_scaler()
+        if USE_MMAP_ARTIFACTS and self.load_serving_artifacts():
+            model_ok = scaler_ok = True
+        else:
+            model_ok = self.load_model()
+            scaler_ok = self.load_scaler()
+        
+        if model_ok and USE_FAST_PATH:
+            self.attach_fast_path()
         
         if model_ok and scaler_ok:
             logger.info("=" * 50)
@@ -82,6 +123,14 @@ class ModelLoader:
             logger.warning("=" * 50)
             return False
     
+    def attach_fast_path(self):
+        """Envuelve el modelo con la vía rápida por prototipos si train.py la exportó"""
+        from fast_path import FastPathModel, attach_fast_path
+        
+        self.model = attach_fast_path(self.model, MODELS_DIR, MODEL_PATH, THRESHOLD)
+        if isinstance(self.model, FastPathModel):
+            logger.info(f"✅ Vía rápida por prototipos activa (banda {self.model.stats()['band']})")
+    
     def is_ready(self):
         return self.model_loaded and self.scaler_loaded
     
@@ -89,6 +138,7 @@ class ModelLoader:
         return {
             'model_loaded': self.model_loaded,
             'scaler_loaded': self.scaler_loaded,
+            'source': self.source,
             'ready': self.is_ready()
         }
 
@@ -216,7 +266,7 @@ class SetupManager:
         
         return len(self.warnings) == 0
     
-    def _run_script(self, script_name, step_number, description):
+    def _run_script(self, script_name, step_number, description, args=()):
         logger.info("=" * 60)
         logger.info(f"PASO {step_number}: {description}")
         logger.info("=" * 60)
@@ -231,7 +281,7 @@ class SetupManager:
             
             logger.info(f"Ejecutando: {script_path}")
             result = subprocess.run(
-                [sys.executable, str(script_path)],
+                [sys.executable, str(script_path), *args],
                 cwd=str(self.base_dir),
                 capture_output=True,
                 text=True,
@@ -277,10 +327,12 @@ class SetupManager:
         )
     
     def run_evaluate(self):
+        # Sin gráficos: el setup solo necesita las métricas
         return self._run_script(
             'evaluate.py',
             5,
-            'Evaluando modelo'
+            'Evaluando modelo',
+            args=('--no-plots',)
         )
     
     def print_summary(self):
@@ -359,4 +411,24 @@ class SetupManager:
 
 
 model_loader = ModelLoader()
-setup_manager = SetupManager()
\ No newline at end of file
+setup_manager = SetupManager()
+model_registry = ModelRegistry(
+    MODELS_DIR,
+    loader=partial(load_tenant_model, fast_path=USE_FAST_PATH, threshold=THRESHOLD),
+    max_models=TENANT_CACHE_MAX_MODELS,
+    max_bytes=TENANT_CACHE_MAX_MB * 1024 * 1024,
+    pinned=PINNED_TENANTS
+)
+inference_scheduler = PriorityScheduler(
+    slots=INFERENCE_SLOTS,
+    weights=PRIORITY_WEIGHTS,
+    idle_only=IDLE_ONLY_PRIORITIES,
+    max_queued=MAX_QUEUED_PER_PRIORITY,
+    timeout_s=QUEUE_TIMEOUT_S
+)
+inflight = SingleFlight(
+    INFLIGHT_DIR,
+    result_ttl_s=INFLIGHT_RESULT_TTL_S,
+    wait_timeout_s=QUEUE_TIMEOUT_S * 2
+)
+quality_gate = QualityGate(load_haar_cascade()) if QUALITY_GATES else None
\ No newline at end of file
@@ -0,0 +1,163 @@
+"""
+Registro de modelos por tenant
+
+Cada tenant (usuario verificado) tiene su propio modelo en models/<tenant>/
+(artefactos mapeados de serving/ si existen y están al día, si no
+model.joblib/scaler.joblib). Se cargan al primer uso y se mantienen en una
+caché LRU acotada por número de modelos y por tamaño; los tenants fijados
+(pinned) nunca se expulsan. El backbone Facenet no es parte del registro:
+DeepFace lo construye una sola vez por proceso y lo comparten todos.
+"""
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import joblib
+
+from artifacts import is_stale, is_valid_tenant_id, load_serving_artifacts, read_manifest
+from fast_path import attach_fast_path
+
+
+class TenantError(LookupError):
+    """Tenant inválido, sin modelo o con un modelo que no se puede cargar; lleva el código HTTP a devolver"""
+
+    def __init__(self, message, status_code=404):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def validate_tenant_id(tenant_id):
+    if not is_valid_tenant_id(tenant_id):
+        raise TenantError(f'Invalid tenant id: {tenant_id!r}', 400)
+    return tenant_id
+
+
+def _artifact_bytes(tenant_dir, manifest):
+    if manifest is not None:
+        files = [tenant_dir / 'serving' / name for name in manifest['arrays'].values()]
+    else:
+        files = [tenant_dir / 'model.joblib', tenant_dir / 'scaler.joblib']
+    return sum(f.stat().st_size for f in files if f.exists())
+
+
+def load_tenant_model(tenant_dir, fast_path=True, threshold=None):
+    """
+    (modelo, escalador, bytes, origen) de un directorio de tenant. La vía
+    rápida solo se activa si sus prototipos se calibraron para `threshold`.
+    """
+    tenant_dir = Path(tenant_dir)
+    model_file, scaler_file = tenant_dir / 'model.joblib', tenant_dir / 'scaler.joblib'
+    manifest = read_manifest(tenant_dir / 'serving')
+    if manifest is not None and not is_stale(manifest, model_file, scaler_file):
+        model, scaler = load_serving_artifacts(tenant_dir / 'serving', manifest)
+        nbytes, source = _artifact_bytes(tenant_dir, manifest), 'mmap'
+    elif model_file.exists() and scaler_file.exists():
+        model, scaler = joblib.load(model_file), joblib.load(scaler_file)
+        nbytes, source = _artifact_bytes(tenant_dir, None), 'joblib'
+    else:
+        raise FileNotFoundError(f"No hay modelo en: {tenant_dir}")
+    if fast_path:
+        model = attach_fast_path(model, tenant_dir, model_file, threshold)
+    return model, scaler, nbytes, source
+
+
+class ModelRegistry:
+    """Caché LRU de (modelo, escalador) por tenant, segura entre hilos"""
+
+    def __init__(self, models_dir, max_models=64, max_bytes=512 * 1024 * 1024, pinned=(), loader=load_tenant_model):
+        self.models_dir = Path(models_dir)
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.pinned = set(pinned)
+        self.loader = loader
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.metrics = {'hits': 0, 'misses': 0, 'loads': 0, 'load_errors': 0,
+                        'evictions': 0, 'load_time_s': 0.0}
+
+    def get(self, tenant_id):
+        """(modelo, escalador) del tenant, cargándolo si no está en caché"""
+        validate_tenant_id(tenant_id)
+        with self._lock:
+            entry = self._entries.get(tenant_id)
+            if entry is not None:
+                self._entries.move_to_end(tenant_id)
+                self.metrics['hits'] += 1
+                return entry['model'], entry['scaler']
+            self.metrics['misses'] += 1
+            # Una sola carga por tenant aunque lleguen varias solicitudes a la vez
+            load_lock = self._loading.setdefault(tenant_id, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(tenant_id)
+                if entry is not None:
+                    self._entries.move_to_end(tenant_id)
+                    return entry['model'], entry['scaler']
+            entry = self._load(tenant_id)
+            with self._lock:
+                self._entries[tenant_id] = entry
+                self._bytes += entry['bytes']
+                self._loading.pop(tenant_id, None)
+                self._evict()
+            return entry['model'], entry['scaler']
+
+    def _load(self, tenant_id):
+        start = time.perf_counter()
+        loaded = False
+        try:
+            model, scaler, nbytes, source = self.loader(self.models_dir / tenant_id)
+            loaded = True
+        except FileNotFoundError:
+            raise TenantError(f'No model for tenant: {tenant_id}', 404)
+        except Exception as e:
+            # Artefactos truncados o corruptos (EOFError, KeyError, ValueError...)
+            raise TenantError(f'Could not load model for tenant {tenant_id}: {type(e).__name__}', 500) from e
+        finally:
+            if not loaded:
+                with self._lock:
+                    self.metrics['load_errors'] += 1
+                    self._loading.pop(tenant_id, None)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.metrics['loads'] += 1
+            self.metrics['load_time_s'] += elapsed
+        return {'model': model, 'scaler': scaler, 'bytes': nbytes, 'source': source}
+
+    def _evict(self):
+        for tenant_id in list(self._entries):
+            if len(self._entries) <= self.max_models and self._bytes <= self.max_bytes:
+                break
+            if tenant_id in self.pinned:
+                continue
+            self._bytes -= self._entries.pop(tenant_id)['bytes']
+            self.metrics['evictions'] += 1
+
+    def pin(self, tenant_id):
+        """Carga el tenant y lo excluye de la expulsión"""
+        self.pinned.add(validate_tenant_id(tenant_id))
+        return self.get(tenant_id)
+
+    def unpin(self, tenant_id):
+        self.pinned.discard(tenant_id)
+        with self._lock:
+            self._evict()
+
+    def __contains__(self, tenant_id):
+        with self._lock:
+            return tenant_id in self._entries
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.metrics,
+                'load_time_s': round(self.metrics['load_time_s'], 4),
+                'models': len(self._entries),
+                'bytes': self._bytes,
+                'max_models': self.max_models,
+                'max_bytes': self.max_bytes,
+                'pinned': sorted(self.pinned),
+            }
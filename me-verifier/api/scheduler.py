@@ -0,0 +1,168 @@
+"""
+Planificador de inferencia por clases de prioridad
+
+Cada worker de gunicorn (gthread) atiende varias solicitudes a la vez, pero
+la inferencia se limita a `slots` simultáneas. Las solicitudes esperan su
+turno por clase (cabecera X-Priority):
+- Clases con peso (interactive, batch): weighted fair queuing; cada ticket
+  recibe una etiqueta de fin virtual max(V, última de su clase) + 1/peso y se
+  despacha siempre la menor, así interactive obtiene `peso` veces más turnos
+  que batch cuando ambas compiten y ninguna se queda sin servicio.
+- Clases solo-ociosas (bulk): solo toman un slot si no hay ninguna solicitud
+  con peso esperando; rellenan capacidad libre sin retrasar a las demás más
+  allá de una inferencia en curso (no hay expropiación).
+Se mide el tiempo de espera en cola por clase.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Límites superiores (ms) del histograma de espera en cola
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class SchedulerError(RuntimeError):
+    """Solicitud no admitida o sin turno a tiempo; lleva el código HTTP a devolver"""
+
+    def __init__(self, message, status_code=503):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _Ticket:
+    __slots__ = ('priority', 'finish', 'enqueued', 'granted', 'event')
+
+    def __init__(self, priority, finish):
+        self.priority = priority
+        self.finish = finish
+        self.enqueued = time.perf_counter()
+        self.granted = False
+        self.event = threading.Event()
+
+
+def _class_metrics():
+    return {'requests': 0, 'rejected': 0, 'timeouts': 0, 'queued': 0, 'inflight': 0,
+            'wait_s_total': 0.0, 'wait_s_max': 0.0,
+            'wait_histogram_ms': [0] * (len(WAIT_BUCKETS_MS) + 1)}
+
+
+class PriorityScheduler:
+    """Cola WFQ + clases solo-ociosas delante de `slots` inferencias concurrentes"""
+
+    def __init__(self, slots=1, weights=None, idle_only=('bulk',), max_queued=64, timeout_s=30.0):
+        self.slots = slots
+        self.weights = dict(weights or {'interactive': 4, 'batch': 1})
+        self.idle_only = tuple(idle_only)
+        self.max_queued = max_queued
+        self.timeout_s = timeout_s
+        self._free = slots
+        self._virtual_time = 0.0
+        self._last_finish = {name: 0.0 for name in self.weights}
+        self._queues = {name: deque() for name in (*self.weights, *self.idle_only)}
+        self._lock = threading.Lock()
+        self.metrics = {name: _class_metrics() for name in self._queues}
+
+    @property
+    def priorities(self):
+        return tuple(self._queues)
+
+    def _enqueue(self, priority):
+        if priority not in self._queues:
+            raise SchedulerError(f'Unknown priority: {priority!r} (use {", ".join(self._queues)})', 400)
+        metrics = self.metrics[priority]
+        metrics['requests'] += 1
+        if len(self._queues[priority]) >= self.max_queued:
+            metrics['rejected'] += 1
+            raise SchedulerError(f'Too many queued {priority} requests')
+        finish = 0.0
+        if priority in self.weights:
+            finish = max(self._virtual_time, self._last_finish[priority]) + 1.0 / self.weights[priority]
+            self._last_finish[priority] = finish
+        ticket = _Ticket(priority, finish)
+        self._queues[priority].append(ticket)
+        metrics['queued'] += 1
+        return ticket
+
+    def _next_ticket(self):
+        heads = [queue[0] for name, queue in self._queues.items() if name in self.weights and queue]
+        if heads:
+            ticket = min(heads, key=lambda t: t.finish)
+            self._virtual_time = ticket.finish
+            return self._queues[ticket.priority].popleft()
+        for name in self.idle_only:
+            if self._queues[name]:
+                return self._queues[name].popleft()
+        return None
+
+    def _dispatch(self):
+        while self._free > 0:
+            ticket = self._next_ticket()
+            if ticket is None:
+                return
+            self._free -= 1
+            ticket.granted = True
+            metrics = self.metrics[ticket.priority]
+            metrics['queued'] -= 1
+            metrics['inflight'] += 1
+            self._record_wait(metrics, time.perf_counter() - ticket.enqueued)
+            ticket.event.set()
+
+    @staticmethod
+    def _record_wait(metrics, wait_s):
+        metrics['wait_s_total'] += wait_s
+        metrics['wait_s_max'] = max(metrics['wait_s_max'], wait_s)
+        wait_ms = wait_s * 1000
+        bucket = next((i for i, limit in enumerate(WAIT_BUCKETS_MS) if wait_ms <= limit), len(WAIT_BUCKETS_MS))
+        metrics['wait_histogram_ms'][bucket] += 1
+
+    def acquire(self, priority, timeout_s=None):
+        """Espera turno; devuelve los segundos en cola"""
+        with self._lock:
+            ticket = self._enqueue(priority)
+            self._dispatch()
+        timeout_s = self.timeout_s if timeout_s is None else timeout_s
+        if not ticket.event.wait(timeout_s):
+            with self._lock:
+                # El turno puede haber llegado justo al vencer el plazo
+                if not ticket.granted:
+                    self._queues[priority].remove(ticket)
+                    self.metrics[priority]['queued'] -= 1
+                    self.metrics[priority]['timeouts'] += 1
+                    raise SchedulerError(f'No inference slot for {priority} request after {timeout_s:.0f}s')
+        return time.perf_counter() - ticket.enqueued
+
+    def release(self, priority):
+        with self._lock:
+            self._free += 1
+            self.metrics[priority]['inflight'] -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, priority, timeout_s=None):
+        """with scheduler.slot('interactive') as wait_s: ... (inferencia)"""
+        wait_s = self.acquire(priority, timeout_s)
+        try:
+            yield wait_s
+        finally:
+            self.release(priority)
+
+    def stats(self):
+        with self._lock:
+            classes = {}
+            for name, metrics in self.metrics.items():
+                served = sum(metrics['wait_histogram_ms'])
+                classes[name] = {
+                    **metrics,
+                    'wait_histogram_ms': dict(zip([*map(str, WAIT_BUCKETS_MS), 'inf'], metrics['wait_histogram_ms'])),
+                    'wait_s_total': round(metrics['wait_s_total'], 4),
+                    'wait_s_max': round(metrics['wait_s_max'], 4),
+                    'wait_ms_mean': round(metrics['wait_s_total'] * 1000 / served, 2) if served else 0.0,
+                }
+            return {
+                'slots': self.slots,
+                'free_slots': self._free,
+                'weights': self.weights,
+                'idle_only': list(self.idle_only),
+                'classes': classes,
+            }
@@ -0,0 +1,219 @@
+"""
+Coalescencia de solicitudes idénticas en curso (single-flight)
+
+Cuando llega la misma imagen varias veces a la vez (reintentos, fan-out),
+solo una solicitud calcula el embedding y las demás esperan y comparten su
+resultado, identificado por el hash del contenido:
+- Dentro de un worker: la primera solicitud de una clave es la líder; las
+  demás esperan su Event y reciben el mismo valor (o la misma excepción).
+- Entre workers: la líder de cada worker toma un bloqueo de rango de bytes
+  (fcntl.lockf) en un único archivo, en un desplazamiento derivado de la
+  clave. Quien lo consigue sin esperar calcula y deja el resultado en
+  <clave>.json (vida corta, result_ttl_s); quien tuvo que esperar el bloqueo
+  lee ese archivo al obtenerlo. Si la líder falló, la siguiente calcula por
+  su cuenta. No es una caché: sin un cálculo en curso siempre se recalcula.
+Solo se comparten valores serializables a JSON.
+
+Los resultados son embeddings de fotos de usuarios: el directorio se crea
+con modo 0700 y debe pertenecer al usuario del proceso (un directorio ajeno,
+abierto a otros o un enlace simbólico desactivan la coalescencia entre
+workers), y cada archivo se escribe con modo 0600.
+"""
+import hashlib
+import json
+import os
+import stat
+import threading
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOCK_FILE = 'inflight.lock'
+# Rango de desplazamientos del archivo de bloqueo; colisiones despreciables
+LOCK_OFFSETS = 1 << 40
+POLL_INTERVAL_S = 0.002
+
+
+def secure_lock_dir(lock_dir):
+    """Crea el directorio (0700) y comprueba que sea privado del usuario actual; PermissionError si no"""
+    lock_dir = Path(lock_dir)
+    lock_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+    st = os.lstat(lock_dir)
+    if not stat.S_ISDIR(st.st_mode):
+        raise PermissionError(f"{lock_dir} no es un directorio")
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+        raise PermissionError(f"{lock_dir} pertenece a otro usuario (uid {st.st_uid})")
+    if st.st_mode & 0o077:
+        raise PermissionError(f"{lock_dir} es accesible para otros usuarios ({stat.filemode(st.st_mode)})")
+    return lock_dir
+
+
+def content_key(*parts):
+    """Clave hexadecimal de los bytes de la imagen más los modificadores de la solicitud"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, (bytes, bytearray, memoryview)) else str(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class _Call:
+    __slots__ = ('event', 'value', 'error', 'elapsed_s')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.elapsed_s = 0.0
+
+
+class SingleFlight:
+    """do(clave, fn) ejecuta fn una sola vez por clave entre las solicitudes concurrentes"""
+
+    def __init__(self, lock_dir=None, result_ttl_s=2.0, wait_timeout_s=60.0):
+        self.lock_dir = Path(lock_dir) if lock_dir is not None and fcntl is not None else None
+        self.result_ttl_s = result_ttl_s
+        self.wait_timeout_s = wait_timeout_s
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._lock_fd = None
+        self._lock_pid = None
+        self.lock_dir_error = None
+        self.metrics = {'leaders': 0, 'coalesced_local': 0, 'coalesced_workers': 0,
+                        'fallbacks': 0, 'saved_s': 0.0}
+
+    def do(self, key, fn):
+        """(valor, compartido): compartido es True si el valor lo calculó otra solicitud"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.event.wait(self.wait_timeout_s):
+                if call.error is not None:
+                    raise call.error
+                self._count('coalesced_local', call.elapsed_s)
+                return call.value, True
+            self._count('fallbacks')
+            return fn(), False
+
+        try:
+            call.value, shared, call.elapsed_s = self._run_across_workers(key, fn)
+            return call.value, shared
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def _count(self, name, saved_s=0.0):
+        with self._lock:
+            self.metrics[name] += 1
+            self.metrics['saved_s'] += saved_s
+
+    def _timed(self, fn):
+        start = time.perf_counter()
+        value = fn()
+        elapsed_s = time.perf_counter() - start
+        self._count('leaders')
+        return value, False, elapsed_s
+
+    def _run_across_workers(self, key, fn):
+        if self.lock_dir is None:
+            return self._timed(fn)
+
+        try:
+            fd = self._shared_lock_fd()
+        except PermissionError as e:
+            # Directorio inseguro: se sigue coalesciendo solo dentro del worker
+            self.lock_dir, self.lock_dir_error = None, str(e)
+            self._count('fallbacks')
+            return self._timed(fn)
+        offset = int(key[:16], 16) % LOCK_OFFSETS
+        acquired, waited = self._lock_range(fd, offset)
+        if not acquired:
+            self._count('fallbacks')
+            return self._timed(fn)
+        try:
+            # Solo se reutiliza el resultado si otro worker lo estaba calculando
+            shared = self._read_result(key) if waited else None
+            if shared is not None:
+                self._count('coalesced_workers', shared['elapsed_s'])
+                return shared['value'], True, shared['elapsed_s']
+            value, _, elapsed_s = self._timed(fn)
+            self._write_result(key, value, elapsed_s)
+            return value, False, elapsed_s
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset)
+
+    def _shared_lock_fd(self):
+        # Los bloqueos POSIX son por proceso y no se heredan: un descriptor
+        # por proceso, abierto de nuevo tras el fork del worker
+        with self._lock:
+            if self._lock_pid != os.getpid():
+                secure_lock_dir(self.lock_dir)
+                self._lock_fd = os.open(self.lock_dir / LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+                self._lock_pid = os.getpid()
+            return self._lock_fd
+
+    def _lock_range(self, fd, offset):
+        """(obtenido, hubo_que_esperar)"""
+        deadline = time.monotonic() + self.wait_timeout_s
+        waited = False
+        while True:
+            try:
+                fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, offset)
+                return True, waited
+            except OSError:
+                if time.monotonic() >= deadline:
+                    return False, waited
+                waited = True
+                time.sleep(POLL_INTERVAL_S)
+
+    def _result_file(self, key):
+        return self.lock_dir / f'{key}.json'
+
+    def _read_result(self, key):
+        result_file = self._result_file(key)
+        try:
+            if time.time() - result_file.stat().st_mtime > self.result_ttl_s:
+                return None
+            with open(result_file) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_result(self, key, value, elapsed_s):
+        tmp_file = self.lock_dir / f'.{key}.{os.getpid()}'
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'value': value, 'elapsed_s': elapsed_s}, f)
+        os.replace(tmp_file, self._result_file(key))
+        self._remove_expired(keep=key)
+
+    def _remove_expired(self, keep):
+        now = time.time()
+        for result_file in self.lock_dir.glob('*.json'):
+            try:
+                if result_file.stem != keep and now - result_file.stat().st_mtime > self.result_ttl_s:
+                    result_file.unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.metrics,
+                'saved_s': round(self.metrics['saved_s'], 4),
+                'in_flight': len(self._calls),
+                'cross_worker': self.lock_dir is not None,
+                'lock_dir_error': self.lock_dir_error,
+            }
@@ -0,0 +1,127 @@
+"""
+Lectura y decodificación de imágenes subidas a /verify
+
+La subida se lee con readinto() en un buffer reutilizado por hilo (sin copias
+intermedias a bytes), las dimensiones se leen de la cabecera JPEG/PNG antes
+de decodificar y las imágenes grandes se decodifican ya reducidas con
+IMREAD_REDUCED_COLOR_2/4/8.
+"""
+import struct
+import threading
+
+import cv2
+import numpy as np
+
+INITIAL_BUFFER_SIZE = 256 * 1024
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# SOF0-SOF15 salvo DHT (C4), JPG (C8) y DAC (CC)
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                 (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+_local = threading.local()
+
+
+class ImageRejected(ValueError):
+    """Imagen rechazada antes de procesarla; lleva el código HTTP a devolver"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _thread_buffer(size):
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None or len(buffer) < size:
+        buffer = bytearray(size)
+        _local.buffer = buffer
+    return buffer
+
+
+def read_upload(stream, max_bytes):
+    """
+    Lee el stream completo en el buffer del hilo y devuelve una vista uint8
+    (válida hasta la siguiente lectura en el mismo hilo).
+    """
+    buffer = _thread_buffer(min(INITIAL_BUFFER_SIZE, max_bytes + 1))
+    readinto = getattr(stream, 'readinto', None)
+    size = 0
+    while True:
+        if size == len(buffer):
+            if size > max_bytes:
+                raise ImageRejected(f'Image too large (max {max_bytes // (1024 * 1024)}MB)', 413)
+            grown = _thread_buffer(min(2 * len(buffer), max_bytes + 1))
+            grown[:size] = buffer[:size]
+            buffer = grown
+        with memoryview(buffer) as view:
+            if readinto is not None:
+                read = readinto(view[size:])
+            else:
+                chunk = stream.read(len(buffer) - size)
+                read = len(chunk)
+                view[size:size + read] = chunk
+        if not read:
+            break
+        size += read
+    if size > max_bytes:
+        raise ImageRejected(f'Image too large (max {max_bytes // (1024 * 1024)}MB)', 413)
+    return np.frombuffer(buffer, dtype=np.uint8, count=size)
+
+
+def sniff_image_header(data):
+    """(formato, ancho, alto) leyendo solo la cabecera JPEG/PNG, o None"""
+    head = bytes(data[:32])
+    if head.startswith(PNG_SIGNATURE) and head[12:16] == b'IHDR':
+        width, height = struct.unpack('>II', head[16:24])
+        return 'png', width, height
+    if not head.startswith(b'\xff\xd8'):
+        return None
+
+    offset, size = 2, len(data)
+    while offset + 4 <= size:
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            offset += 1
+            continue
+        if marker in (0x01, *range(0xD0, 0xD8)):
+            offset += 2
+            continue
+        length = (int(data[offset + 2]) << 8) | int(data[offset + 3])
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 9 > size:
+                return None
+            height, width = struct.unpack('>HH', bytes(data[offset + 5:offset + 9]))
+            return 'jpeg', width, height
+        offset += 2 + length
+    return None
+
+
+def reduced_decode_flag(width, height, target_side):
+    """Mayor reducción que deja el lado menor por encima de `target_side`"""
+    for factor, flag in REDUCED_FLAGS:
+        if min(width, height) // factor >= target_side:
+            return flag, factor
+    return cv2.IMREAD_COLOR, 1
+
+
+def decode_upload(data, max_pixels, target_side):
+    """
+    Valida la cabecera y decodifica (reducida si sobra resolución).
+    Devuelve (imagen BGR, info) o lanza ImageRejected.
+    """
+    header = sniff_image_header(data)
+    if header is None:
+        raise ImageRejected('Invalid image format')
+    fmt, width, height = header
+    if width == 0 or height == 0:
+        raise ImageRejected('Invalid image format')
+    if width * height > max_pixels:
+        raise ImageRejected(f'Image dimensions too large ({width}x{height}, max {max_pixels} pixels)', 413)
+
+    flag, factor = reduced_decode_flag(width, height, target_side)
+    img = cv2.imdecode(data, flag)
+    if img is None:
+        raise ImageRejected('Invalid image format')
+    return img, {'format': fmt, 'width': width, 'height': height, 'reduction': factor}
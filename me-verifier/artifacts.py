@@ -0,0 +1,333 @@
+"""
+Artefactos de servicio mapeados en memoria
+
+model.joblib/scaler.joblib se exportan a models/serving/ como arrays .npy
+(cabecera alineada a 64 bytes) más un manifest.json. Cada worker los abre con
+np.load(mmap_mode='r'), de modo que todos comparten una única copia en la page
+cache en lugar de deserializar su propia copia con joblib:
+
+    python artifacts.py export
+
+Modelos soportados: SVC RBF con probabilidades y modelos lineales binarios
+con salida logística (LogisticRegression, SGDClassifier(log_loss)). El resto
+se sigue sirviendo desde joblib. El escalador se exporta como media/escala
+o, si train.py usó --pca, como una única proyección afín (matriz +
+desplazamiento) que ya incluye la PCA. Los pesos del modelo de embeddings
+(DeepFace/TensorFlow) no pueden compartirse así: TF copia los tensores a su
+propia memoria al construir el grafo.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+from logger import setup_logger
+
+logger = setup_logger("artifacts")
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+MIN_PROBABILITY = 1e-7
+# Modelos por tenant en models/<tenant>/; el id se usa como nombre de directorio
+TENANT_ID_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+RESERVED_TENANTS = {'serving'}
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _is_logistic(model):
+    loss = getattr(model, 'loss', None)
+    return model.__class__.__name__ == 'LogisticRegression' or loss in ('log_loss', 'log')
+
+
+def is_valid_tenant_id(tenant_id):
+    return bool(TENANT_ID_PATTERN.match(tenant_id or '')) and tenant_id not in RESERVED_TENANTS
+
+
+def model_arrays(model):
+    """(tipo, parámetros, arrays) del modelo, o None si no tiene formato mapeable"""
+    classes = np.asarray(getattr(model, 'classes_', []))
+    if len(classes) != 2:
+        return None
+    if model.__class__.__name__ == 'SVC' and model.kernel == 'rbf' and model.probability:
+        support_vectors = np.ascontiguousarray(model.support_vectors_, dtype=np.float64)
+        return 'rbf_svc', {'gamma': float(model._gamma)}, {
+            'support_vectors': support_vectors,
+            'sv_sq_norms': np.einsum('ij,ij->i', support_vectors, support_vectors),
+            'dual_coef': np.ascontiguousarray(model.dual_coef_[0], dtype=np.float64),
+            'intercept': np.asarray(model.intercept_, dtype=np.float64),
+            'prob_a': np.asarray(model.probA_, dtype=np.float64),
+            'prob_b': np.asarray(model.probB_, dtype=np.float64),
+            'classes': classes,
+        }
+    if hasattr(model, 'coef_') and np.shape(model.coef_)[0] == 1 and _is_logistic(model):
+        return 'linear', {}, {
+            'coef': np.ascontiguousarray(model.coef_[0], dtype=np.float64),
+            'intercept': np.asarray(model.intercept_, dtype=np.float64),
+            'classes': classes,
+        }
+    return None
+
+
+def scaler_arrays(scaler):
+    """(tipo, arrays) del escalador: 'standard' (media/escala) o 'affine' (proyección fusionada)"""
+    if hasattr(scaler, 'projection_'):
+        return 'affine', {
+            'scaler_projection': np.ascontiguousarray(scaler.projection_, dtype=np.float64),
+            'scaler_offset': np.asarray(scaler.offset_, dtype=np.float64),
+        }
+    mean = getattr(scaler, 'mean_', None)
+    scale = getattr(scaler, 'scale_', None)
+    if mean is None and scale is None:
+        return None
+    n_features = scaler.n_features_in_
+    return 'standard', {
+        'scaler_mean': np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64),
+        'scaler_scale': np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64),
+    }
+
+
+def export_serving_artifacts(model, scaler, output_dir='models/serving', sources=None):
+    """
+    Escribe los arrays y el manifiesto. Cada exportación usa nombres de archivo
+    nuevos y el manifiesto se reemplaza al final (os.replace), así un worker
+    nunca ve una mezcla de versiones; los archivos de la versión anterior se
+    borran después (los mmaps abiertos conservan su inodo).
+    Devuelve la ruta del manifiesto o None si el modelo no es exportable.
+    """
+    described = model_arrays(model)
+    scaler_data = scaler_arrays(scaler)
+    if described is None or scaler_data is None:
+        logger.info(f"{model.__class__.__name__} no tiene formato mapeable; se sirve desde joblib")
+        return None
+    kind, params, arrays = described
+    scaler_kind, scaler_data = scaler_data
+    arrays.update(scaler_data)
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    tag = uuid.uuid4().hex[:12]
+    files = {}
+    for name, array in arrays.items():
+        filename = f"{name}.{tag}.npy"
+        np.save(output_path / filename, np.ascontiguousarray(array))
+        files[name] = filename
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'kind': kind,
+        'estimator': model.__class__.__name__,
+        'params': params,
+        'scaler': scaler_kind,
+        'n_features': int(scaler.n_features_in_),
+        'arrays': files,
+        'sources': sources or {},
+    }
+    manifest_file = output_path / MANIFEST
+    tmp_file = output_path / f".{MANIFEST}.{tag}"
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_file, manifest_file)
+
+    for stale in output_path.glob('*.npy'):
+        if stale.name not in files.values():
+            stale.unlink()
+    logger.info(f"Artefactos de servicio ({kind}) exportados en: {output_path}")
+    return manifest_file
+
+
+def export_from_joblib(model_path='models/model.joblib', scaler_path='models/scaler.joblib',
+                       output_dir='models/serving'):
+    import joblib
+
+    sources = {'model': file_digest(model_path), 'scaler': file_digest(scaler_path)}
+    return export_serving_artifacts(joblib.load(model_path), joblib.load(scaler_path), output_dir, sources)
+
+
+def read_manifest(serving_dir):
+    manifest_file = Path(serving_dir) / MANIFEST
+    if not manifest_file.exists():
+        return None
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def is_stale(manifest, model_path, scaler_path):
+    """True si los artefactos no corresponden a los joblib actuales"""
+    sources = manifest.get('sources') or {}
+    try:
+        return (sources.get('model') != file_digest(model_path)
+                or sources.get('scaler') != file_digest(scaler_path))
+    except FileNotFoundError:
+        return False
+
+
+def ensure_serving_artifacts(model_path, scaler_path, serving_dir):
+    """Exporta (una sola vez, p. ej. en el master de gunicorn) si faltan o están desactualizados"""
+    manifest = read_manifest(serving_dir)
+    if manifest is not None and not is_stale(manifest, model_path, scaler_path):
+        return True
+    if not (Path(model_path).exists() and Path(scaler_path).exists()):
+        return False
+    return export_from_joblib(model_path, scaler_path, serving_dir) is not None
+
+
+class MmapScaler:
+    """Equivalente a StandardScaler.transform sobre arrays mapeados"""
+
+    def __init__(self, mean, scale):
+        self.mean_ = mean
+        self.scale_ = scale
+        self.n_features_in_ = len(mean)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+class MmapAffineScaler:
+    """Escalador + PCA fusionados (projection.ProjectedScaler) sobre arrays mapeados"""
+
+    def __init__(self, projection, offset):
+        self.projection_ = projection
+        self.offset_ = offset
+        self.n_features_in_ = projection.shape[0]
+
+    def transform(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.projection_ + self.offset_
+
+
+class MmapLinearModel:
+    """Modelo lineal binario con salida logística"""
+
+    def __init__(self, coef, intercept, classes):
+        self.coef_ = coef
+        self.intercept_ = intercept
+        self.classes_ = classes
+
+    def decision_function(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef_ + self.intercept_[0]
+
+    def predict_proba(self, X):
+        p = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return self.classes_[(self.decision_function(X) > 0).astype(int)]
+
+
+def _libsvm_binary_probability(r):
+    """
+    Acoplamiento por pares de libsvm (multiclass_probability) para k=2, con su
+    mismo criterio de parada; reproduce SVC.predict_proba exactamente.
+    `r` es la probabilidad sigmoide de la primera clase.
+    """
+    k = 2
+    r = np.clip(r, MIN_PROBABILITY, 1 - MIN_PROBABILITY)
+    n = len(r)
+    Q = np.empty((n, k, k))
+    Q[:, 0, 0] = (1 - r) ** 2
+    Q[:, 1, 1] = r ** 2
+    Q[:, 0, 1] = Q[:, 1, 0] = -r * (1 - r)
+    p = np.full((n, k), 1.0 / k)
+    Qp = np.einsum('nij,nj->ni', Q, p)
+    pQp = (p * Qp).sum(axis=1)
+    active = np.ones(n, dtype=bool)
+    for _ in range(max(100, k)):
+        active &= np.abs(Qp - pQp[:, None]).max(axis=1) >= 0.005 / k
+        if not active.any():
+            break
+        for t in range(k):
+            diff = np.where(active, (pQp - Qp[:, t]) / Q[:, t, t], 0.0)
+            p[:, t] += diff
+            pQp = (pQp + diff * (diff * Q[:, t, t] + 2 * Qp[:, t])) / (1 + diff) ** 2
+            Qp = (Qp + diff[:, None] * Q[:, t, :]) / (1 + diff[:, None])
+            p /= (1 + diff[:, None])
+    return p
+
+
+class MmapRBFSVC:
+    """SVC RBF binario evaluado directamente sobre los vectores soporte mapeados"""
+
+    def __init__(self, support_vectors, sv_sq_norms, dual_coef, intercept, prob_a, prob_b, classes, gamma):
+        self.support_vectors_ = support_vectors
+        self.sv_sq_norms = sv_sq_norms
+        self.dual_coef = dual_coef
+        self.intercept_ = intercept
+        self.probA_ = prob_a
+        self.probB_ = prob_b
+        self.classes_ = classes
+        self.gamma = gamma
+
+    def decision_function(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        sq_distances = np.einsum('ij,ij->i', X, X)[:, None] + self.sv_sq_norms - 2 * (X @ self.support_vectors_.T)
+        K = np.exp(-self.gamma * np.maximum(sq_distances, 0))
+        return K @ self.dual_coef + self.intercept_[0]
+
+    def predict_proba(self, X):
+        # libsvm trabaja con el signo opuesto al decision_function de sklearn
+        f = -self.decision_function(X) * self.probA_[0] + self.probB_[0]
+        r = np.exp(-np.logaddexp(0, f))
+        return _libsvm_binary_probability(r)
+
+    def predict(self, X):
+        return self.classes_[(self.decision_function(X) > 0).astype(int)]
+
+
+def load_serving_artifacts(serving_dir='models/serving', manifest=None):
+    """(modelo, escalador) con todos los arrays abiertos con mmap_mode='r'"""
+    serving_path = Path(serving_dir)
+    manifest = manifest or read_manifest(serving_path)
+    if manifest is None:
+        raise FileNotFoundError(f"No hay artefactos de servicio en: {serving_path}")
+    arrays = {name: np.load(serving_path / filename, mmap_mode='r')
+              for name, filename in manifest['arrays'].items()}
+
+    if manifest.get('scaler', 'standard') == 'affine':
+        scaler = MmapAffineScaler(arrays.pop('scaler_projection'), arrays.pop('scaler_offset'))
+    else:
+        scaler = MmapScaler(arrays.pop('scaler_mean'), arrays.pop('scaler_scale'))
+    if manifest['kind'] == 'rbf_svc':
+        model = MmapRBFSVC(gamma=manifest['params']['gamma'], **arrays)
+    elif manifest['kind'] == 'linear':
+        model = MmapLinearModel(**arrays)
+    else:
+        raise ValueError(f"Tipo de artefacto desconocido: {manifest['kind']}")
+    return model, scaler
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Artefactos de servicio mapeados en memoria")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help="Convierte model.joblib/scaler.joblib")
+    export.add_argument('--model', default='models/model.joblib')
+    export.add_argument('--scaler', default='models/scaler.joblib')
+    export.add_argument('--output-dir', default='models/serving')
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+
+    try:
+        if export_from_joblib(args.model, args.scaler, args.output_dir) is None:
+            sys.exit(1)
+    except Exception as e:
+        logger.error(f"Error exportando artefactos: {e}")
+        raise
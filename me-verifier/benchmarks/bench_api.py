@@ -0,0 +1,411 @@
+"""
+Benchmark de carga y latencia para la API (/verify y endpoints por lote)
+
+Levanta un gunicorn local (o usa --url), genera cargas reproducibles con
+concurrencia, mezcla de tamaños de imagen y proporción de aciertos de caché
+configurables, y guarda los resultados en reports/benchmarks/ como JSON.
+
+Ejemplo:
+    python benchmarks/bench_api.py --workers 4 --concurrency 1 4 16 \\
+        --sizes 320x240 640x480 1920x1080 --cache-hit-ratio 0.3
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+import requests
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+from logger import setup_logger
+from common import BASE_DIR, run_metadata, save_results
+
+logger = setup_logger("bench_api")
+
+CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def load_source_images(images_dir):
+    """Carga imágenes reales para usarlas como base (si no hay, se usan sintéticas)"""
+    if not images_dir:
+        return []
+    path = Path(images_dir)
+    images = []
+    for img_file in sorted(path.glob('*')):
+        if img_file.suffix.lower() in ('.jpg', '.jpeg', '.png'):
+            img = cv2.imread(str(img_file))
+            if img is not None:
+                images.append(img)
+    logger.info(f"Imágenes base cargadas desde {path}: {len(images)}")
+    return images
+
+
+def make_base_image(rng, size, source_images):
+    width, height = size
+    if source_images:
+        img = source_images[rng.integers(len(source_images))]
+        return cv2.resize(img, (width, height))
+    # Imagen sintética: fondo suave más un óvalo tipo "rostro"
+    img = np.full((height, width, 3), rng.integers(60, 200, size=3), dtype=np.uint8)
+    noise = rng.normal(0, 12, size=(height, width, 3))
+    img = np.clip(img + noise, 0, 255).astype(np.uint8)
+    center = (width // 2, height // 2)
+    axes = (max(width // 6, 4), max(height // 4, 4))
+    cv2.ellipse(img, center, axes, 0, 0, 360, (140, 170, 210), -1)
+    return img
+
+
+def encode_jpeg(img):
+    ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise ValueError("No se pudo codificar la imagen")
+    return buf.tobytes()
+
+
+def build_payloads(n_requests, sizes, size_weights, cache_hit_ratio, hot_set, seed, source_images):
+    """
+    Pre-genera los cuerpos de las peticiones para que la codificación no
+    contamine las latencias. Con probabilidad `cache_hit_ratio` se repite una
+    imagen de un conjunto "caliente"; el resto son imágenes únicas.
+    """
+    rng = np.random.default_rng(seed)
+    weights = np.asarray(size_weights, dtype=float)
+    weights = weights / weights.sum()
+
+    hot = []
+    for _ in range(max(hot_set, 1)):
+        size = sizes[rng.choice(len(sizes), p=weights)]
+        hot.append((size, encode_jpeg(make_base_image(rng, size, source_images))))
+
+    payloads = []
+    for _ in range(n_requests):
+        if rng.random() < cache_hit_ratio:
+            size, body = hot[rng.integers(len(hot))]
+            payloads.append({'size': f"{size[0]}x{size[1]}", 'body': body, 'hot': True})
+        else:
+            size = sizes[rng.choice(len(sizes), p=weights)]
+            img = make_base_image(rng, size, source_images)
+            payloads.append({'size': f"{size[0]}x{size[1]}", 'body': encode_jpeg(img), 'hot': False})
+    return payloads
+
+
+def read_proc_stats(pid):
+    """CPU (s) y RSS (bytes) de un proceso leyendo /proc"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / CLK_TCK
+        with open(f'/proc/{pid}/statm') as f:
+            rss = int(f.read().split()[1]) * PAGE_SIZE
+        return cpu, rss
+    except (OSError, IndexError, ValueError):
+        return None, None
+
+
+def find_worker_pids(master_pid):
+    pids = []
+    for entry in Path('/proc').iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(entry / 'stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == master_pid:
+            pids.append(int(entry.name))
+    return sorted(pids)
+
+
+class WorkerSampler:
+    """Muestrea CPU y RSS de los workers de gunicorn durante un escenario"""
+
+    def __init__(self, pids, interval=0.2):
+        self.pids = pids
+        self.interval = interval
+        self.samples = {pid: [] for pid in pids}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._cpu_start = {}
+
+    def _run(self):
+        while not self._stop.is_set():
+            for pid in self.pids:
+                _, rss = read_proc_stats(pid)
+                if rss is not None:
+                    self.samples[pid].append(rss)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._cpu_start = {pid: read_proc_stats(pid)[0] for pid in self.pids}
+        self._wall_start = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        wall = time.perf_counter() - self._wall_start
+        workers = []
+        for pid in self.pids:
+            cpu_end, rss_end = read_proc_stats(pid)
+            cpu_start = self._cpu_start.get(pid)
+            cpu = None if cpu_end is None or cpu_start is None else cpu_end - cpu_start
+            rss = self.samples[pid] or ([rss_end] if rss_end else [])
+            workers.append({
+                'pid': pid,
+                'cpu_seconds': None if cpu is None else round(cpu, 3),
+                'cpu_percent': None if cpu is None else round(100 * cpu / wall, 1),
+                'rss_mb_mean': round(float(np.mean(rss)) / 2**20, 1) if rss else None,
+                'rss_mb_max': round(float(np.max(rss)) / 2**20, 1) if rss else None,
+            })
+        return workers
+
+
+class GunicornServer:
+    """Levanta un gunicorn local y espera a que responda /healthz"""
+
+    def __init__(self, port, workers, threads, timeout=120):
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.timeout = timeout
+        self.process = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        cmd = [
+            sys.executable, '-m', 'gunicorn',
+            '--config', 'scripts/gunicorn_conf.py',
+            '--bind', f'127.0.0.1:{self.port}',
+            '--workers', str(self.workers),
+            '--threads', str(self.threads),
+            '--timeout', str(self.timeout),
+            'api.app:app'
+        ]
+        logger.info(f"Iniciando gunicorn: {' '.join(cmd)}")
+        self.process = subprocess.Popen(
+            cmd, cwd=str(BASE_DIR),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.time() + self.timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("gunicorn terminó durante el arranque")
+            try:
+                requests.get(f"{self.url}/healthz", timeout=1)
+                if len(find_worker_pids(self.process.pid)) >= self.workers:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.5)
+        self.__exit__(None, None, None)
+        raise TimeoutError("gunicorn no respondió a tiempo")
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def send_request(session, url, endpoint, payload):
+    start = time.perf_counter()
+    try:
+        response = session.post(
+            url + endpoint,
+            files={'image': ('bench.jpg', payload['body'], 'image/jpeg')},
+            timeout=120
+        )
+        status = response.status_code
+    except requests.RequestException:
+        status = 'error'
+    return status, (time.perf_counter() - start) * 1000
+
+
+def run_scenario(url, endpoint, payloads, concurrency, worker_pids):
+    local = threading.local()
+
+    def task(payload):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        status, latency = send_request(local.session, url, endpoint, payload)
+        return payload, status, latency
+
+    sampler = WorkerSampler(worker_pids) if worker_pids else None
+    if sampler:
+        sampler.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(task, payloads))
+    wall = time.perf_counter() - start
+
+    workers = sampler.stop() if sampler else []
+    return summarize(results, wall, concurrency, workers)
+
+
+def latency_stats(latencies):
+    if not latencies:
+        return {}
+    values = np.asarray(latencies)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'count': int(values.size),
+        'mean_ms': round(float(values.mean()), 2),
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'max_ms': round(float(values.max()), 2),
+    }
+
+
+def summarize(results, wall, concurrency, workers):
+    latencies = [latency for _, _, latency in results]
+    status_counts = {}
+    by_size = {}
+    for payload, status, latency in results:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+        by_size.setdefault(payload['size'], []).append(latency)
+
+    summary = {
+        'concurrency': concurrency,
+        'requests': len(results),
+        'wall_seconds': round(wall, 3),
+        'throughput_rps': round(len(results) / wall, 2) if wall > 0 else None,
+        'status_codes': status_counts,
+        'latency': latency_stats(latencies),
+        'latency_by_size': {size: latency_stats(values) for size, values in by_size.items()},
+        'workers': workers,
+    }
+    return summary
+
+
+def compare_results(baseline_file, current):
+    """Muestra la diferencia de throughput y p95 frente a un resultado previo"""
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    previous = {s['concurrency']: s for s in baseline.get('scenarios', [])}
+    logger.info(f"=== Comparación con {baseline_file} ({baseline['meta'].get('commit')}) ===")
+    for scenario in current['scenarios']:
+        old = previous.get(scenario['concurrency'])
+        if not old or not old['latency'] or not scenario['latency']:
+            continue
+        rps_delta = (scenario['throughput_rps'] - old['throughput_rps']) / old['throughput_rps'] * 100
+        p95_delta = (scenario['latency']['p95_ms'] - old['latency']['p95_ms']) / old['latency']['p95_ms'] * 100
+        logger.info(
+            f"concurrencia={scenario['concurrency']}: "
+            f"throughput {rps_delta:+.1f}%, p95 {p95_delta:+.1f}%"
+        )
+
+
+def run_benchmark(args):
+    sizes = [parse_size(s) for s in args.sizes]
+    size_weights = args.size_weights or [1] * len(sizes)
+    if len(size_weights) != len(sizes):
+        raise ValueError("--size-weights debe tener un valor por cada --sizes")
+
+    random.seed(args.seed)
+    source_images = load_source_images(args.images_dir)
+    logger.info(f"Generando {args.requests} peticiones por escenario...")
+    payloads = build_payloads(
+        args.requests, sizes, size_weights, args.cache_hit_ratio,
+        args.hot_set, args.seed, source_images
+    )
+    warmup = payloads[:args.warmup]
+
+    meta = run_metadata({
+        'endpoint': args.endpoint,
+        'workers': args.workers,
+        'threads': args.threads,
+        'requests': args.requests,
+        'sizes': args.sizes,
+        'size_weights': size_weights,
+        'cache_hit_ratio': args.cache_hit_ratio,
+        'hot_set': args.hot_set,
+        'seed': args.seed,
+        'images_dir': args.images_dir,
+    })
+
+    def run_all(url, master_pid):
+        worker_pids = find_worker_pids(master_pid) if master_pid else []
+        if warmup:
+            logger.info(f"Calentamiento: {len(warmup)} peticiones")
+            run_scenario(url, args.endpoint, warmup, max(args.concurrency), [])
+        scenarios = []
+        for concurrency in args.concurrency:
+            logger.info(f"Escenario: concurrencia={concurrency}")
+            summary = run_scenario(url, args.endpoint, payloads, concurrency, worker_pids)
+            lat = summary['latency']
+            logger.info(
+                f"  {summary['throughput_rps']} req/s - p50 {lat.get('p50_ms')}ms - "
+                f"p95 {lat.get('p95_ms')}ms - p99 {lat.get('p99_ms')}ms - "
+                f"códigos {summary['status_codes']}"
+            )
+            scenarios.append(summary)
+        return scenarios
+
+    if args.url:
+        scenarios = run_all(args.url.rstrip('/'), args.server_pid)
+    else:
+        with GunicornServer(args.port, args.workers, args.threads) as server:
+            scenarios = run_all(server.url, server.process.pid)
+
+    results = {'meta': meta, 'scenarios': scenarios}
+    save_results(results, 'api', logger, args.output)
+    if args.compare:
+        compare_results(args.compare, results)
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark de carga para la API")
+    parser.add_argument('--url', help="URL de un servidor ya en ejecución (no se lanza gunicorn)")
+    parser.add_argument('--server-pid', type=int, help="PID del master de gunicorn al usar --url")
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--endpoint', default='/verify')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--requests', type=int, default=200, help="Peticiones por escenario")
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--sizes', nargs='+', default=['320x240', '640x480', '1280x720'])
+    parser.add_argument('--size-weights', type=float, nargs='+')
+    parser.add_argument('--cache-hit-ratio', type=float, default=0.0,
+                        help="Fracción de peticiones que repiten una imagen ya enviada")
+    parser.add_argument('--hot-set', type=int, default=8,
+                        help="Número de imágenes distintas que se repiten")
+    parser.add_argument('--images-dir', help="Directorio con imágenes reales a usar como base")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Archivo JSON de salida (por defecto reports/benchmarks/)")
+    parser.add_argument('--compare', help="JSON de un benchmark anterior para comparar")
+    return parser
+
+
+if __name__ == '__main__':
+    logger.info("Iniciando benchmark de la API")
+    try:
+        run_benchmark(build_parser().parse_args())
+        logger.info("Benchmark completado")
+    except Exception as e:
+        logger.error(f"Error en el benchmark: {e}")
+        raise
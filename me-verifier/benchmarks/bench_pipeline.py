@@ -0,0 +1,278 @@
+"""
+Microbenchmarks de las etapas offline del pipeline
+
+Estilo asv: cada etapa es una función `time_*` parametrizada que prepara sus
+datos fuera de la medición. Todas las entradas son sintéticas (o imágenes de
+ejemplo con --images-dir) con semillas fijas.
+
+Ejemplo:
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 100000
+    python benchmarks/bench_pipeline.py --only train --max-svm-samples 20000
+"""
+import argparse
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+sys.path.insert(0, str(Path(__file__).parent))
+from logger import setup_logger
+from common import run_metadata, save_results
+
+logger = setup_logger("bench_pipeline")
+
+EMBEDDING_DIM = 128
+IMAGE_SIZES = [(320, 240), (640, 480), (1280, 720)]
+
+
+def silence_pipeline_loggers():
+    """Los módulos del pipeline registran cada llamada a INFO; se silencian tras importarlos"""
+    for name in ('train', 'evaluate', 'crop_faces', 'embeddings'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+
+def make_face_image(rng, size):
+    """Imagen sintética con un óvalo claro sobre fondo con ruido"""
+    width, height = size
+    img = np.clip(rng.normal(110, 25, size=(height, width, 3)), 0, 255).astype(np.uint8)
+    center = (int(rng.integers(width // 3, 2 * width // 3)), int(rng.integers(height // 3, 2 * height // 3)))
+    axes = (max(width // 8, 8), max(height // 5, 8))
+    cv2.ellipse(img, center, axes, 0, 0, 360, (150, 175, 215), -1)
+    return img
+
+
+def load_images(rng, images_dir, count):
+    """Imágenes de ejemplo si hay directorio, si no sintéticas de varios tamaños"""
+    if images_dir:
+        images = []
+        for img_file in sorted(Path(images_dir).glob('*')):
+            img = cv2.imread(str(img_file)) if img_file.suffix.lower() in ('.jpg', '.jpeg', '.png') else None
+            if img is not None:
+                images.append(img)
+            if len(images) >= count:
+                break
+        if images:
+            return images
+        logger.warning(f"No hay imágenes en {images_dir}, se usan sintéticas")
+    return [make_face_image(rng, IMAGE_SIZES[i % len(IMAGE_SIZES)]) for i in range(count)]
+
+
+def make_embeddings(n_samples, seed, positive_ratio=0.3):
+    """Dos nubes gaussianas solapadas en 128 dimensiones, como los embeddings de Facenet"""
+    rng = np.random.default_rng(seed)
+    n_pos = int(n_samples * positive_ratio)
+    y = np.zeros(n_samples, dtype=np.int64)
+    y[:n_pos] = 1
+    centers = rng.normal(0, 0.15, size=(2, EMBEDDING_DIM))
+    X = rng.normal(0, 1.5, size=(n_samples, EMBEDDING_DIM)) + centers[y]
+    order = rng.permutation(n_samples)
+    return X[order], y[order]
+
+
+def measure(func, repeat, number=1):
+    """Devuelve los tiempos (s) de `repeat` rondas de `number` llamadas"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return timings
+
+
+def summarize(name, param, timings, items=None, **extra):
+    median = float(np.median(timings))
+    result = {
+        'benchmark': name,
+        'param': param,
+        'repeat': len(timings),
+        'median_s': round(median, 6),
+        'min_s': round(float(np.min(timings)), 6),
+        'max_s': round(float(np.max(timings)), 6),
+    }
+    if items:
+        result['items'] = items
+        result['items_per_s'] = round(items / median, 2) if median > 0 else None
+    result.update(extra)
+    rate = f" - {result['items_per_s']} items/s" if items else ""
+    logger.info(f"{name}[{param}]: mediana {median * 1000:.2f}ms{rate}")
+    return result
+
+
+def skipped(name, param, reason):
+    logger.warning(f"{name}[{param}]: omitido ({reason})")
+    return {'benchmark': name, 'param': param, 'skipped': reason}
+
+
+# --- Etapa: recorte de rostros -------------------------------------------------
+
+def time_detect_faces(images, repeat):
+    import crop_faces
+    silence_pipeline_loggers()
+
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    results = []
+    for size in sorted({img.shape[1::-1] for img in images}):
+        batch = [img for img in images if img.shape[1::-1] == size]
+        timings = measure(lambda: [crop_faces.detect_faces(img, cascade) for img in batch], repeat)
+        results.append(summarize('crop_faces.detect_faces', f"{size[0]}x{size[1]}", timings, items=len(batch)))
+    return results
+
+
+def time_crop_and_save_face(images, repeat):
+    import crop_faces
+    silence_pipeline_loggers()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = Path(tmp)
+
+        def run():
+            for idx, img in enumerate(images):
+                h, w = img.shape[:2]
+                coords = (w // 4, h // 4, w // 2, h // 2)
+                crop_faces.crop_and_save_face(img, coords, Path(f"img{idx}.jpg"), output_path, 0)
+
+        timings = measure(run, repeat)
+        results.append(summarize('crop_faces.crop_and_save_face', 'mixed', timings, items=len(images)))
+    return results
+
+
+# --- Etapa: embeddings ---------------------------------------------------------
+
+def time_extract_embedding(images, repeat):
+    try:
+        import embeddings
+        silence_pipeline_loggers()
+        if not embeddings.load_model("Facenet"):
+            return [skipped('embeddings.extract_embedding_from_image', 'Facenet', 'modelo no disponible')]
+    except Exception as e:
+        return [skipped('embeddings.extract_embedding_from_image', 'Facenet', str(e))]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for idx, img in enumerate(images):
+            img_file = Path(tmp) / f"face{idx}.jpg"
+            cv2.imwrite(str(img_file), cv2.resize(img, (160, 160)))
+            files.append(img_file)
+        # Primera llamada fuera de la medición (construcción del grafo de TF)
+        embeddings.extract_embedding_from_image(files[0], "Facenet")
+        timings = measure(
+            lambda: [embeddings.extract_embedding_from_image(f, "Facenet") for f in files], repeat
+        )
+        results.append(summarize('embeddings.extract_embedding_from_image', '160x160', timings, items=len(files)))
+    return results
+
+
+# --- Etapa: entrenamiento y evaluación ----------------------------------------
+
+def time_train_and_evaluate(sizes, seed, repeat, max_svm_samples):
+    import train
+    import evaluate
+    silence_pipeline_loggers()
+
+    results = []
+    svm_points = []
+    for n_samples in sizes:
+        X, y = make_embeddings(n_samples, seed)
+        X_train, X_test, y_train, y_test = train.split_data(X, y)
+
+        timings = measure(lambda: train.scale_data(X_train, X_test), repeat)
+        results.append(summarize('train.scale_data', n_samples, timings, items=n_samples))
+
+        X_train_scaled, X_test_scaled, scaler = train.scale_data(X_train, X_test)
+        if n_samples > max_svm_samples:
+            results.append(skipped('train.train_svm_model', n_samples, f'> --max-svm-samples={max_svm_samples}'))
+            results.append(skipped('evaluate.predict_and_calculate_metrics', n_samples, 'sin modelo'))
+            continue
+
+        # Entrenar es caro: una sola ronda por tamaño salvo que se pida más
+        models = []
+        timings = measure(lambda: models.append(train.train_svm_model(X_train_scaled, y_train)), max(1, repeat // 3))
+        model = models[-1]
+        svm_points.append((len(X_train), float(np.median(timings))))
+        results.append(summarize(
+            'train.train_svm_model', n_samples, timings, items=len(X_train),
+            support_vectors=int(model.support_vectors_.shape[0])
+        ))
+
+        timings = measure(lambda: evaluate.predict_and_calculate_metrics(model, scaler, X_test, y_test), repeat)
+        results.append(summarize('evaluate.predict_and_calculate_metrics', n_samples, timings, items=len(X_test)))
+
+    scaling = None
+    if len(svm_points) >= 2:
+        n, t = np.log(np.array(svm_points)).T
+        exponent = float(np.polyfit(n, t, 1)[0])
+        scaling = {'train_svm_model_exponent': round(exponent, 2), 'points': svm_points}
+        logger.info(f"train_svm_model escala como O(n^{exponent:.2f}) en el rango medido")
+    return results, scaling
+
+
+STAGES = ('crop', 'embeddings', 'train')
+
+
+def run_benchmarks(args):
+    rng = np.random.default_rng(args.seed)
+    stages = args.only or STAGES
+    results = []
+    scaling = None
+
+    if 'crop' in stages or 'embeddings' in stages:
+        images = load_images(rng, args.images_dir, args.n_images)
+    if 'crop' in stages:
+        results += time_detect_faces(images, args.repeat)
+        results += time_crop_and_save_face(images, args.repeat)
+    if 'embeddings' in stages:
+        results += time_extract_embedding(images[:args.n_embedding_images], args.repeat)
+    if 'train' in stages:
+        train_results, scaling = time_train_and_evaluate(args.sizes, args.seed, args.repeat, args.max_svm_samples)
+        results += train_results
+
+    output = {
+        'meta': run_metadata({
+            'stages': list(stages),
+            'sizes': args.sizes,
+            'max_svm_samples': args.max_svm_samples,
+            'n_images': args.n_images,
+            'images_dir': args.images_dir,
+            'repeat': args.repeat,
+            'seed': args.seed,
+        }),
+        'results': results,
+        'scaling': scaling,
+    }
+    save_results(output, 'pipeline', logger, args.output)
+    return output
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Microbenchmarks del pipeline offline")
+    parser.add_argument('--only', nargs='+', choices=STAGES, help="Etapas a medir")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Número de embeddings para entrenamiento/evaluación")
+    parser.add_argument('--max-svm-samples', type=int, default=20000,
+                        help="No entrenar SVC por encima de este tamaño (O(n^2)-O(n^3))")
+    parser.add_argument('--n-images', type=int, default=30)
+    parser.add_argument('--n-embedding-images', type=int, default=10)
+    parser.add_argument('--images-dir', help="Imágenes de ejemplo (por defecto sintéticas)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Archivo JSON de salida (por defecto reports/benchmarks/)")
+    return parser
+
+
+if __name__ == '__main__':
+    logger.info("Iniciando microbenchmarks del pipeline")
+    try:
+        run_benchmarks(build_parser().parse_args())
+        logger.info("Microbenchmarks completados")
+    except Exception as e:
+        logger.error(f"Error en los microbenchmarks: {e}")
+        raise
@@ -0,0 +1,47 @@
+"""
+Utilidades compartidas por los benchmarks
+"""
+import json
+import platform
+import os
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+RESULTS_DIR = BASE_DIR / 'reports' / 'benchmarks'
+
+
+def git_commit():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=str(BASE_DIR), capture_output=True, text=True, timeout=10
+        )
+        return result.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_metadata(config):
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'host': platform.node(),
+        'cpu_count': os.cpu_count(),
+        'config': config,
+    }
+
+
+def save_results(results, prefix, logger, output_file=None):
+    if output_file is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output_file = RESULTS_DIR / f"{prefix}-{results['meta']['commit'] or 'nocommit'}-{stamp}.json"
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_file, 'w') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Resultados guardados en: {output_file}")
+    return output_file
@@ -0,0 +1,75 @@
+"""
+Clasificadores propios compatibles con scikit-learn
+"""
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.utils.validation import check_is_fitted
+
+
+def l2_normalize(X):
+    X = np.asarray(X, dtype=np.float64)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return X / np.maximum(norms, 1e-12)
+
+
+def compute_class_centroids(X, y, classes):
+    """Centroides normalizados (L2) de cada clase"""
+    centroids = np.vstack([l2_normalize(X[y == c]).mean(axis=0) for c in classes])
+    return l2_normalize(centroids)
+
+
+def fit_sigmoid(margin, target, max_iter=200):
+    """
+    Regresión logística 1-D por Newton (equivalente a la calibración de
+    Platt). `target` puede ser 0/1 o una probabilidad suave.
+    """
+    a, b = 1.0, 0.0
+    for _ in range(max_iter):
+        p = 1.0 / (1.0 + np.exp(-(a * margin + b)))
+        w = np.maximum(p * (1 - p), 1e-12)
+        grad = np.array([np.dot(p - target, margin), np.sum(p - target)])
+        hess = np.array([
+            [np.dot(w, margin * margin), np.dot(w, margin)],
+            [np.dot(w, margin), np.sum(w)]
+        ]) + 1e-6 * np.eye(2)
+        step = np.linalg.solve(hess, grad)
+        a, b = a - step[0], b - step[1]
+        if np.abs(step).max() < 1e-8:
+            break
+    return float(a), float(b)
+
+
+class PrototypeClassifier(ClassifierMixin, BaseEstimator):
+    """
+    Clasificador por prototipos: similitud coseno contra el centroide de cada
+    clase. Entrenar es O(n) y predecir cuesta un producto de 2 x d por muestra.
+    La probabilidad se obtiene con una sigmoide ajustada sobre el margen
+    cos(x, me) - cos(x, not_me) en los datos de entrenamiento.
+    """
+
+    def __init__(self, max_iter=200):
+        self.max_iter = max_iter
+
+    def fit(self, X, y):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y)
+        self.classes_ = np.unique(y)
+        if len(self.classes_) != 2:
+            raise ValueError("PrototypeClassifier solo soporta clasificación binaria")
+        self.centroids_ = compute_class_centroids(X, y, self.classes_)
+        margin = self.decision_function(X)
+        self.sigmoid_a_, self.sigmoid_b_ = fit_sigmoid(margin, (y == self.classes_[1]).astype(float), self.max_iter)
+        return self
+
+    def decision_function(self, X):
+        check_is_fitted(self, 'centroids_')
+        similarities = l2_normalize(X) @ self.centroids_.T
+        return similarities[:, 1] - similarities[:, 0]
+
+    def predict_proba(self, X):
+        margin = self.decision_function(X)
+        p = 1.0 / (1.0 + np.exp(-(self.sigmoid_a_ * margin + self.sigmoid_b_)))
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return self.classes_[(self.predict_proba(X)[:, 1] >= 0.5).astype(int)]
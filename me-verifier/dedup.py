@@ -0,0 +1,296 @@
+"""
+Detección de duplicados exactos y casi duplicados
+
+Usado por search_img.py al descargar y como etapa propia sobre los datos de
+entrenamiento, para que fotos casi idénticas no inflen el coste ni se
+repartan entre entrenamiento y prueba:
+
+    python dedup.py images --apply
+    python dedup.py embeddings --max-cosine-distance 0.02
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(__file__))
+from logger import setup_logger
+
+logger = setup_logger("dedup")
+
+HASH_SIZE = 8
+NEAR_DUPLICATE_DISTANCE = 6
+POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def dhash(img):
+    """
+    Difference hash de 64 bits: gradiente horizontal de la imagen reducida a
+    9x8 en escala de grises. Robusto a re-compresión y re-escalado. Acepta
+    bytes, una imagen PIL o un array (BGR/gris) de OpenCV.
+    """
+    if isinstance(img, (bytes, bytearray, memoryview)):
+        img = Image.open(BytesIO(img))
+    if isinstance(img, Image.Image):
+        # En JPEG, draft() decodifica directamente a una escala reducida
+        img.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+        img = img.convert('L')
+    else:
+        gray = np.asarray(img)
+        if gray.ndim == 3:
+            gray = gray.mean(axis=2)
+        img = Image.fromarray(gray.astype(np.uint8))
+    small = np.asarray(img.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming_distance(a, b):
+    return bin(int(a) ^ int(b)).count('1')
+
+
+def _popcount(values):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return POPCOUNT_TABLE[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def hamming_distances(hashes, value):
+    """Distancias de Hamming de `value` contra un array uint64, vectorizado"""
+    return _popcount(np.asarray(hashes, dtype=np.uint64) ^ np.uint64(value))
+
+
+class DuplicateFilter:
+    """
+    Filtro seguro entre hilos: rechaza contenidos ya vistos (SHA-256) y
+    casi duplicados (dHash a distancia de Hamming <= max_distance).
+    """
+
+    def __init__(self, max_distance=NEAR_DUPLICATE_DISTANCE):
+        self.max_distance = max_distance
+        self._digests = set()
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add(self, digest, phash):
+        with self._lock:
+            self._digests.add(digest)
+            self._hashes = np.append(self._hashes, np.uint64(phash))
+
+    def check_and_add(self, digest, phash):
+        """Devuelve None si es nuevo (y lo registra), o 'exact'/'near' si es duplicado"""
+        with self._lock:
+            if digest in self._digests:
+                return 'exact'
+            if len(self._hashes) and hamming_distances(self._hashes, phash).min() <= self.max_distance:
+                return 'near'
+            self._digests.add(digest)
+            self._hashes = np.append(self._hashes, np.uint64(phash))
+            return None
+
+
+# --- Agrupamiento de duplicados en conjuntos completos ------------------------
+
+CLUSTER_TILE_SIZE = 4096
+
+
+def _connected_components(n, rows, cols):
+    """Etiqueta de componente conexa de cada nodo dadas las aristas (rows, cols)"""
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    if len(rows) == 0:
+        return np.arange(n)
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    return labels
+
+
+def cluster_hashes(hashes, max_distance=NEAR_DUPLICATE_DISTANCE, tile_size=1024):
+    """
+    Agrupa hashes a distancia de Hamming <= max_distance (clausura transitiva).
+    Las distancias se calculan por bloques: XOR bloque contra bloque y conteo
+    de bits con una tabla de 256 entradas.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    n = len(hashes)
+    rows, cols = [], []
+    for i in range(0, n, tile_size):
+        for j in range(i, n, tile_size):
+            xor = hashes[i:i + tile_size, None] ^ hashes[None, j:j + tile_size]
+            distances = _popcount(xor)
+            r, c = np.nonzero(distances <= max_distance)
+            r, c = r + i, c + j
+            keep = c > r
+            rows.append(r[keep])
+            cols.append(c[keep])
+    return _connected_components(n, np.concatenate(rows) if rows else [], np.concatenate(cols) if cols else [])
+
+
+def cluster_embeddings(X, max_cosine_distance=0.02, tile_size=CLUSTER_TILE_SIZE):
+    """Agrupa embeddings con distancia coseno <= umbral, con similitud por bloques float32"""
+    X = np.asarray(X, dtype=np.float32)
+    X = X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+    n = len(X)
+    min_similarity = np.float32(1.0 - max_cosine_distance)
+    rows, cols = [], []
+    for i in range(0, n, tile_size):
+        for j in range(i, n, tile_size):
+            similarity = X[i:i + tile_size] @ X[j:j + tile_size].T
+            r, c = np.nonzero(similarity >= min_similarity)
+            r, c = r + i, c + j
+            keep = c > r
+            rows.append(r[keep])
+            cols.append(c[keep])
+    return _connected_components(n, np.concatenate(rows) if rows else [], np.concatenate(cols) if cols else [])
+
+
+def choose_representatives(clusters, scores):
+    """Índice con mayor `score` de cada grupo; devuelve máscara de elementos a conservar"""
+    order = np.lexsort((-np.asarray(scores, dtype=np.float64), clusters))
+    first = np.r_[True, clusters[order][1:] != clusters[order][:-1]]
+    keep = np.zeros(len(clusters), dtype=bool)
+    keep[order[first]] = True
+    return keep
+
+
+def dedup_embeddings(X, y, max_cosine_distance=0.02):
+    """
+    Conserva un embedding por grupo de casi duplicados dentro de cada etiqueta
+    (el más cercano al centro del grupo). Devuelve (máscara_conservar, reporte).
+    """
+    X = np.asarray(X)
+    y = np.asarray(y)
+    keep = np.zeros(len(y), dtype=bool)
+    report = {'max_cosine_distance': max_cosine_distance, 'labels': {}}
+    for label in np.unique(y):
+        idx = np.flatnonzero(y == label)
+        clusters = cluster_embeddings(X[idx], max_cosine_distance)
+        Xn = X[idx] / np.maximum(np.linalg.norm(X[idx], axis=1, keepdims=True), 1e-12)
+        sums = np.zeros((clusters.max() + 1, X.shape[1]))
+        np.add.at(sums, clusters, Xn)
+        centrality = np.einsum('ij,ij->i', Xn, sums[clusters])
+        label_keep = choose_representatives(clusters, centrality)
+        keep[idx[label_keep]] = True
+        sizes = np.bincount(clusters)
+        report['labels'][int(label)] = {
+            'samples': int(len(idx)),
+            'kept': int(label_keep.sum()),
+            'removed': int((~label_keep).sum()),
+            'largest_cluster': int(sizes.max()),
+            'removed_indices': idx[~label_keep].tolist(),
+        }
+    return keep, report
+
+
+def dedup_image_directory(directory, max_distance=NEAR_DUPLICATE_DISTANCE, duplicates_dir=None):
+    """
+    Agrupa las imágenes de un directorio por dHash y conserva la de mayor
+    resolución de cada grupo. Si se indica `duplicates_dir`, el resto se mueve
+    allí (nunca se borra nada).
+    """
+    from PIL import UnidentifiedImageError
+
+    directory = Path(directory)
+    files, hashes, pixels = [], [], []
+    for img_file in sorted(directory.glob('*')):
+        if img_file.suffix.lower() not in ('.jpg', '.jpeg', '.png'):
+            continue
+        try:
+            with Image.open(img_file) as img:
+                pixels.append(img.size[0] * img.size[1])
+                hashes.append(dhash(img))
+            files.append(img_file)
+        except (UnidentifiedImageError, OSError) as e:
+            logger.warning(f"No se pudo leer {img_file.name}: {e}")
+
+    report = {'directory': str(directory), 'images': len(files), 'clusters': []}
+    if not files:
+        report.update({'kept': 0, 'removed': 0})
+        return report
+
+    clusters = cluster_hashes(hashes, max_distance)
+    keep = choose_representatives(clusters, pixels)
+    for cluster in np.unique(clusters[~keep]):
+        members = np.flatnonzero(clusters == cluster)
+        report['clusters'].append({
+            'kept': files[members[keep[members]][0]].name,
+            'removed': [files[m].name for m in members if not keep[m]],
+        })
+
+    if duplicates_dir is not None:
+        duplicates_dir = Path(duplicates_dir)
+        duplicates_dir.mkdir(parents=True, exist_ok=True)
+        for idx in np.flatnonzero(~keep):
+            os.replace(files[idx], duplicates_dir / files[idx].name)
+
+    report.update({'kept': int(keep.sum()), 'removed': int((~keep).sum()), 'applied': duplicates_dir is not None})
+    logger.info(f"{directory}: {len(files)} imágenes, {int((~keep).sum())} casi duplicadas "
+                f"en {len(report['clusters'])} grupo(s)")
+    return report
+
+
+def save_report(report, filename, reports_dir='reports'):
+    reports_path = Path(reports_dir)
+    reports_path.mkdir(parents=True, exist_ok=True)
+    report_file = reports_path / filename
+    with open(report_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Reporte de duplicados guardado en: {report_file}")
+    return report_file
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Eliminación de casi duplicados")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    images = sub.add_parser('images', help="Agrupa imágenes por hash perceptual")
+    images.add_argument('--data-dir', default='data')
+    images.add_argument('--labels', nargs='+', default=['me', 'not_me'])
+    images.add_argument('--max-distance', type=int, default=NEAR_DUPLICATE_DISTANCE)
+    images.add_argument('--apply', action='store_true',
+                        help="Mueve los duplicados a data/duplicates/<label>/ (por defecto solo reporta)")
+
+    embeddings = sub.add_parser('embeddings', help="Agrupa embeddings por distancia coseno")
+    embeddings.add_argument('--input', default='data/embeddings.npz')
+    embeddings.add_argument('--output', default='data/embeddings_dedup.npz')
+    embeddings.add_argument('--max-cosine-distance', type=float, default=0.02)
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+
+    try:
+        if args.command == 'images':
+            data_dir = Path(args.data_dir)
+            reports = {}
+            for label in args.labels:
+                duplicates_dir = data_dir / 'duplicates' / label if args.apply else None
+                reports[label] = dedup_image_directory(data_dir / label, args.max_distance, duplicates_dir)
+            save_report(reports, 'dedup_images.json')
+        else:
+            data = np.load(args.input)
+            from quantization import decode_embeddings
+            X, y = decode_embeddings(data), data['labels']
+            keep, report = dedup_embeddings(X, y, args.max_cosine_distance)
+            np.savez(args.output, embeddings=X[keep], labels=y[keep])
+            logger.info(f"Embeddings conservados: {int(keep.sum())} de {len(y)} -> {args.output}")
+            save_report(report, 'dedup_embeddings.json')
+    except Exception as e:
+        logger.error(f"Error en la eliminación de duplicados: {e}")
+        raise
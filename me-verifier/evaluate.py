@@ -1,14 +1,25 @@
+import argparse
+import importlib.util
+import multiprocessing
+import time
 import numpy as np
 import joblib
 import json
+from scipy.special import ndtri
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
 from pathlib import Path
-import matplotlib.pyplot as plt
-import seaborn as sns
 from logger import setup_logger
+from quantization import PRECISIONS, ProductQuantizer, decode_embeddings, roundtrip
 
 logger = setup_logger(__name__)
 
+CONFIG_FILE = Path(__file__).parent / 'api' / 'config.py'
+MAX_CURVE_POINTS = 1000
+PAIR_TILE_SIZE = 4096
+PAIR_SCORE_BINS = 20000
+# (precision, PQ subspaces) compared by --precision-report
+PRECISION_CONFIGS = (('float64', None), ('float32', None), ('float16', None), ('pq', 32), ('pq', 16), ('pq', 8))
+
 def load_model_and_scaler(model_path='models/model.joblib', scaler_path='models/scaler.joblib'):
     try:
         model = joblib.load(model_path)
@@ -97,11 +108,252 @@ def save_metrics(accuracy, cm, report, y):
         raise
 
 
+def threshold_sweep(scores, labels, sample_weight=None):
+    """
+    FAR/FRR/TPR for every distinct threshold (accept if score >= threshold).
+    Scores are sorted once and counts come from cumulative sums, so the cost
+    is O(n log n) regardless of the number of thresholds.
+    """
+    scores = np.asarray(scores, dtype=np.float64).ravel()
+    labels = np.asarray(labels).ravel() == 1
+    weights = np.ones_like(scores) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+
+    order = np.argsort(-scores, kind='stable')
+    scores, labels, weights = scores[order], labels[order], weights[order]
+    tp = np.cumsum(weights * labels)
+    fp = np.cumsum(weights * ~labels)
+
+    # Last position of each run of equal scores
+    distinct = np.r_[np.flatnonzero(np.diff(scores)), scores.size - 1]
+    positives, negatives = tp[-1], fp[-1]
+    if positives == 0 or negatives == 0:
+        raise ValueError("Threshold sweep needs both genuine and impostor scores")
+
+    thresholds = np.r_[np.inf, scores[distinct]]
+    tpr = np.r_[0.0, tp[distinct] / positives]
+    far = np.r_[0.0, fp[distinct] / negatives]
+    return {
+        'thresholds': thresholds,
+        'far': far,
+        'frr': 1.0 - tpr,
+        'tpr': tpr,
+        'positives': float(positives),
+        'negatives': float(negatives),
+    }
+
+
+def equal_error_rate(sweep):
+    """EER by linear interpolation where FAR - FRR changes sign"""
+    diff = sweep['far'] - sweep['frr']
+    idx = int(np.argmax(diff >= 0))
+    if idx == 0:
+        return float(sweep['far'][0]), float(sweep['thresholds'][0])
+    d0, d1 = diff[idx - 1], diff[idx]
+    t = d0 / (d0 - d1) if d0 != d1 else 0.0
+    eer = sweep['far'][idx - 1] + t * (sweep['far'][idx] - sweep['far'][idx - 1])
+    return float(eer), float(sweep['thresholds'][idx])
+
+
+def operating_point(sweep, target_far):
+    """Lowest-FRR threshold whose FAR does not exceed the target"""
+    idx = int(np.flatnonzero(sweep['far'] <= target_far)[-1])
+    return _point(sweep, idx)
+
+
+def point_at_threshold(sweep, threshold):
+    idx = int(np.flatnonzero(sweep['thresholds'] >= threshold)[-1])
+    return dict(_point(sweep, idx), threshold=float(threshold))
+
+
+def _point(sweep, idx):
+    return {
+        'threshold': float(sweep['thresholds'][idx]),
+        'far': float(sweep['far'][idx]),
+        'frr': float(sweep['frr'][idx]),
+        'tpr': float(sweep['tpr'][idx]),
+    }
+
+
+def downsample_curve(sweep, max_points=MAX_CURVE_POINTS):
+    n = sweep['thresholds'].size
+    idx = np.unique(np.linspace(0, n - 1, min(n, max_points)).round().astype(int))
+    return {key: sweep[key][idx] for key in ('thresholds', 'far', 'frr', 'tpr')}
+
+
+def serving_threshold():
+    """THRESHOLD from api/config.py without importing the Flask app"""
+    try:
+        spec = importlib.util.spec_from_file_location('me_verifier_config', CONFIG_FILE)
+        config = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(config)
+        return float(config.THRESHOLD)
+    except Exception as e:
+        logger.warning(f"Could not read serving threshold: {e}")
+        return None
+
+
+def analyze_thresholds(scores, labels, target_far=0.01, sample_weight=None, current_threshold=None):
+    sweep = threshold_sweep(scores, labels, sample_weight)
+    eer, eer_threshold = equal_error_rate(sweep)
+    target = operating_point(sweep, target_far)
+    # Only the reject-everything point (threshold +inf) meets the target: no
+    # usable threshold, and JSON cannot hold Infinity
+    target_reachable = bool(np.isfinite(target['threshold']))
+    if not target_reachable:
+        target['threshold'] = None
+    auc = float(np.trapezoid(sweep['tpr'], sweep['far']) if hasattr(np, 'trapezoid')
+                else np.trapz(sweep['tpr'], sweep['far']))
+    curve = downsample_curve(sweep)
+    finite = np.isfinite(curve['thresholds'])
+    eps = 1e-6
+
+    analysis = {
+        'positives': sweep['positives'],
+        'negatives': sweep['negatives'],
+        'auc': round(auc, 6),
+        'eer': round(eer, 6),
+        'eer_threshold': eer_threshold,
+        'target_far': target_far,
+        'operating_point': target,
+        'target_far_reachable': target_reachable,
+        'recommended_threshold': target['threshold'],
+        'roc': {
+            'far': curve['far'].tolist(),
+            'tpr': curve['tpr'].tolist(),
+            'thresholds': np.where(finite, curve['thresholds'], None).tolist(),
+        },
+        'det': {
+            'far_probit': ndtri(np.clip(curve['far'], eps, 1 - eps)).tolist(),
+            'frr_probit': ndtri(np.clip(curve['frr'], eps, 1 - eps)).tolist(),
+        },
+    }
+    if current_threshold is not None:
+        analysis['current_threshold'] = point_at_threshold(sweep, current_threshold)
+
+    logger.info(f"AUC: {auc:.4f} - EER: {eer:.4f} (threshold {eer_threshold:.4f})")
+    if target_reachable:
+        logger.info(f"At FAR <= {target_far}: threshold {target['threshold']:.4f}, "
+                    f"FRR {target['frr']:.4f}")
+    else:
+        logger.warning(f"No threshold reaches FAR <= {target_far} (the highest scores already exceed it); "
+                       "no threshold recommended")
+    if current_threshold is not None:
+        current = analysis['current_threshold']
+        logger.info(f"Serving threshold {current_threshold}: FAR {current['far']:.4f}, "
+                    f"FRR {current['frr']:.4f}")
+    return analysis
+
+
+def save_threshold_analysis(analysis, filename='threshold_analysis.json'):
+    reports_dir = Path('reports')
+    reports_dir.mkdir(exist_ok=True)
+    try:
+        with open(reports_dir / filename, 'w') as f:
+            json.dump(analysis, f, indent=2)
+        logger.info(f"Threshold analysis saved to {reports_dir / filename}")
+    except IOError as e:
+        logger.error(f"Failed to save threshold analysis: {e}")
+        raise
+
+
+def _per_sample_latency_us(model, X_scaled, repeats=20):
+    """Mean time of one-row predict + predict_proba, as the API scores a request"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for row in X_scaled:
+            model.predict(row[None, :])
+            model.predict_proba(row[None, :])
+    return (time.perf_counter() - start) * 1e6 / (repeats * len(X_scaled))
+
+
+def evaluate_fast_path(model, scaler, X, threshold, models_dir='models'):
+    """Decision agreement between the prototype fast path and the full model"""
+    from fast_path import FastPathModel, full_decisions, load_prototypes
+
+    prototypes = load_prototypes(models_dir, Path(models_dir) / 'model.joblib')
+    if prototypes is None or threshold is None:
+        logger.info("No fast-path prototypes for the current model; skipping agreement check")
+        return None
+    if float(prototypes['threshold']) != threshold:
+        logger.warning(f"Prototypes were calibrated for threshold {float(prototypes['threshold'])}, "
+                       f"serving uses {threshold}; retrain to recalibrate")
+
+    X_scaled = scaler.transform(X)
+    fast_model = FastPathModel(model, prototypes)
+    full_scores, full_is_me = full_decisions(model, X_scaled, threshold)
+    fast_scores, fast_is_me = full_decisions(fast_model, X_scaled, threshold)
+    stats = fast_model.stats()
+    _, _, fast_me, fast_not_me = fast_model._route(X_scaled)
+    routed_fast = fast_me | fast_not_me
+    disagreements = np.flatnonzero(full_is_me != fast_is_me)
+
+    report = {
+        'samples': int(len(X_scaled)),
+        'threshold': threshold,
+        'band': stats['band'],
+        'fast_fraction': stats['fast_fraction'],
+        'fast_me': stats['fast_me'],
+        'fast_not_me': stats['fast_not_me'],
+        'decision_agreement': round(float(1 - len(disagreements) / len(X_scaled)), 4),
+        'disagreements': disagreements.tolist(),
+        'fast_score_mae': (round(float(np.abs(fast_scores - full_scores)[routed_fast].mean()), 4)
+                           if routed_fast.any() else None),
+        'latency_us': {
+            'full': round(_per_sample_latency_us(model, X_scaled), 2),
+            'cascade': round(_per_sample_latency_us(fast_model, X_scaled), 2),
+        },
+    }
+    logger.info(f"Fast path: {report['fast_fraction']:.1%} of test samples decided by prototypes, "
+                f"decision agreement {report['decision_agreement']:.4f} "
+                f"({len(disagreements)} disagreement(s))")
+    return report
+
+
+def _pyplot():
+    """Lazy, headless matplotlib: only the plotting process pays for the import"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def plot_roc_det(analysis, prefix=''):
+    reports_dir = Path('reports')
+    reports_dir.mkdir(exist_ok=True)
+    
+    try:
+        plt = _pyplot()
+        fig, (ax_roc, ax_det) = plt.subplots(1, 2, figsize=(12, 5))
+        ax_roc.plot(analysis['roc']['far'], analysis['roc']['tpr'])
+        ax_roc.plot([0, 1], [0, 1], linestyle='--', color='grey')
+        ax_roc.set_title(f"ROC (AUC={analysis['auc']:.4f})")
+        ax_roc.set_xlabel('False Accept Rate')
+        ax_roc.set_ylabel('True Accept Rate')
+
+        ticks = np.array([0.001, 0.01, 0.05, 0.2, 0.5])
+        ax_det.plot(analysis['det']['far_probit'], analysis['det']['frr_probit'])
+        ax_det.set_xticks(ndtri(ticks), [f"{t:g}" for t in ticks])
+        ax_det.set_yticks(ndtri(ticks), [f"{t:g}" for t in ticks])
+        ax_det.set_title(f"DET (EER={analysis['eer']:.4f})")
+        ax_det.set_xlabel('False Accept Rate')
+        ax_det.set_ylabel('False Reject Rate')
+
+        fig.tight_layout()
+        fig.savefig(reports_dir / f'{prefix}roc_det.png', dpi=150)
+        plt.close(fig)
+        logger.info(f"ROC/DET curves saved to {reports_dir / f'{prefix}roc_det.png'}")
+    except Exception as e:
+        logger.error(f"Failed to save ROC/DET curves: {e}")
+        raise
+
+
 def plot_confusion_matrix(cm):
     reports_dir = Path('reports')
     reports_dir.mkdir(exist_ok=True)
     
     try:
+        plt = _pyplot()
+        import seaborn as sns
         plt.figure(figsize=(8, 6))
         sns.heatmap(cm, annot=True, fmt='d', cmap='Blues',
                     xticklabels=['not_me', 'me'],
@@ -118,7 +370,218 @@ def plot_confusion_matrix(cm):
         raise
 
 
-def evaluate_model(test_data_file='data/test_data.npz'):
+def _render_plots(jobs):
+    for plot, args in jobs:
+        try:
+            plot(*args)
+        except Exception:
+            # Already logged by the plot function; keep rendering the rest
+            pass
+
+
+def start_plotting(jobs):
+    """
+    Render plots in a background process. Metrics are written before this is
+    called, so nothing waits on rendering; the interpreter joins the process
+    at exit.
+    """
+    process = multiprocessing.Process(target=_render_plots, args=(jobs,), name='evaluate-plots')
+    process.start()
+    logger.info(f"Rendering {len(jobs)} plot(s) in background process {process.pid}")
+    return process
+
+
+def load_labeled_embeddings(embeddings_file='data/embeddings.npz'):
+    """
+    Embeddings with identities. Without an 'identities' array every 'me'
+    sample shares one identity and each 'not_me' sample is an unknown person,
+    so not_me/not_me pairs are excluded (they might be the same person).
+    """
+    try:
+        data = np.load(embeddings_file)
+        X = decode_embeddings(data)
+        if 'identities' in data:
+            _, identities = np.unique(data['identities'], return_inverse=True)
+            unknown = np.zeros(len(X), dtype=bool)
+        else:
+            labels = data['labels']
+            unknown = labels != 1
+            identities = np.where(unknown, np.arange(1, len(X) + 1), 0)
+        logger.info(f"Embeddings loaded: {len(X)} samples, "
+                    f"{len(np.unique(identities[~unknown]))} known identities")
+        return X, identities, unknown
+    except FileNotFoundError as e:
+        logger.error(f"Embeddings file not found: {e}")
+        raise
+
+
+def blocked_pair_histograms(X, identities, unknown=None, tile_size=PAIR_TILE_SIZE, bins=PAIR_SCORE_BINS,
+                            pq=None, pq_codes=None):
+    """
+    Histograms of cosine similarity for genuine and impostor pairs (i < j).
+    Similarities are computed tile by tile in float32 and binned on the fly,
+    so memory is O(tile_size^2) instead of O(N^2). With a product quantizer
+    and the codes of X, sample j is only available as its code and is scored
+    against the float sample i by asymmetric distance computation.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    X = X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+    identities = np.asarray(identities)
+    unknown = np.zeros(len(X), dtype=bool) if unknown is None else np.asarray(unknown, dtype=bool)
+
+    # Known identities first: tiles made only of unknown samples are skipped
+    order = np.argsort(unknown, kind='stable')
+    X, identities, unknown = X[order], identities[order], unknown[order]
+    if pq is not None:
+        pq_codes = np.asarray(pq_codes)[order]
+        code_norms = pq.code_norms(pq_codes)
+
+    # One bincount per tile: impostor bins in [0, bins), genuine in [bins, 2 * bins)
+    counts = np.zeros(2 * bins, dtype=np.int64)
+    starts = range(0, len(X), tile_size)
+    for i in starts:
+        Xi, ids_i, unk_i = X[i:i + tile_size], identities[i:i + tile_size], unknown[i:i + tile_size]
+        if unk_i.all():
+            break
+        for j in starts:
+            if j < i:
+                continue
+            Xj, ids_j, unk_j = X[j:j + tile_size], identities[j:j + tile_size], unknown[j:j + tile_size]
+            if pq is None:
+                similarity = Xi @ Xj.T
+            else:
+                similarity = pq.adc_cosine(Xi, pq_codes[j:j + tile_size], code_norms[j:j + tile_size])
+            similarity += 1.0
+            similarity *= bins / 2.0
+            codes = np.clip(similarity.astype(np.int32), 0, bins - 1)
+            codes += (ids_i[:, None] == ids_j[None, :]) * np.int32(bins)
+            valid = None
+            if unk_i.any() and unk_j.any():
+                valid = ~(unk_i[:, None] & unk_j[None, :])
+            if i == j:
+                upper = np.triu(np.ones(codes.shape, dtype=bool), k=1)
+                valid = upper if valid is None else valid & upper
+            counts += np.bincount(codes.ravel() if valid is None else codes[valid], minlength=2 * bins)
+
+    impostor, genuine = counts[:bins], counts[bins:]
+    edges = np.linspace(-1.0, 1.0, bins + 1)
+    return genuine, impostor, (edges[:-1] + edges[1:]) / 2
+
+
+def evaluate_pairs(embeddings_file='data/embeddings.npz', target_far=0.01, tile_size=PAIR_TILE_SIZE,
+                   bins=PAIR_SCORE_BINS, scaler=None, precision='float64', pq_subspaces=16):
+    """
+    Verification metrics over all genuine/impostor pairs, scored by cosine
+    similarity. `precision` simulates the gallery stored as float32/float16
+    or as product-quantized codes (scored by ADC).
+    """
+    logger.info(f"Starting pairwise verification evaluation ({precision})...")
+    X, identities, unknown = load_labeled_embeddings(embeddings_file)
+    if scaler is not None:
+        X = scaler.transform(X)
+
+    pq = pq_codes = None
+    if precision == 'pq':
+        X = X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+        pq = ProductQuantizer(pq_subspaces).fit(X)
+        pq_codes = pq.encode(X)
+        bytes_per_embedding = pq.bytes_per_vector
+    else:
+        X, bytes_per_embedding, _ = roundtrip(X, precision)
+
+    start = time.perf_counter()
+    genuine, impostor, centers = blocked_pair_histograms(X, identities, unknown, tile_size, bins, pq, pq_codes)
+    elapsed = time.perf_counter() - start
+    n_pairs = int(genuine.sum() + impostor.sum())
+    logger.info(f"Scored {n_pairs} pairs ({int(genuine.sum())} genuine, {int(impostor.sum())} impostor) "
+                f"in {elapsed:.2f}s ({n_pairs / max(elapsed, 1e-9):.3g} pairs/s)")
+
+    keep_g, keep_i = genuine > 0, impostor > 0
+    scores = np.r_[centers[keep_g], centers[keep_i]]
+    labels = np.r_[np.ones(keep_g.sum(), dtype=int), np.zeros(keep_i.sum(), dtype=int)]
+    weights = np.r_[genuine[keep_g], impostor[keep_i]]
+    analysis = analyze_thresholds(scores, labels, target_far=target_far, sample_weight=weights)
+    analysis.update({
+        'score': 'cosine_similarity',
+        'space': 'scaled' if scaler is not None else 'raw',
+        'precision': precision,
+        'bytes_per_embedding': int(bytes_per_embedding),
+        'samples': int(len(X)),
+        'genuine_pairs': int(genuine.sum()),
+        'impostor_pairs': int(impostor.sum()),
+        'score_resolution': 2.0 / bins,
+        'elapsed_s': round(elapsed, 3),
+        'pairs_per_s': round(n_pairs / max(elapsed, 1e-9), 1),
+    })
+    return analysis
+
+
+def exclude_rows(X_all, X_exclude):
+    """Rows of X_all that do not appear (exactly) in X_exclude"""
+    def as_rows(X):
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        return X.view(np.dtype((np.void, X.dtype.itemsize * X.shape[1]))).ravel()
+
+    return X_all[~np.isin(as_rows(X_all), as_rows(X_exclude))]
+
+
+def evaluate_precisions(test_data_file='data/test_data.npz', embeddings_file='data/embeddings.npz',
+                        target_far=0.01, tile_size=PAIR_TILE_SIZE, configs=PRECISION_CONFIGS):
+    """
+    Accuracy versus storage footprint for each embedding precision: the
+    classifier metrics on the test set after a storage round trip, and the
+    pairwise verification metrics with the gallery stored at that precision.
+    PQ codebooks for the classifier are fitted on the embeddings file minus
+    the test rows, so the test set is quantized like unseen data.
+    """
+    from fast_path import full_decisions
+
+    model, scaler = load_model_and_scaler()
+    X, y = load_test_data(test_data_file)
+    X_all = decode_embeddings(np.load(embeddings_file))
+    X_fit = exclude_rows(X_all, X)
+    if len(X_all) - len(X_fit) < len(X):
+        logger.warning(f"Only {len(X_all) - len(X_fit)} of {len(X)} test samples found in {embeddings_file}; "
+                       "the remaining ones cannot be excluded from the PQ codebook fit")
+    if not len(X_fit) and any(precision == 'pq' for precision, _ in configs):
+        raise ValueError(f"{embeddings_file} has no samples outside the test set to fit the PQ codebooks")
+    threshold = serving_threshold() or 0.5
+    reference_scores, reference = full_decisions(model, scaler.transform(X), threshold)
+
+    rows = []
+    for precision, subspaces in configs:
+        name = f"pq{subspaces}" if precision == 'pq' else precision
+        if precision == 'pq' and X.shape[1] % subspaces:
+            logger.warning(f"Skipping {name}: dimension {X.shape[1]} is not divisible by {subspaces}")
+            continue
+        X_stored, bytes_per_embedding, codebook_bytes = roundtrip(X, precision, X_fit, subspaces or 16)
+        scores, decisions = full_decisions(model, scaler.transform(X_stored), threshold)
+        classifier = analyze_thresholds(scores, y, target_far=target_far)
+        pairs = evaluate_pairs(embeddings_file, target_far, tile_size, precision=precision,
+                               pq_subspaces=subspaces or 16)
+        rows.append({
+            'precision': name,
+            'bytes_per_embedding': int(bytes_per_embedding),
+            'compression': round(X.shape[1] * 8 / bytes_per_embedding, 1),
+            'codebook_bytes': codebook_bytes,
+            'classifier': {
+                'accuracy': round(float(accuracy_score(y, decisions.astype(int))), 4),
+                'auc': classifier['auc'],
+                'eer': classifier['eer'],
+                'decision_agreement': round(float((decisions == reference).mean()), 4),
+                'score_mae': round(float(np.abs(scores - reference_scores).mean()), 6),
+            },
+            'pairs': {'auc': pairs['auc'], 'eer': pairs['eer'],
+                      'frr_at_target_far': pairs['operating_point']['frr']},
+        })
+        logger.info(f"{name}: {bytes_per_embedding} B/embedding, accuracy {rows[-1]['classifier']['accuracy']:.4f}, "
+                    f"agreement {rows[-1]['classifier']['decision_agreement']:.4f}, "
+                    f"pairwise EER {pairs['eer']:.4f}")
+    return {'threshold': threshold, 'target_far': target_far, 'test_samples': int(len(y)),
+            'dimension': int(X.shape[1]), 'precisions': rows}
+
+
+def evaluate_model(test_data_file='data/test_data.npz', target_far=0.01, plots=True):
     logger.info("Starting model evaluation...")
     
     try:
@@ -132,14 +595,65 @@ def evaluate_model(test_data_file='data/test_data.npz'):
         print_classification_report(y, y_pred)
         
         save_metrics(accuracy, cm, report, y)
-        plot_confusion_matrix(cm)
+        analysis = analyze_thresholds(
+            y_proba[:, 1], y, target_far=target_far, current_threshold=serving_threshold()
+        )
+        save_threshold_analysis(analysis)
+        fast_path = evaluate_fast_path(model, scaler, X, serving_threshold())
+        if fast_path is not None:
+            save_threshold_analysis(fast_path, 'fast_path.json')
         
         logger.info("Model evaluation completed successfully")
+        if plots:
+            return start_plotting([(plot_confusion_matrix, (cm,)), (plot_roc_det, (analysis,))])
         
     except Exception as e:
         logger.error(f"Evaluation failed: {e}")
         raise
 
 
+def build_parser():
+    parser = argparse.ArgumentParser(description="Model evaluation and reports")
+    parser.add_argument('--test-data', default='data/test_data.npz')
+    parser.add_argument('--target-far', type=float, default=0.01,
+                        help="False accept rate used to pick the recommended threshold")
+    parser.add_argument('--pairs', action='store_true',
+                        help="Pairwise verification over all genuine/impostor pairs")
+    parser.add_argument('--embeddings', default='data/embeddings.npz')
+    parser.add_argument('--scaled', action='store_true',
+                        help="Score pairs in the space of models/scaler.joblib")
+    parser.add_argument('--tile-size', type=int, default=PAIR_TILE_SIZE)
+    parser.add_argument('--precision', choices=PRECISIONS, default='float64',
+                        help="Gallery storage precision for --pairs (pq: product quantization, ADC scoring)")
+    parser.add_argument('--pq-subspaces', type=int, default=16)
+    parser.add_argument('--precision-report', action='store_true',
+                        help="Accuracy versus footprint for each storage precision")
+    parser.add_argument('--no-plots', action='store_true',
+                        help="Only write metrics JSON (CI and automatic setup)")
+    return parser
+
+
+def run_pairs(args):
+    try:
+        scaler = joblib.load('models/scaler.joblib') if args.scaled else None
+        analysis = evaluate_pairs(args.embeddings, target_far=args.target_far,
+                                  tile_size=args.tile_size, scaler=scaler, precision=args.precision,
+                                  pq_subspaces=args.pq_subspaces)
+        save_threshold_analysis(analysis, 'pairwise_verification.json')
+        logger.info("Pairwise evaluation completed successfully")
+        if not args.no_plots:
+            start_plotting([(plot_roc_det, (analysis, 'pairwise_'))])
+    except Exception as e:
+        logger.error(f"Pairwise evaluation failed: {e}")
+        raise
+
+
 if __name__ == '__main__':
-    evaluate_model()
\ No newline at end of file
+    args = build_parser().parse_args()
+    if args.pairs:
+        run_pairs(args)
+    elif args.precision_report:
+        save_threshold_analysis(evaluate_precisions(args.test_data, args.embeddings, args.target_far,
+                                                    args.tile_size), 'precision_report.json')
+    else:
+        evaluate_model(args.test_data, target_far=args.target_far, plots=not args.no_plots)
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""
+Decisión en dos etapas: prototipos primero, clasificador completo solo en la duda
+
+train.py exporta models/prototypes.npz: el centroide (coseno, espacio
+escalado) de cada clase y una banda de incertidumbre sobre el margen
+cos(x, me) - cos(x, not_me). La banda se calibra para que fuera de ella el
+margen decida igual que el modelo completo (predict == 1 y predict_proba >=
+umbral), con un colchón de seguridad. Como la referencia es el propio
+modelo, se calibra sobre los datos de entrenamiento más sondas sintéticas
+(interpolaciones entre muestras con ruido) etiquetadas por el modelo, que
+cubren la zona de la frontera mucho mejor que las pocas muestras reales:
+- margen > banda alta: es_yo, sin llamar al modelo;
+- margen < banda baja: no es_yo, sin llamar al modelo;
+- dentro: SVC.predict_proba como siempre.
+El score de las decisiones rápidas es una sigmoide del margen ajustada a las
+probabilidades del modelo completo. evaluate.py mide la concordancia sobre
+data/test_data.npz (reports/fast_path.json).
+"""
+import os
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+from classifiers import compute_class_centroids, fit_sigmoid, l2_normalize
+from logger import setup_logger
+
+logger = setup_logger("fast_path")
+
+PROTOTYPES_FILE = 'prototypes.npz'
+# Colchón (en unidades de margen coseno) a cada lado de la banda calibrada
+DEFAULT_SAFETY = 0.05
+# Sondas sintéticas para la calibración y su ruido (espacio escalado, desviación 1)
+DEFAULT_PROBES = 20000
+PROBE_NOISE = 0.5
+
+
+def cosine_margin(X_scaled, centroids):
+    similarities = l2_normalize(X_scaled) @ centroids.T
+    return similarities[:, 1] - similarities[:, 0]
+
+
+def full_decisions(model, X_scaled, threshold):
+    """(P(yo), es_yo) del modelo completo, con el criterio de la API"""
+    scores = np.asarray(model.predict_proba(X_scaled))[:, 1]
+    return scores, (np.asarray(model.predict(X_scaled)) == 1) & (scores >= threshold)
+
+
+def probe_points(X_scaled, n_probes=DEFAULT_PROBES, noise=PROBE_NOISE, random_state=42):
+    """Interpolaciones entre pares aleatorios de muestras (de cualquier clase) más ruido gaussiano"""
+    rng = np.random.default_rng(random_state)
+    a = rng.integers(0, len(X_scaled), n_probes)
+    b = rng.integers(0, len(X_scaled), n_probes)
+    lam = rng.uniform(0, 1, (n_probes, 1))
+    return lam * X_scaled[a] + (1 - lam) * X_scaled[b] + rng.normal(0, noise, (n_probes, X_scaled.shape[1]))
+
+
+def calibrate_prototypes(model, X_scaled, y, threshold, safety=DEFAULT_SAFETY, n_probes=DEFAULT_PROBES,
+                         random_state=42):
+    """Centroides, banda de incertidumbre y sigmoide del score a partir del modelo ya entrenado"""
+    X_scaled = np.asarray(X_scaled, dtype=np.float64)
+    classes = np.asarray(model.classes_)
+    centroids = compute_class_centroids(X_scaled, np.asarray(y), classes)
+    calibration = np.vstack([X_scaled, probe_points(X_scaled, n_probes, random_state=random_state)])
+    margin = cosine_margin(calibration, centroids)
+    scores, decisions = full_decisions(model, calibration, threshold)
+
+    if decisions.all() or not decisions.any():
+        # Sin ambas decisiones no hay frontera que calibrar: todo va al modelo completo
+        band_low, band_high = -np.inf, np.inf
+    else:
+        # Todo es_yo queda por encima de `low` y todo no-es_yo por debajo de `high`
+        low = margin[decisions].min() - safety
+        high = margin[~decisions].max() + safety
+        band_low, band_high = min(low, high), max(low, high)
+
+    a, b = fit_sigmoid(margin, scores)
+    train_margin = margin[:len(X_scaled)]
+    fast = (train_margin < band_low) | (train_margin > band_high)
+    logger.info(f"Banda de incertidumbre [{band_low:.4f}, {band_high:.4f}] ({len(calibration)} puntos): "
+                f"{fast.mean():.1%} de entrenamiento por la vía rápida")
+    return {
+        'centroids': centroids,
+        'classes': classes,
+        'band': np.array([band_low, band_high]),
+        'sigmoid': np.array([a, b]),
+        'threshold': np.float64(threshold),
+    }
+
+
+def save_prototypes(prototypes, models_dir='models', model_digest=''):
+    """Guarda prototypes.npz ligado (por hash) al model.joblib con que se calibró"""
+    output_file = Path(models_dir) / PROTOTYPES_FILE
+    np.savez(output_file, model_digest=np.array(model_digest), **prototypes)
+    logger.info(f"Prototipos guardados en: {output_file}")
+    return output_file
+
+
+def load_prototypes(models_dir='models', model_path=None):
+    """Prototipos de models_dir, o None si no existen o no corresponden a model_path"""
+    prototypes_file = Path(models_dir) / PROTOTYPES_FILE
+    if not prototypes_file.exists():
+        return None
+    with np.load(prototypes_file) as data:
+        prototypes = {key: data[key] for key in data.files}
+    if model_path is not None:
+        from artifacts import file_digest
+        if str(prototypes.pop('model_digest')) != file_digest(model_path):
+            logger.warning(f"Prototipos desactualizados en {prototypes_file}; se usa solo el modelo completo")
+            return None
+    prototypes.pop('model_digest', None)
+    return prototypes
+
+
+class FastPathModel:
+    """
+    Envuelve el clasificador completo con la misma interfaz (predict,
+    predict_proba). Calibrado para el umbral de la API: para otro umbral
+    hay que usar el modelo completo (atributo `model`).
+    """
+
+    def __init__(self, model, prototypes):
+        self.model = model
+        self.centroids = prototypes['centroids']
+        self.band_low, self.band_high = (float(v) for v in prototypes['band'])
+        self.sigmoid_a, self.sigmoid_b = (float(v) for v in prototypes['sigmoid'])
+        self.threshold = float(prototypes['threshold'])
+        self.classes_ = np.asarray(model.classes_)
+        self._lock = threading.Lock()
+        self.metrics = {'fast_me': 0, 'fast_not_me': 0, 'full': 0}
+
+    def __getattr__(self, name):
+        if name == 'model':
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def _route(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        margin = cosine_margin(X, self.centroids)
+        return X, margin, margin > self.band_high, margin < self.band_low
+
+    def predict_proba(self, X):
+        X, margin, fast_me, fast_not_me = self._route(X)
+        full = ~(fast_me | fast_not_me)
+        p = 1.0 / (1.0 + np.exp(-(self.sigmoid_a * margin + self.sigmoid_b)))
+        # La decisión rápida manda: un es_yo rápido nunca queda por debajo del umbral
+        p = np.where(fast_me, np.maximum(p, self.threshold), p)
+        proba = np.column_stack([1 - p, p])
+        if full.any():
+            proba[full] = self.model.predict_proba(X[full])
+        with self._lock:
+            self.metrics['fast_me'] += int(fast_me.sum())
+            self.metrics['fast_not_me'] += int(fast_not_me.sum())
+            self.metrics['full'] += int(full.sum())
+        return proba
+
+    def predict(self, X):
+        X, _, fast_me, fast_not_me = self._route(X)
+        predictions = np.where(fast_me, self.classes_[1], self.classes_[0])
+        full = ~(fast_me | fast_not_me)
+        if full.any():
+            predictions[full] = self.model.predict(X[full])
+        return predictions
+
+    def stats(self):
+        with self._lock:
+            total = sum(self.metrics.values())
+            fast = self.metrics['fast_me'] + self.metrics['fast_not_me']
+            return {
+                **self.metrics,
+                'fast_fraction': round(fast / total, 4) if total else 0.0,
+                'band': [round(self.band_low, 6), round(self.band_high, 6)],
+                'threshold': self.threshold,
+            }
+
+
+def attach_fast_path(model, models_dir, model_path, threshold=None):
+    """
+    El modelo envuelto si hay prototipos vigentes para él y, con `threshold`,
+    calibrados para ese umbral de decisión; si no, el mismo modelo
+    """
+    try:
+        prototypes = load_prototypes(models_dir, model_path)
+    except Exception as e:
+        logger.warning(f"No se pudieron cargar los prototipos de {models_dir}: {e}")
+        return model
+    if prototypes is None:
+        return model
+    if threshold is not None and float(prototypes['threshold']) != float(threshold):
+        logger.warning(f"Prototipos de {models_dir} calibrados para el umbral {float(prototypes['threshold'])} "
+                       f"y la API usa {threshold}; se usa solo el modelo completo (reentrenar para recalibrar)")
+        return model
+    return FastPathModel(model, prototypes)
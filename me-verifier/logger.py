@@ -1,7 +1,139 @@
+import atexit
+import json
 import os
+import queue
 import sys
 import logging
-from logging.handlers import RotatingFileHandler
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Modo asíncrono: los loggers solo encolan; un hilo por proceso escribe a consola/archivo
+ASYNC_ENV = 'ME_VERIFIER_ASYNC_LOGS'
+# Registros JSON (una línea por registro) en lugar de texto
+JSON_ENV = 'ME_VERIFIER_LOG_JSON'
+# Conserva 1 de cada N registros DEBUG por mensaje (líneas de alta frecuencia)
+DEBUG_SAMPLE_ENV = 'ME_VERIFIER_LOG_DEBUG_SAMPLE'
+# Nivel de los loggers (DEBUG, INFO, ...); por defecto INFO, o DEBUG si hay muestreo
+LEVEL_ENV = 'ME_VERIFIER_LOG_LEVEL'
+
+
+def _env_flag(name):
+    return os.environ.get(name, '0').lower() in ('1', 'true', 'yes')
+
+
+def _log_level(sample_rate):
+    level = os.environ.get(LEVEL_ENV, '').upper()
+    if level:
+        return int(level) if level.isdigit() else level
+    # Con muestreo configurado se quieren ver (algunas) líneas DEBUG
+    return logging.DEBUG if sample_rate > 1 else logging.INFO
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por registro; el mensaje se formatea aquí (en el hilo escritor)"""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar 1 de cada `rate` registros DEBUG con la misma plantilla de mensaje"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = max(int(rate), 1)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate == 1:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            seen = self._counts.get(key, 0)
+            self._counts[key] = seen + 1
+        return seen % self.rate == 0
+
+
+class _LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler que no formatea al encolar: el registro (plantilla + args)
+    pasa tal cual a la cola y se formatea en el hilo del listener.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class _Router(logging.Handler):
+    """Reparte cada registro a los handlers del logger que lo emitió"""
+
+    def __init__(self):
+        super().__init__()
+        self.routes = {}
+
+    def handle(self, record):
+        for handler in self.routes.get(record.name, ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+
+class _AsyncLogging:
+    """Cola y listener compartidos por todos los loggers del proceso"""
+
+    def __init__(self):
+        self.router = _Router()
+        self.queue_handlers = []
+        self.queue = None
+        self.listener = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.queue = queue.SimpleQueue()
+        for handler in self.queue_handlers:
+            handler.queue = self.queue
+        self.listener = QueueListener(self.queue, self.router)
+        self.listener.start()
+
+    def attach(self, name, handlers):
+        with self._lock:
+            if self.listener is None:
+                self.start()
+            self.router.routes[name] = handlers
+            queue_handler = _LazyQueueHandler(self.queue)
+            self.queue_handlers.append(queue_handler)
+            return queue_handler
+
+    def stop(self):
+        """Vacía la cola pendiente (al salir)"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def after_fork_in_child(self):
+        # El hilo del listener no sobrevive al fork y la cola heredada puede
+        # haber quedado a medio usar: cada worker arranca una cola nueva
+        self._lock = threading.Lock()
+        if self.listener is not None:
+            self.listener = None
+            self.start()
+
+
+_async_logging = _AsyncLogging()
+atexit.register(_async_logging.stop)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_async_logging.after_fork_in_child)
+
 
 def setup_logger(name: str, log_dir: str = None, log_filename: str = None) -> logging.Logger:
     if log_dir is None:
@@ -17,18 +149,29 @@ def setup_logger(name: str, log_dir: str = None, log_filename: str = None) -> lo
     if logger.handlers:
         return logger
     
-    logger.setLevel(logging.INFO)
+    sample_rate = int(os.environ.get(DEBUG_SAMPLE_ENV, '1'))
+    logger.setLevel(_log_level(sample_rate))
     
     fmt = "%(asctime)s - %(levelname)s - %(message)s"
     datefmt = "%Y-%m-%d %H:%M:%S"
-    formatter = logging.Formatter(fmt, datefmt=datefmt)
+    if _env_flag(JSON_ENV):
+        formatter = JsonFormatter(datefmt=datefmt)
+    else:
+        formatter = logging.Formatter(fmt, datefmt=datefmt)
     
     sh = logging.StreamHandler(sys.stdout)
     sh.setFormatter(formatter)
-    logger.addHandler(sh)
     
     fh = RotatingFileHandler(logfile, maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8")
     fh.setFormatter(formatter)
-    logger.addHandler(fh)
     
-    return logger
\ No newline at end of file
+    if _env_flag(ASYNC_ENV):
+        logger.addHandler(_async_logging.attach(name, [sh, fh]))
+    else:
+        logger.addHandler(sh)
+        logger.addHandler(fh)
+    
+    if sample_rate > 1:
+        logger.addFilter(SamplingFilter(sample_rate))
+    
+    return logger
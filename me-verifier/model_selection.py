@@ -0,0 +1,198 @@
+"""
+Búsqueda de hiperparámetros con validación cruzada y successive halving
+
+Cada familia de clasificadores se busca por separado en paralelo (joblib,
+todos los núcleos). Para el SVC RBF las distancias al cuadrado entre muestras
+escaladas se calculan una sola vez (y se cachean en disco); cada candidato
+deriva su matriz de Gram con exp(-gamma * D) y la validación cruzada recorta
+filas y columnas del fold sin recalcular nada.
+"""
+import hashlib
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+from joblib import Memory
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics.pairwise import euclidean_distances
+from sklearn.model_selection import HalvingGridSearchCV, HalvingRandomSearchCV, StratifiedKFold
+from sklearn.svm import SVC
+from scipy.stats import loguniform, randint
+
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+CACHE_DIR = Path(__file__).parent / 'cache' / 'model_selection'
+
+
+class PrecomputedRBFSVC(ClassifierMixin, BaseEstimator):
+    """
+    SVC RBF que recibe distancias euclídeas al cuadrado en lugar de features.
+    Al marcarse como "pairwise", la validación cruzada recorta D[train][:, train]
+    y D[test][:, train], reutilizando la misma matriz en todos los folds.
+    """
+
+    def __init__(self, C=1.0, gamma=0.01):
+        self.C = C
+        self.gamma = gamma
+
+    def _more_tags(self):
+        return {'pairwise': True}
+
+    def __sklearn_tags__(self):
+        tags = super().__sklearn_tags__()
+        tags.input_tags.pairwise = True
+        return tags
+
+    def fit(self, D, y):
+        self.svc_ = SVC(kernel='precomputed', C=self.C)
+        self.svc_.fit(np.exp(-self.gamma * D), y)
+        self.classes_ = self.svc_.classes_
+        return self
+
+    def decision_function(self, D):
+        return self.svc_.decision_function(np.exp(-self.gamma * D))
+
+    def predict(self, D):
+        return self.svc_.predict(np.exp(-self.gamma * D))
+
+    def to_svc(self, random_state=42):
+        """SVC equivalente sobre features, con probabilidades, para servir en la API"""
+        return SVC(kernel='rbf', C=self.C, gamma=self.gamma, probability=True, random_state=random_state)
+
+
+def _squared_distances(X):
+    return euclidean_distances(X, squared=True).astype(np.float64)
+
+
+def cached_squared_distances(X, cache_dir=None):
+    """Matriz de distancias al cuadrado, cacheada en disco por contenido de X"""
+    memory = Memory(location=str(cache_dir or CACHE_DIR), verbose=0)
+    return memory.cache(_squared_distances)(np.ascontiguousarray(X))
+
+
+def search_spaces(n_features, random_state=42):
+    """Espacios de búsqueda por familia: (estimador, grid, distribuciones, usa_distancias)"""
+    gamma_scale = 1.0 / n_features
+    return {
+        'rbf_svm': (
+            PrecomputedRBFSVC(),
+            {'C': [0.1, 1, 10, 100], 'gamma': [gamma_scale * f for f in (0.1, 0.3, 1, 3, 10)]},
+            {'C': loguniform(1e-2, 1e3), 'gamma': loguniform(gamma_scale / 30, gamma_scale * 30)},
+            True,
+        ),
+        'logreg': (
+            LogisticRegression(max_iter=2000, random_state=random_state),
+            {'C': [0.001, 0.01, 0.1, 1, 10]},
+            {'C': loguniform(1e-4, 1e2)},
+            False,
+        ),
+        'random_forest': (
+            RandomForestClassifier(random_state=random_state, n_jobs=1),
+            {'n_estimators': [100, 300], 'max_depth': [None, 10, 20], 'max_features': ['sqrt', 0.3]},
+            {'n_estimators': randint(50, 400), 'max_depth': [None, 5, 10, 20],
+             'max_features': ['sqrt', 'log2', 0.3]},
+            False,
+        ),
+    }
+
+
+FAMILIES = ('rbf_svm', 'logreg', 'random_forest')
+
+
+def _data_fingerprint(X, y):
+    digest = hashlib.sha1(np.ascontiguousarray(X).tobytes())
+    digest.update(np.ascontiguousarray(y).tobytes())
+    return digest.hexdigest()[:12]
+
+
+def run_search(X_train_scaled, y_train, families=FAMILIES, strategy='grid', n_candidates=20,
+               cv=5, n_jobs=-1, scoring='accuracy', random_state=42):
+    """
+    Ejecuta la búsqueda por familias y devuelve (mejor_modelo_servible, reporte).
+    El mejor modelo se re-entrena sobre todo el conjunto de entrenamiento.
+    """
+    spaces = search_spaces(X_train_scaled.shape[1], random_state)
+    splitter = StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state)
+    distances = None
+    report = {
+        'strategy': strategy,
+        'cv': cv,
+        'scoring': scoring,
+        'train_samples': int(len(X_train_scaled)),
+        'data_fingerprint': _data_fingerprint(X_train_scaled, y_train),
+        'families': {},
+    }
+    best = None
+
+    for family in families:
+        estimator, grid, distributions, uses_distances = spaces[family]
+        if uses_distances and distances is None:
+            start = time.perf_counter()
+            distances = cached_squared_distances(X_train_scaled)
+            logger.info(f"Distancias precalculadas ({distances.shape[0]}x{distances.shape[1]}) "
+                        f"en {time.perf_counter() - start:.2f}s")
+        X_search = distances if uses_distances else X_train_scaled
+
+        if strategy == 'grid':
+            search = HalvingGridSearchCV(
+                estimator, grid, cv=splitter, scoring=scoring, factor=3,
+                resource='n_samples', n_jobs=n_jobs, random_state=random_state
+            )
+        else:
+            search = HalvingRandomSearchCV(
+                estimator, distributions, n_candidates=n_candidates, cv=splitter,
+                scoring=scoring, factor=3, resource='n_samples', n_jobs=n_jobs,
+                random_state=random_state
+            )
+
+        logger.info(f"Buscando hiperparámetros para '{family}' ({strategy})...")
+        start = time.perf_counter()
+        search.fit(X_search, y_train)
+        elapsed = time.perf_counter() - start
+
+        params = {k: (float(v) if isinstance(v, np.floating) else v) for k, v in search.best_params_.items()}
+        report['families'][family] = {
+            'best_score': round(float(search.best_score_), 4),
+            'best_params': params,
+            'n_candidates': [int(n) for n in search.n_candidates_],
+            'n_resources': [int(n) for n in search.n_resources_],
+            'search_time_s': round(elapsed, 3),
+        }
+        logger.info(f"{family}: mejor {scoring} {search.best_score_:.4f} con {params} ({elapsed:.2f}s)")
+
+        if best is None or search.best_score_ > best[1].best_score_:
+            best = (family, search)
+
+    family, search = best
+    winner = search.best_estimator_
+    if isinstance(winner, PrecomputedRBFSVC):
+        model = winner.to_svc(random_state)
+    else:
+        model = clone(winner)
+    model.fit(X_train_scaled, y_train)
+
+    report['winner'] = {
+        'family': family,
+        'estimator': model.__class__.__name__,
+        'params': report['families'][family]['best_params'],
+        'cv_score': report['families'][family]['best_score'],
+    }
+    logger.info(f"Ganador: {family} ({model.__class__.__name__}) con {scoring} CV "
+                f"{search.best_score_:.4f}")
+    return model, report
+
+
+def save_search_report(report, models_dir='models'):
+    models_path = Path(models_dir)
+    models_path.mkdir(exist_ok=True, parents=True)
+    report_file = models_path / 'search_report.json'
+    with open(report_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Reporte de búsqueda guardado en: {report_file}")
+    return report_file
@@ -0,0 +1,50 @@
+"""
+Estandarización + PCA (con blanqueo opcional) como una única transformación afín
+
+El SVC RBF evalúa un kernel por vector soporte, con un coste proporcional a
+la dimensión. ProjectedScaler reemplaza al StandardScaler de train.py
+(--pca): ajusta el escalador y la PCA por separado y al terminar los fusiona
+en transform(X) = X @ projection_ + offset_, así que la API, evaluate.py y
+la vía rápida lo usan como a cualquier escalador (scaler.transform) y
+reciben directamente el vector reducido. artifacts.py exporta la matriz y el
+desplazamiento para servirlos con mmap.
+"""
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import StandardScaler
+from sklearn.utils.validation import check_is_fitted
+
+
+class ProjectedScaler(TransformerMixin, BaseEstimator):
+    """
+    n_components: entero (número de componentes), float en (0, 1) (fracción
+    de varianza explicada a conservar) o None (todas).
+    """
+
+    def __init__(self, n_components=0.95, whiten=True, random_state=42):
+        self.n_components = n_components
+        self.whiten = whiten
+        self.random_state = random_state
+
+    def fit(self, X, y=None):
+        X = np.asarray(X, dtype=np.float64)
+        self.scaler_ = StandardScaler().fit(X)
+        X_scaled = self.scaler_.transform(X)
+        self.pca_ = PCA(n_components=self.n_components, whiten=self.whiten, svd_solver='full',
+                        random_state=self.random_state).fit(X_scaled)
+
+        # PCA.transform: (z - mean) @ components.T [/ sqrt(varianza)], con z = (x - mu) / sigma
+        components = self.pca_.components_.T
+        if self.whiten:
+            components = components / np.sqrt(self.pca_.explained_variance_)
+        self.projection_ = components / self.scaler_.scale_[:, None]
+        self.offset_ = -(self.scaler_.mean_ / self.scaler_.scale_ + self.pca_.mean_) @ components
+        self.n_features_in_ = X.shape[1]
+        self.n_components_ = int(self.pca_.n_components_)
+        self.explained_variance_ratio_ = float(self.pca_.explained_variance_ratio_.sum())
+        return self
+
+    def transform(self, X):
+        check_is_fitted(self, 'projection_')
+        return np.asarray(X, dtype=np.float64) @ self.projection_ + self.offset_
@@ -0,0 +1,144 @@
+"""
+Cascada de filtros baratos antes del modelo de embeddings
+
+Cada etapa cuesta menos que la siguiente y corta en cuanto algo falla, para
+no pagar el forward de Facenet por imágenes sin un rostro utilizable
+(DeepFace.represent con enforce_detection=False embebe el cuadro entero):
+
+1. Tamaño: la imagen debe tener un lado menor mínimo.
+2. Detector rápido: Haar sobre una copia en gris reducida a DETECT_WIDTH.
+3. Rostro: tamaño mínimo, nitidez (varianza del laplaciano), exposición y
+   contraste del recorte normalizado a QUALITY_SIDE.
+
+La API la aplica tras decodificar y scripts/crop_faces.py aplica las
+puertas de rostro a cada recorte antes de guardarlo. La validación de la
+cabecera JPEG/PNG ocurre antes, en api/upload.py.
+"""
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+from logger import setup_logger
+
+logger = setup_logger("quality")
+
+DETECT_WIDTH = 400
+QUALITY_SIDE = 160
+HAAR_CASCADE = 'haarcascade_frontalface_default.xml'
+DEFAULT_THRESHOLDS = {
+    'min_image_side': 64,
+    'min_face_side': 40,
+    'min_sharpness': 25.0,
+    'min_brightness': 35.0,
+    'max_brightness': 225.0,
+    'min_contrast': 12.0,
+}
+# Motivos de rechazo, en el orden de la cascada
+REASONS = ('image_too_small', 'no_face', 'face_too_small', 'blurry', 'too_dark', 'too_bright', 'low_contrast')
+
+
+def to_gray(img):
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+
+def load_haar_cascade():
+    """Clasificador Haar de OpenCV, o None si esta instalación no trae los XML"""
+    cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, HAAR_CASCADE))
+    if cascade.empty():
+        logger.warning("Clasificador Haar no disponible; se omite la detección rápida")
+        return None
+    return cascade
+
+
+def fast_face_boxes(gray, cascade, detect_width=DETECT_WIDTH, min_face_side=DEFAULT_THRESHOLDS['min_face_side']):
+    """Cajas (x, y, w, h) en coordenadas de `gray`, detectando sobre una copia reducida"""
+    scale = min(1.0, detect_width / gray.shape[1])
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    min_side = max(int(min_face_side * scale), 20)
+    boxes = cascade.detectMultiScale(small, scaleFactor=1.2, minNeighbors=4, minSize=(min_side, min_side))
+    return [tuple(int(round(v / scale)) for v in box) for box in boxes]
+
+
+def face_metrics(face):
+    """Nitidez, brillo y contraste de un recorte, normalizado a QUALITY_SIDE"""
+    gray = cv2.resize(to_gray(face), (QUALITY_SIDE, QUALITY_SIDE), interpolation=cv2.INTER_AREA)
+    return {
+        'side': int(min(face.shape[:2])),
+        'sharpness': float(cv2.Laplacian(gray, cv2.CV_64F).var()),
+        'brightness': float(gray.mean()),
+        'contrast': float(gray.std()),
+    }
+
+
+def face_issue(metrics, thresholds=DEFAULT_THRESHOLDS):
+    """Primer motivo de rechazo del recorte, o None si pasa las puertas"""
+    if metrics['side'] < thresholds['min_face_side']:
+        return 'face_too_small'
+    if metrics['sharpness'] < thresholds['min_sharpness']:
+        return 'blurry'
+    if metrics['brightness'] < thresholds['min_brightness']:
+        return 'too_dark'
+    if metrics['brightness'] > thresholds['max_brightness']:
+        return 'too_bright'
+    if metrics['contrast'] < thresholds['min_contrast']:
+        return 'low_contrast'
+    return None
+
+
+class QualityGate:
+    """Cascada completa sobre una imagen decodificada, con contadores por motivo"""
+
+    def __init__(self, cascade=None, thresholds=None, detect_width=DETECT_WIDTH):
+        self.cascade = cascade
+        self.thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+        self.detect_width = detect_width
+        self._lock = threading.Lock()
+        self.metrics = {'checked': 0, 'passed': 0, 'time_s': 0.0, 'rejected': dict.fromkeys(REASONS, 0)}
+
+    def check(self, img, face_gates=True):
+        """
+        (motivo o None, caja del rostro principal o None). Sin clasificador
+        Haar solo se aplica la puerta de tamaño; con face_gates=False no se
+        evalúa la calidad del rostro (p. ej. en modo multi-rostro).
+        """
+        start = time.perf_counter()
+        reason, box = self._run(img, face_gates)
+        with self._lock:
+            self.metrics['checked'] += 1
+            self.metrics['time_s'] += time.perf_counter() - start
+            if reason is None:
+                self.metrics['passed'] += 1
+            else:
+                self.metrics['rejected'][reason] += 1
+        return reason, box
+
+    def _run(self, img, face_gates):
+        if min(img.shape[:2]) < self.thresholds['min_image_side']:
+            return 'image_too_small', None
+        if self.cascade is None:
+            return None, None
+
+        gray = to_gray(img)
+        boxes = fast_face_boxes(gray, self.cascade, self.detect_width, self.thresholds['min_face_side'])
+        if not boxes:
+            return 'no_face', None
+        x, y, w, h = max(boxes, key=lambda b: b[2] * b[3])
+        if not face_gates:
+            return None, (x, y, w, h)
+        return face_issue(face_metrics(gray[y:y + h, x:x + w]), self.thresholds), (x, y, w, h)
+
+    def stats(self):
+        with self._lock:
+            checked = self.metrics['checked']
+            return {
+                **self.metrics,
+                'rejected': dict(self.metrics['rejected']),
+                'time_s': round(self.metrics['time_s'], 4),
+                'mean_ms': round(self.metrics['time_s'] * 1000 / checked, 3) if checked else 0.0,
+                'fast_detector': self.cascade is not None,
+            }
@@ -0,0 +1,165 @@
+"""
+Representaciones compactas de embeddings: float32, float16 y cuantización por producto
+
+Los .npz de embeddings guardan el array 'embeddings' en la precisión elegida
+(float64, float32 o float16) o, con 'pq', los arrays 'pq_codes' (uint8,
+un código por subespacio) y 'pq_codebooks' (centroides por subespacio) en
+su lugar. decode_embeddings() devuelve siempre un array de punto flotante,
+así que train.py, evaluate.py y dedup.py leen cualquiera de los formatos.
+
+Con PQ la búsqueda es asimétrica (ADC): la consulta queda en float y se
+compara contra los códigos con una tabla de productos internos por
+subespacio, sin reconstruir la galería:
+
+    pq = ProductQuantizer(n_subspaces=16).fit(galeria)
+    codes = pq.encode(galeria)
+    idx, sim = pq.search(consulta, codes, k=5)
+
+Una Facenet de 128 dimensiones ocupa 1024 bytes en float64, 512 en float32,
+256 en float16 y 16 con PQ de 16 subespacios. `python evaluate.py
+--precision-report` mide cuánto se pierde en cada caso.
+"""
+import os
+import sys
+
+import numpy as np
+from sklearn.cluster import KMeans
+
+sys.path.insert(0, os.path.dirname(__file__))
+from logger import setup_logger
+
+logger = setup_logger("quantization")
+
+PRECISIONS = ('float64', 'float32', 'float16', 'pq')
+DEFAULT_PRECISION = 'float32'
+DEFAULT_PQ_SUBSPACES = 16
+DEFAULT_PQ_BITS = 8
+
+
+class ProductQuantizer:
+    """
+    Divide cada vector en `n_subspaces` bloques contiguos y cuantiza cada
+    bloque con su propio k-means de 2**n_bits centroides (o menos, si hay
+    menos muestras que centroides).
+    """
+
+    def __init__(self, n_subspaces=DEFAULT_PQ_SUBSPACES, n_bits=DEFAULT_PQ_BITS, random_state=42):
+        if not 1 <= n_bits <= 8:
+            raise ValueError("n_bits debe estar entre 1 y 8 (códigos uint8)")
+        self.n_subspaces = n_subspaces
+        self.n_bits = n_bits
+        self.random_state = random_state
+        self.codebooks = None
+
+    @property
+    def dim(self):
+        return self.codebooks.shape[0] * self.codebooks.shape[2]
+
+    @property
+    def bytes_per_vector(self):
+        return self.n_subspaces * np.dtype(np.uint8).itemsize
+
+    @property
+    def codebook_bytes(self):
+        return int(self.codebooks.nbytes)
+
+    def _split(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.shape[1] % self.n_subspaces:
+            raise ValueError(f"La dimensión {X.shape[1]} no es divisible entre {self.n_subspaces} subespacios")
+        return X.reshape(len(X), self.n_subspaces, -1)
+
+    def fit(self, X):
+        blocks = self._split(X)
+        k = min(2 ** self.n_bits, len(blocks))
+        if k == len(blocks):
+            logger.warning(f"Solo {len(blocks)} muestras para {2 ** self.n_bits} centroides: "
+                           "el codebook memoriza las muestras y no mide el error real de cuantización")
+        self.codebooks = np.stack([
+            KMeans(n_clusters=k, n_init=1, random_state=self.random_state).fit(blocks[:, m]).cluster_centers_
+            for m in range(self.n_subspaces)
+        ]).astype(np.float32)
+        return self
+
+    def encode(self, X):
+        blocks = self._split(X)
+        codes = np.empty((len(blocks), self.n_subspaces), dtype=np.uint8)
+        for m in range(self.n_subspaces):
+            centroids = self.codebooks[m]
+            distances = (np.einsum('ij,ij->i', blocks[:, m], blocks[:, m])[:, None]
+                         - 2 * blocks[:, m] @ centroids.T
+                         + np.einsum('ij,ij->i', centroids, centroids)[None, :])
+            codes[:, m] = distances.argmin(axis=1)
+        return codes
+
+    def decode(self, codes):
+        codes = np.asarray(codes)
+        return self.codebooks[np.arange(self.n_subspaces), codes].reshape(len(codes), -1)
+
+    def inner_product_tables(self, Q):
+        """(n_consultas, subespacios, centroides): producto interno de cada bloque con cada centroide"""
+        return np.einsum('qmd,mkd->qmk', self._split(Q), self.codebooks)
+
+    def adc_inner(self, Q, codes):
+        """<q, decode(c)> para cada consulta y código, sumando entradas de las tablas"""
+        tables = self.inner_product_tables(Q)
+        scores = np.zeros((len(tables), len(codes)), dtype=np.float32)
+        for m in range(self.n_subspaces):
+            scores += tables[:, m, codes[:, m]]
+        return scores
+
+    def code_norms(self, codes):
+        """||decode(c)||: los subespacios son ortogonales, así que las normas se suman por bloque"""
+        squared = np.einsum('mkd,mkd->mk', self.codebooks, self.codebooks)
+        return np.sqrt(squared[np.arange(self.n_subspaces), np.asarray(codes)].sum(axis=1))
+
+    def adc_cosine(self, Q, codes, code_norms=None):
+        Q = np.asarray(Q, dtype=np.float32)
+        q_norms = np.maximum(np.linalg.norm(Q, axis=1), 1e-12)
+        code_norms = self.code_norms(codes) if code_norms is None else code_norms
+        return self.adc_inner(Q, codes) / q_norms[:, None] / np.maximum(code_norms, 1e-12)[None, :]
+
+    def search(self, q, codes, k=5):
+        """Los k códigos más similares (coseno por ADC) a una consulta: (índices, similitudes)"""
+        similarity = self.adc_cosine(np.atleast_2d(q), codes)[0]
+        k = min(k, len(similarity))
+        top = np.argpartition(-similarity, k - 1)[:k]
+        top = top[np.argsort(-similarity[top])]
+        return top, similarity[top]
+
+    def to_arrays(self):
+        return {'pq_codebooks': self.codebooks}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        codebooks = np.asarray(arrays['pq_codebooks'], dtype=np.float32)
+        pq = cls(n_subspaces=codebooks.shape[0], n_bits=max(int(np.ceil(np.log2(codebooks.shape[1]))), 1))
+        pq.codebooks = codebooks
+        return pq
+
+
+def encode_embeddings(X, precision=DEFAULT_PRECISION, pq=None, n_subspaces=DEFAULT_PQ_SUBSPACES):
+    """Arrays a guardar en el .npz para la precisión dada (el quantizer se entrena si no se pasa)"""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Precisión desconocida: {precision} (opciones: {', '.join(PRECISIONS)})")
+    if precision != 'pq':
+        return {'embeddings': np.asarray(X, dtype=precision)}
+    pq = pq or ProductQuantizer(n_subspaces).fit(X)
+    return {'pq_codes': pq.encode(X), **pq.to_arrays()}
+
+
+def decode_embeddings(data):
+    """Embeddings en punto flotante de un .npz en cualquiera de los formatos (float16 -> float32)"""
+    if 'pq_codes' in data:
+        return ProductQuantizer.from_arrays(data).decode(data['pq_codes'])
+    X = data['embeddings']
+    return X.astype(np.float32) if X.dtype == np.float16 else X
+
+
+def roundtrip(X, precision, fit_X=None, n_subspaces=DEFAULT_PQ_SUBSPACES):
+    """(X tras guardarlo en `precision` y volver a leerlo, bytes por embedding, bytes fijos del codebook)"""
+    if precision == 'pq':
+        pq = ProductQuantizer(n_subspaces).fit(X if fit_X is None else fit_X)
+        return pq.decode(pq.encode(X)), pq.bytes_per_vector, pq.codebook_bytes
+    arrays = encode_embeddings(X, precision)
+    return decode_embeddings(arrays), arrays['embeddings'].itemsize * arrays['embeddings'].shape[1], 0
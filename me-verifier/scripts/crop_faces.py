@@ -1,11 +1,17 @@
 import os
+import argparse
 import cv2
+import numpy as np
 from pathlib import Path
 import sys
 import subprocess
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from logger import setup_logger
+from quality import face_issue, face_metrics
+from shards import ShardWriter, iter_shard, list_tar_shards, record_image
 
 logger = setup_logger(__name__)
 
@@ -55,6 +61,15 @@ def crop_and_save_face(img, face_coords, img_file, output_path, face_index):
         return False
 
 
+def load_face_cascade():
+    cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+    face_cascade = cv2.CascadeClassifier(cascade_path)
+    if face_cascade.empty():
+        logger.error("Error al cargar el clasificador Haar Cascade")
+        return None
+    return face_cascade
+
+
 def is_directory_empty(directory):
     path = Path(directory)
     if not path.exists():
@@ -105,14 +120,12 @@ def download_missing_images(data_dir, label):
         return False
 
 
-def crop_faces(input_dir, output_dir, label):
+def crop_faces(input_dir, output_dir, label, quality_gates=True):
     logger.info(f"Iniciando recorte de rostros para la etiqueta: {label}")
     
     try:
-        cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        face_cascade = cv2.CascadeClassifier(cascade_path)
-        if face_cascade.empty():
-            logger.error("Error al cargar el clasificador Haar Cascade")
+        face_cascade = load_face_cascade()
+        if face_cascade is None:
             return
         
         input_path = Path(input_dir)
@@ -124,6 +137,8 @@ def crop_faces(input_dir, output_dir, label):
         count = 0
         processed = 0
         failed = 0
+        # Recortes descartados antes de llegar a embeddings.py, por motivo
+        skipped = Counter()
         
         for img_file in input_path.glob('*'):
             if not validate_image_file(img_file):
@@ -141,6 +156,13 @@ def crop_faces(input_dir, output_dir, label):
                 continue
             
             for face_idx, face_coords in enumerate(faces):
+                x, y, w, h = face_coords
+                issue = face_issue(face_metrics(img[y:y+h, x:x+w])) if quality_gates else None
+                if issue is not None:
+                    logger.debug(f"Rostro {face_idx} de {img_file} descartado: {issue}")
+                    skipped[issue] += 1
+                    continue
+                
                 if crop_and_save_face(img, face_coords, img_file, output_path, face_idx):
                     count += 1
                 else:
@@ -149,6 +171,9 @@ def crop_faces(input_dir, output_dir, label):
         logger.info(f"=== Resumen de Recorte para '{label}' ===")
         logger.info(f"Imágenes procesadas: {processed}")
         logger.info(f"Rostros recortados: {count}")
+        if skipped:
+            reasons = ', '.join(f"{reason}: {n}" for reason, n in skipped.most_common())
+            logger.info(f"Rostros descartados por calidad: {sum(skipped.values())} ({reasons})")
         logger.info(f"Operaciones fallidas: {failed}")
         logger.info(f"Salida guardada en: {output_path}")
         
@@ -157,18 +182,109 @@ def crop_faces(input_dir, output_dir, label):
         raise
 
 
+def crop_shard(shard_file, output_dir, quality_gates=True, face_cascade=None):
+    """
+    Recorta los rostros de un shard de imágenes y los escribe en un único
+    shard de recortes (<nombre del shard>-000000.tar): una lectura y una
+    escritura secuenciales, sin archivos intermedios.
+    """
+    shard_file = Path(shard_file)
+    stats = Counter()
+    face_cascade = face_cascade if face_cascade is not None else load_face_cascade()
+    if face_cascade is None:
+        stats['failed_shards'] += 1
+        return stats
+
+    with ShardWriter(output_dir, shard_file.stem, max_records=float('inf'), max_bytes=float('inf')) as writer:
+        for record in iter_shard(shard_file):
+            stats['processed'] += 1
+            data = record_image(record)
+            img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) if data else None
+            if img is None:
+                logger.warning(f"No se pudo decodificar {record['__key__']} de {shard_file.name}")
+                stats['failed'] += 1
+                continue
+
+            faces = detect_faces(img, face_cascade)
+            if len(faces) == 0:
+                stats['no_face'] += 1
+                continue
+
+            for face_idx, (x, y, w, h) in enumerate(faces):
+                face = img[y:y+h, x:x+w]
+                issue = face_issue(face_metrics(face)) if quality_gates else None
+                if issue is not None:
+                    stats[f"skipped_{issue}"] += 1
+                    continue
+                ok, encoded = cv2.imencode('.jpg', cv2.resize(face, (160, 160)))
+                if not ok:
+                    stats['failed'] += 1
+                    continue
+                writer.write({
+                    '__key__': f"{record['__key__']}_face{face_idx}",
+                    'jpg': encoded.tobytes(),
+                    'cls': record['cls'],
+                    'json': {**record.get('json', {}), 'box': [int(v) for v in (x, y, w, h)]},
+                })
+                stats['faces'] += 1
+    return stats
+
+
+def crop_faces_shards(input_path, output_dir, workers=None, quality_gates=True):
+    """Un shard por tarea en un pool de procesos; la salida es un shard de recortes por shard de entrada"""
+    shards = list_tar_shards(input_path)
+    workers = workers or os.cpu_count()
+    logger.info(f"Recortando {len(shards)} shard(s) de {input_path} con {workers} proceso(s)")
+
+    totals = Counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(crop_shard, shard, output_dir, quality_gates) for shard in shards]
+        for shard, future in zip(shards, futures):
+            stats = future.result()
+            logger.debug(f"{shard.name}: {dict(stats)}")
+            totals.update(stats)
+
+    skipped = {k[len('skipped_'):]: v for k, v in totals.items() if k.startswith('skipped_')}
+    logger.info("=== Resumen de Recorte por shards ===")
+    logger.info(f"Imágenes procesadas: {totals['processed']}")
+    logger.info(f"Rostros recortados: {totals['faces']}")
+    if skipped:
+        reasons = ', '.join(f"{reason}: {n}" for reason, n in Counter(skipped).most_common())
+        logger.info(f"Rostros descartados por calidad: {sum(skipped.values())} ({reasons})")
+    logger.info(f"Operaciones fallidas: {totals['failed'] + totals['failed_shards']}")
+    logger.info(f"Salida guardada en: {output_dir}")
+    return totals
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Detecta y recorta rostros")
+    parser.add_argument('--shards', help="Directorio (o .tar) de shards de imágenes; por defecto data/me y data/not_me")
+    parser.add_argument('--output-shards', default='data/shards/cropped',
+                        help="Directorio de salida de los shards de recortes")
+    parser.add_argument('--workers', type=int, default=None, help="Procesos (por defecto, uno por CPU)")
+    parser.add_argument('--no-quality-gates', action='store_true', help="No descartar recortes de baja calidad")
+    return parser
+
+
 if __name__ == '__main__':
+    args = build_parser().parse_args()
     logger.info("Iniciando script de recorte de rostros")
     
     try:
+        if args.shards:
+            crop_faces_shards(args.shards, args.output_shards, args.workers,
+                              quality_gates=not args.no_quality_gates)
+            logger.info("Recorte de rostros completado exitosamente")
+            sys.exit(0)
+
         base_dir = Path(__file__).parent.parent
         data_dir = base_dir / 'data'
         cropped_dir = data_dir / 'cropped'
         
-        crop_faces(data_dir / 'me', cropped_dir, 'me')
+        crop_faces(data_dir / 'me', cropped_dir, 'me', quality_gates=not args.no_quality_gates)
         
         download_missing_images(data_dir, 'not_me')
-        crop_faces(data_dir / 'not_me', cropped_dir, 'not_me')
+        crop_faces(data_dir / 'not_me', cropped_dir, 'not_me', quality_gates=not args.no_quality_gates)
         
         logger.info("Recorte de rostros completado exitosamente")
     except Exception as e:
@@ -0,0 +1,287 @@
+"""
+Extracción de embeddings distribuida sobre un directorio compartido
+
+La cola es un directorio en un sistema de archivos compartido (NFS, etc.)
+y cada unidad de trabajo es un shard de recortes (ver shards.py). Todas las
+transiciones son os.rename/os.replace dentro del mismo directorio raíz, que
+son atómicas, así que no hay coordinador en ejecución ni bloqueos:
+
+    todo/<unidad>.json                 pendiente
+    claimed/<unidad>@<worker>.json     tomada; el worker actualiza su mtime (latido)
+    done/<unidad>.json                 terminada; resultado en out/<unidad>.npz
+    failed/<unidad>.json               falló (p. ej. shard corrupto)
+
+Si un worker muere, su latido deja de avanzar y, pasado `lease_s`, cualquier
+worker (o el subcomando requeue) devuelve la unidad a todo/. Si el worker
+"muerto" estaba solo lento y termina igual, su resultado reemplaza al otro
+con os.replace: ambos son el mismo shard embebido, así que da igual cuál gane.
+
+    python scripts/distributed_embeddings.py plan --shards data/shards/cropped --queue /mnt/cola
+    python scripts/distributed_embeddings.py work --queue /mnt/cola       # en cada host, N veces
+    python scripts/distributed_embeddings.py status --queue /mnt/cola
+    python scripts/distributed_embeddings.py merge --queue /mnt/cola --output data/embeddings.npz
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from logger import setup_logger
+from shards import list_tar_shards
+
+logger = setup_logger(__name__)
+
+STATES = ('todo', 'claimed', 'done', 'failed')
+DEFAULT_LEASE_S = 600.0
+DEFAULT_POLL_S = 5.0
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def unit_name(path):
+    """Nombre de la unidad sin el sufijo '@<worker>' de claimed/"""
+    return Path(path).stem.split('@', 1)[0]
+
+
+def queue_dirs(queue_dir):
+    queue = Path(queue_dir)
+    return {state: queue / state for state in (*STATES, 'out', 'tmp')}
+
+
+def plan(shards_path, queue_dir):
+    """Una unidad por shard de recortes; no repite unidades ya planificadas"""
+    dirs = queue_dirs(queue_dir)
+    for path in dirs.values():
+        path.mkdir(parents=True, exist_ok=True)
+    known = {unit_name(f) for state in STATES for f in dirs[state].glob('*.json')}
+
+    created = 0
+    for index, shard in enumerate(list_tar_shards(shards_path)):
+        name = f"{index:06d}-{shard.stem}"
+        if name in known:
+            continue
+        tmp_file = dirs['tmp'] / f"{name}.json"
+        tmp_file.write_text(json.dumps({'unit': name, 'shard': str(Path(shard).resolve())}))
+        os.replace(tmp_file, dirs['todo'] / f"{name}.json")
+        created += 1
+    logger.info(f"{created} unidad(es) nuevas en {queue_dir} ({len(known)} ya existían)")
+    return created
+
+
+def claim(queue_dir, worker_id):
+    """Toma una unidad pendiente (la primera que gane el rename) o None si no quedan"""
+    dirs = queue_dirs(queue_dir)
+    for todo_file in sorted(dirs['todo'].glob('*.json')):
+        claimed_file = dirs['claimed'] / f"{todo_file.stem}@{worker_id}.json"
+        try:
+            os.rename(todo_file, claimed_file)
+        except FileNotFoundError:
+            continue  # otro worker la tomó primero
+        os.utime(claimed_file)
+        return claimed_file
+    return None
+
+
+def requeue_stale(queue_dir, lease_s=DEFAULT_LEASE_S):
+    """Devuelve a todo/ las unidades cuyo latido tiene más de `lease_s` segundos"""
+    dirs = queue_dirs(queue_dir)
+    now = time.time()
+    requeued = 0
+    for claimed_file in dirs['claimed'].glob('*.json'):
+        try:
+            if now - claimed_file.stat().st_mtime < lease_s:
+                continue
+            os.rename(claimed_file, dirs['todo'] / f"{unit_name(claimed_file)}.json")
+        except FileNotFoundError:
+            continue  # terminó o la reencoló otro
+        logger.warning(f"Unidad {claimed_file.name} sin latido hace más de {lease_s:.0f}s; reencolada")
+        requeued += 1
+    return requeued
+
+
+class Heartbeat:
+    """Hilo que actualiza el mtime del archivo reclamado mientras se procesa"""
+
+    def __init__(self, claimed_file, interval_s):
+        self.claimed_file = claimed_file
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                os.utime(self.claimed_file)
+            except FileNotFoundError:
+                # La unidad fue reencolada: se termina igual, el resultado es el mismo
+                logger.warning(f"Se perdió la unidad {self.claimed_file.name} (reencolada)")
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _finish(claimed_file, target_dir, error=None):
+    unit = json.loads(claimed_file.read_text()) if claimed_file.exists() else None
+    target_file = target_dir / f"{unit_name(claimed_file)}.json"
+    try:
+        if error is not None and unit is not None:
+            claimed_file.write_text(json.dumps({**unit, 'error': error}))
+        os.rename(claimed_file, target_file)
+    except FileNotFoundError:
+        # Reencolada mientras tanto: si ya está en todo/ se marca igual como resuelta
+        todo_file = claimed_file.parent.parent / 'todo' / target_file.name
+        try:
+            os.rename(todo_file, target_file)
+        except FileNotFoundError:
+            pass
+
+
+def process_unit(claimed_file, queue_dir, worker_id, embed_fn=None, model_name="Facenet"):
+    """Embebe el shard de la unidad y publica out/<unidad>.npz de forma atómica"""
+    from embeddings import embed_shard
+
+    dirs = queue_dirs(queue_dir)
+    unit = json.loads(claimed_file.read_text())
+    staging = dirs['tmp'] / worker_id
+    output_file, failed = embed_shard(unit['shard'], staging, model_name, embed_fn=embed_fn)
+    if output_file is None:
+        raise ValueError(f"el shard {unit['shard']} no produjo embeddings")
+    os.replace(output_file, dirs['out'] / f"{unit['unit']}.npz")
+    return failed
+
+
+def work(queue_dir, worker_id=None, lease_s=DEFAULT_LEASE_S, poll_s=DEFAULT_POLL_S, embed_fn=None,
+         model_name="Facenet", max_units=None):
+    """
+    Toma y procesa unidades hasta que no quede nada pendiente ni en curso.
+    Mientras otros workers tengan unidades tomadas espera, por si alguno
+    muere y hay que rehacer su trabajo.
+    """
+    worker_id = worker_id or default_worker_id()
+    dirs = queue_dirs(queue_dir)
+    if embed_fn is None:
+        from embeddings import load_model
+        if not load_model(model_name):
+            raise RuntimeError(f"No se pudo cargar el modelo {model_name}")
+
+    processed = 0
+    while max_units is None or processed < max_units:
+        claimed_file = claim(queue_dir, worker_id)
+        if claimed_file is None:
+            if requeue_stale(queue_dir, lease_s):
+                continue
+            if not any(dirs['claimed'].glob('*.json')):
+                break
+            time.sleep(poll_s)
+            continue
+
+        name = unit_name(claimed_file)
+        start = time.perf_counter()
+        try:
+            with Heartbeat(claimed_file, max(lease_s / 4, 0.05)):
+                failed = process_unit(claimed_file, queue_dir, worker_id, embed_fn, model_name)
+        except Exception as e:
+            logger.error(f"[{worker_id}] Unidad {name} fallida: {e}")
+            _finish(claimed_file, dirs['failed'], error=str(e))
+            continue
+        _finish(claimed_file, dirs['done'])
+        processed += 1
+        logger.info(f"[{worker_id}] Unidad {name} en {time.perf_counter() - start:.1f}s ({failed} imágenes fallidas)")
+
+    logger.info(f"[{worker_id}] Sin trabajo pendiente; {processed} unidad(es) procesadas")
+    return processed
+
+
+def status(queue_dir):
+    dirs = queue_dirs(queue_dir)
+    return {state: len(list(dirs[state].glob('*.json'))) for state in STATES}
+
+
+def merge(queue_dir, output_file, allow_partial=False):
+    """Concatena out/*.npz en orden de unidad en un único .npz (embeddings, labels, keys)"""
+    dirs = queue_dirs(queue_dir)
+    counts = status(queue_dir)
+    pending = counts['todo'] + counts['claimed']
+    if pending and not allow_partial:
+        raise RuntimeError(f"Quedan {pending} unidad(es) sin terminar; usa --allow-partial para unir igual")
+
+    done = sorted(unit_name(f) for f in dirs['done'].glob('*.json'))
+    parts = {'embeddings': [], 'labels': [], 'keys': []}
+    for name in done:
+        with np.load(dirs['out'] / f"{name}.npz") as data:
+            for key in parts:
+                parts[key].append(data[key])
+    if not done:
+        raise RuntimeError(f"No hay unidades terminadas en {queue_dir}")
+
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(output_path, **{key: np.concatenate(values) for key, values in parts.items()})
+    labels = np.concatenate(parts['labels'])
+    logger.info(f"{len(done)} unidad(es) unidas en {output_path}: {len(labels)} embeddings "
+                f"({int((labels == 1).sum())} yo, {int((labels == 0).sum())} no yo)")
+    if counts['failed']:
+        logger.warning(f"{counts['failed']} unidad(es) fallidas no incluidas (ver {dirs['failed']})")
+    return output_path
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Extracción de embeddings distribuida (cola en directorio compartido)")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    plan_parser = sub.add_parser('plan', help="Crea una unidad por shard de recortes")
+    plan_parser.add_argument('--shards', required=True, help="Directorio (o .tar) de shards de recortes")
+
+    work_parser = sub.add_parser('work', help="Procesa unidades hasta vaciar la cola")
+    work_parser.add_argument('--worker-id', default=None)
+    work_parser.add_argument('--lease', type=float, default=DEFAULT_LEASE_S,
+                             help="Segundos sin latido tras los que una unidad se reencola")
+    work_parser.add_argument('--poll', type=float, default=DEFAULT_POLL_S)
+    work_parser.add_argument('--model', default="Facenet")
+
+    requeue_parser = sub.add_parser('requeue', help="Reencola unidades de workers caídos")
+    requeue_parser.add_argument('--lease', type=float, default=DEFAULT_LEASE_S)
+
+    sub.add_parser('status', help="Unidades por estado")
+
+    merge_parser = sub.add_parser('merge', help="Une los resultados en un único .npz")
+    merge_parser.add_argument('--output', default='data/embeddings.npz')
+    merge_parser.add_argument('--allow-partial', action='store_true')
+
+    for subparser in sub.choices.values():
+        subparser.add_argument('--queue', required=True, help="Directorio compartido de la cola")
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+
+    try:
+        if args.command == 'plan':
+            plan(args.shards, args.queue)
+        elif args.command == 'work':
+            work(args.queue, args.worker_id, args.lease, args.poll, model_name=args.model)
+        elif args.command == 'requeue':
+            logger.info(f"{requeue_stale(args.queue, args.lease)} unidad(es) reencoladas")
+        elif args.command == 'status':
+            logger.info(json.dumps(status(args.queue)))
+        else:
+            merge(args.queue, args.output, args.allow_partial)
+    except Exception as e:
+        logger.error(f"Error en la extracción distribuida: {e}")
+        raise
@@ -1,11 +1,16 @@
+import argparse
+import multiprocessing
 import numpy as np
 from pathlib import Path
 import cv2
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from deepface import DeepFace
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from logger import setup_logger
+from quantization import DEFAULT_PRECISION, PRECISIONS, encode_embeddings
+from shards import iter_shard, list_tar_shards, record_image
 
 logger = setup_logger(__name__)
 
@@ -21,6 +26,13 @@ def load_model(model_name="Facenet"):
         return False
 
 
+def embed_image(img, model_name):
+    result = DeepFace.represent(img, 
+                                model_name=model_name, 
+                                enforce_detection=False)
+    return result[0]['embedding']
+
+
 def extract_embedding_from_image(img_file, model_name):
     try:
         img = cv2.imread(str(img_file))
@@ -28,11 +40,7 @@ def extract_embedding_from_image(img_file, model_name):
             logger.warning(f"No se pudo leer la imagen: {img_file}")
             return None
         
-        result = DeepFace.represent(img, 
-                                    model_name=model_name, 
-                                    enforce_detection=False)
-        
-        embedding = result[0]['embedding']
+        embedding = embed_image(img, model_name)
         logger.debug(f"Embedding extraído de: {img_file}")
         return embedding
     except Exception as e:
@@ -68,7 +76,7 @@ def process_label_directory(label_dir, label_value, model_name):
     return embeddings, labels
 
 
-def save_embeddings(embeddings, labels, output_file):
+def save_embeddings(embeddings, labels, output_file, precision=DEFAULT_PRECISION):
     try:
         if not embeddings:
             logger.warning("No hay embeddings para guardar")
@@ -77,11 +85,13 @@ def save_embeddings(embeddings, labels, output_file):
         output_path = Path(output_file)
         output_path.parent.mkdir(parents=True, exist_ok=True)
         
+        arrays = encode_embeddings(np.asarray(embeddings, dtype=np.float32), precision)
         np.savez(output_file, 
-                 embeddings=np.array(embeddings),
-                 labels=np.array(labels))
+                 labels=np.array(labels),
+                 **arrays)
         
-        logger.info(f"Embeddings guardados exitosamente en: {output_file}")
+        logger.info(f"Embeddings guardados exitosamente en: {output_file} ({precision}, "
+                    f"{sum(a.nbytes for a in arrays.values()) / 1024:.1f} KiB)")
         logger.info(f"Total de embeddings: {len(embeddings)}")
         logger.info(f"Positivos (yo): {sum(np.array(labels) == 1)}")
         logger.info(f"Negativos (no yo): {sum(np.array(labels) == 0)}")
@@ -91,7 +101,7 @@ def save_embeddings(embeddings, labels, output_file):
         return False
 
 
-def extract_embeddings(cropped_dir, output_file='embeddings.npz'):
+def extract_embeddings(cropped_dir, output_file='embeddings.npz', precision=DEFAULT_PRECISION):
     logger.info("Iniciando extracción de embeddings...")
     try:
         model_name = "Facenet"
@@ -116,7 +126,7 @@ def extract_embeddings(cropped_dir, output_file='embeddings.npz'):
         embeddings.extend(not_me_embeddings)
         labels.extend(not_me_labels)
         
-        save_embeddings(embeddings, labels, output_file)
+        save_embeddings(embeddings, labels, output_file, precision)
         logger.info("Extracción de embeddings completada exitosamente")
         
     except Exception as e:
@@ -124,15 +134,97 @@ def extract_embeddings(cropped_dir, output_file='embeddings.npz'):
         raise
 
 
+def embed_shard(shard_file, output_dir, model_name="Facenet", embed_fn=None):
+    """
+    Embeddings de un shard de recortes como un shard .npz sin comprimir
+    (<nombre del shard>.npz), legible por `train.py --streaming`.
+    """
+    shard_file = Path(shard_file)
+    embed_fn = embed_fn or (lambda img: embed_image(img, model_name))
+    keys, embeddings, labels = [], [], []
+    failed = 0
+
+    for record in iter_shard(shard_file):
+        data = record_image(record)
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) if data else None
+        if img is None:
+            failed += 1
+            continue
+        try:
+            embeddings.append(embed_fn(img))
+        except Exception as e:
+            logger.error(f"Error al extraer embedding de {record['__key__']} ({shard_file.name}): {e}")
+            failed += 1
+            continue
+        keys.append(record['__key__'])
+        labels.append(record['cls'])
+
+    if not embeddings:
+        logger.warning(f"Sin embeddings en {shard_file.name}")
+        return None, failed
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    output_file = output_path / f"{shard_file.stem}.npz"
+    np.savez(output_file,
+             embeddings=np.asarray(embeddings, dtype=np.float32),
+             labels=np.asarray(labels),
+             keys=np.asarray(keys))
+    return output_file, failed
+
+
+def extract_embeddings_shards(crop_shards, output_dir, workers=1, model_name="Facenet"):
+    """
+    Un shard de recortes por tarea. Cada proceso carga el modelo una vez; se
+    usa 'spawn' porque TensorFlow no sobrevive a un fork con el runtime ya
+    inicializado.
+    """
+    shards = list_tar_shards(crop_shards)
+    logger.info(f"Extrayendo embeddings de {len(shards)} shard(s) con {workers} proceso(s)")
+
+    files, failed = [], 0
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=load_model, initargs=(model_name,)) as pool:
+        futures = [pool.submit(embed_shard, shard, output_dir, model_name) for shard in shards]
+        for shard, future in zip(shards, futures):
+            output_file, shard_failed = future.result()
+            failed += shard_failed
+            if output_file is not None:
+                files.append(output_file)
+                logger.info(f"{shard.name} -> {output_file}")
+
+    logger.info(f"Se escribieron {len(files)} shard(s) de embeddings en: {output_dir} ({failed} fallidos)")
+    return files
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Extrae embeddings faciales")
+    parser.add_argument('--shards', help="Directorio (o .tar) de shards de recortes; por defecto data/cropped")
+    parser.add_argument('--output-shards', default='data/embeddings_shards',
+                        help="Directorio de salida de los shards .npz")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Procesos (cada uno carga su propia copia del modelo)")
+    parser.add_argument('--precision', choices=PRECISIONS, default=DEFAULT_PRECISION,
+                        help="Precisión de data/embeddings.npz (pq: cuantización por producto)")
+    return parser
+
+
 if __name__ == '__main__':
+    args = build_parser().parse_args()
     logger.info("Iniciando script de extracción de embeddings")
     
     try:
+        if args.shards:
+            extract_embeddings_shards(args.shards, args.output_shards, args.workers)
+            logger.info("Script completado exitosamente")
+            sys.exit(0)
+
         base_dir = Path(__file__).parent.parent
         data_dir = base_dir / 'data'
         output_path = data_dir / 'embeddings.npz'
         
-        extract_embeddings(data_dir / 'cropped', output_file=output_path)
+        extract_embeddings(data_dir / 'cropped', output_file=output_path, precision=args.precision)
         logger.info("Script completado exitosamente")
     except Exception as e:
         logger.error(f"Error en el script: {e}")
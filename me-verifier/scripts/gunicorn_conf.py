@@ -0,0 +1,40 @@
+"""
+Configuración de Gunicorn para la API
+"""
+import importlib.util
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+CONFIG_FILE = Path(__file__).parent.parent / 'api' / 'config.py'
+
+
+def _load_config():
+    # Por ruta: importar el paquete api cargaría Flask y DeepFace en el master
+    spec = importlib.util.spec_from_file_location('me_verifier_config', CONFIG_FILE)
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    return config
+
+
+def on_starting(server):
+    """Exporta una vez (en el master) los artefactos mapeados que comparten los workers"""
+    from artifacts import ensure_serving_artifacts
+
+    config = _load_config()
+    if config.USE_MMAP_ARTIFACTS:
+        ensure_serving_artifacts(config.MODEL_PATH, config.SCALER_PATH, config.SERVING_DIR)
+
+
+def post_worker_init(worker):
+    """Carga modelo y escalador en cada worker (initialize_app solo corre con python -m api.app)"""
+    from api.init import model_loader, model_registry
+
+    if not model_loader.is_ready():
+        model_loader.load_all()
+    for tenant in sorted(model_registry.pinned):
+        try:
+            model_registry.pin(tenant)
+        except Exception as e:
+            worker.log.warning(f"No se pudo cargar el tenant fijado '{tenant}': {e}")
@@ -3,9 +3,17 @@
 
 cd "$(dirname "$0")/.."
 
+# Logs asíncronos (cola + hilo escritor por worker); ME_VERIFIER_LOG_JSON=1 para JSON
+export ME_VERIFIER_ASYNC_LOGS="${ME_VERIFIER_ASYNC_LOGS:-1}"
+
+# gthread: varios hilos por worker esperan turno en el planificador de
+# inferencia (X-Priority: interactive > batch, bulk solo con capacidad libre)
 gunicorn \
+    --config scripts/gunicorn_conf.py \
     --bind 0.0.0.0:5000 \
     --workers 4 \
+    --worker-class gthread \
+    --threads 4 \
     --timeout 120 \
     --access-logfile - \
     --error-logfile - \
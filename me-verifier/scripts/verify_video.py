@@ -0,0 +1,355 @@
+"""
+Verificación sobre video o stream (archivo, URL MJPEG/RTSP o índice de cámara)
+
+No se detecta ni se embebe en cada frame:
+- La detección (Haar, como crop_faces.py) corre cada `detect_interval` frames;
+  el intervalo se duplica mientras las caras detectadas coinciden con las
+  seguidas y vuelve al mínimo cuando se pierde o aparece una.
+- Entre detecciones cada rostro se sigue con matchTemplate en una ventana
+  alrededor de su última posición, sobre el frame reducido en gris.
+- Cada track se embebe (Facenet, en un único batch) al aparecer y luego cada
+  `embed_interval` frames; su score es una media exponencial de P(yo). El
+  recorte recibe el preprocesado del entrenamiento (160x160 como
+  crop_faces.py, detección y alineación de DeepFace.represent) para que los
+  scores sean comparables con el umbral de la API.
+- Con --realtime, si el procesamiento se atrasa respecto al reloj del video
+  se descartan frames con grab() (sin convertirlos).
+
+    python scripts/verify_video.py --source video.mp4
+    python scripts/verify_video.py --source http://camara/mjpg --realtime
+"""
+import argparse
+import json
+import sys
+import time
+from itertools import count
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+PROCESS_WIDTH = 480
+# Tamaño de los recortes de entrenamiento (crop_faces.py)
+CROP_SIZE = 160
+DETECT_INTERVAL_MIN = 2
+DETECT_INTERVAL_MAX = 16
+EMBED_INTERVAL = 15
+TRACK_MIN_MATCH = 0.5
+TRACK_MATCH_IOU = 0.3
+EMA_ALPHA = 0.3
+MIN_OBSERVATIONS = 3
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+class Track:
+    """Rostro seguido entre frames, con su score acumulado"""
+
+    def __init__(self, track_id, box, gray, frame_idx):
+        self.id = track_id
+        self.first_frame = frame_idx
+        self.last_frame = frame_idx
+        self.last_embed_frame = None
+        self.score_ema = None
+        self.scores = []
+        self.reset(box, gray, frame_idx)
+
+    def reset(self, box, gray, frame_idx):
+        """Reancla el track a una detección (evita la deriva del template)"""
+        x, y, w, h = box
+        self.box = (int(x), int(y), int(w), int(h))
+        self.template = gray[y:y + h, x:x + w].copy()
+        self.last_frame = frame_idx
+
+    def add_score(self, score):
+        score = float(score)
+        self.scores.append(score)
+        self.score_ema = score if self.score_ema is None else EMA_ALPHA * score + (1 - EMA_ALPHA) * self.score_ema
+
+    def summary(self, threshold, scale):
+        x, y, w, h = self.box
+        return {
+            'id': self.id,
+            'first_frame': self.first_frame,
+            'last_frame': self.last_frame,
+            'last_box': {'x': int(x * scale), 'y': int(y * scale), 'w': int(w * scale), 'h': int(h * scale)},
+            'observations': len(self.scores),
+            'score_ema': None if self.score_ema is None else round(self.score_ema, 4),
+            'score_mean': round(float(np.mean(self.scores)), 4) if self.scores else None,
+            'is_me': bool(self.score_ema is not None and len(self.scores) >= MIN_OBSERVATIONS
+                          and self.score_ema >= threshold),
+        }
+
+
+def track_template(gray, track, min_match=TRACK_MIN_MATCH):
+    """Nueva caja del track buscando su template en una ventana alrededor; None si se pierde"""
+    x, y, w, h = track.box
+    pad_x, pad_y = max(w // 2, 8), max(h // 2, 8)
+    x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+    x1, y1 = min(gray.shape[1], x + w + pad_x), min(gray.shape[0], y + h + pad_y)
+    window = gray[y0:y1, x0:x1]
+    if window.shape[0] < h or window.shape[1] < w or track.template.size == 0:
+        return None
+    result = cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    if max_val < min_match:
+        return None
+    return (x0 + max_loc[0], y0 + max_loc[1], w, h)
+
+
+def haar_detector():
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    if cascade.empty():
+        raise RuntimeError("Error al cargar el clasificador Haar Cascade")
+
+    def detect(gray):
+        return [tuple(int(v) for v in box) for box in cascade.detectMultiScale(gray, 1.3, 5)]
+    return detect
+
+
+def training_faces(crops, target_size, detector_backend='opencv', extract_faces=None):
+    """
+    Batch para model.forward con el mismo preprocesado que los embeddings de
+    entrenamiento: el recorte Haar se lleva a CROP_SIZE como en crop_faces.py
+    y pasa por DeepFace.extract_faces (detección + alineación) igual que
+    DeepFace.represent en scripts/embeddings.py, que se queda con el primer
+    rostro o, si no encuentra ninguno, con el recorte entero.
+    """
+    from deepface.modules import preprocessing
+    if extract_faces is None:
+        from deepface import DeepFace
+        extract_faces = DeepFace.extract_faces
+
+    batch = []
+    for crop in crops:
+        face_objs = extract_faces(img_path=cv2.resize(crop, (CROP_SIZE, CROP_SIZE)),
+                                  detector_backend=detector_backend, enforce_detection=False, align=True)
+        # extract_faces devuelve RGB; el modelo espera BGR como en represent()
+        face = preprocessing.resize_image(face_objs[0]['face'][:, :, ::-1], (target_size[1], target_size[0]))
+        batch.append(preprocessing.normalize_input(face, normalization='base'))
+    return np.concatenate(batch, axis=0)
+
+
+def facenet_embedder(model_name="Facenet", detector_backend='opencv'):
+    """Embebe recortes BGR en un único forward, preprocesados como en el entrenamiento"""
+    from deepface.modules import modeling
+
+    model = modeling.build_model(task='facial_recognition', model_name=model_name)
+
+    def embed(crops):
+        batch = training_faces(crops, model.input_shape, detector_backend)
+        return np.asarray(model.forward(batch), dtype=np.float64).reshape(len(crops), -1)
+    return embed
+
+
+def classifier_scorer(models_dir):
+    """P(yo) con el modelo de models/ (artefactos mapeados si existen, si no joblib)"""
+    from artifacts import load_serving_artifacts, read_manifest
+
+    models_path = Path(models_dir)
+    if read_manifest(models_path / 'serving') is not None:
+        model, scaler = load_serving_artifacts(models_path / 'serving')
+    else:
+        import joblib
+        model, scaler = joblib.load(models_path / 'model.joblib'), joblib.load(models_path / 'scaler.joblib')
+
+    def score(embeddings):
+        return np.asarray(model.predict_proba(scaler.transform(embeddings)))[:, 1]
+    return score
+
+
+class VideoVerifier:
+    """
+    Orquesta detección, seguimiento y puntuación por frame. `detect_fn`,
+    `embed_fn` y `score_fn` son inyectables (gris reducido -> cajas,
+    recortes BGR -> embeddings, embeddings -> P(yo)).
+    """
+
+    def __init__(self, detect_fn, embed_fn, score_fn, threshold=0.75, process_width=PROCESS_WIDTH,
+                 detect_interval=(DETECT_INTERVAL_MIN, DETECT_INTERVAL_MAX), embed_interval=EMBED_INTERVAL):
+        self.detect_fn = detect_fn
+        self.embed_fn = embed_fn
+        self.score_fn = score_fn
+        self.threshold = threshold
+        self.process_width = process_width
+        self.min_interval, self.max_interval = detect_interval
+        self.embed_interval = embed_interval
+        self.interval = self.min_interval
+        self.next_detection = 0
+        self.tracks = []
+        self.finished = []
+        self.scale = 1.0
+        self._ids = count()
+        self.stats = {'frames_read': 0, 'frames_processed': 0, 'frames_dropped': 0,
+                      'detections': 0, 'embedding_batches': 0, 'embeddings': 0}
+
+    def _prepare(self, frame):
+        height, width = frame.shape[:2]
+        self.scale = max(width / self.process_width, 1.0)
+        small = frame if self.scale == 1.0 else cv2.resize(
+            frame, (int(round(width / self.scale)), int(round(height / self.scale))), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def _detect(self, gray, frame_idx):
+        self.stats['detections'] += 1
+        detections = self.detect_fn(gray)
+        unmatched = list(range(len(self.tracks)))
+        stable = True
+        for box in detections:
+            best = max(unmatched, key=lambda i: iou(box, self.tracks[i].box), default=None)
+            if best is not None and iou(box, self.tracks[best].box) >= TRACK_MATCH_IOU:
+                self.tracks[best].reset(box, gray, frame_idx)
+                unmatched.remove(best)
+            else:
+                self.tracks.append(Track(next(self._ids), box, gray, frame_idx))
+                stable = False
+        for i in sorted(unmatched, reverse=True):
+            self.finished.append(self.tracks.pop(i))
+            stable = False
+        # Escena estable: se espacian las detecciones; cualquier cambio vuelve al mínimo
+        if stable and self.tracks:
+            self.interval = min(self.interval * 2, self.max_interval)
+        else:
+            self.interval = self.min_interval
+        self.next_detection = frame_idx + self.interval
+
+    def _track(self, gray, frame_idx):
+        lost = False
+        for track in list(self.tracks):
+            box = track_template(gray, track)
+            if box is None:
+                self.tracks.remove(track)
+                self.finished.append(track)
+                lost = True
+            else:
+                track.box = box
+                track.last_frame = frame_idx
+        if lost:
+            self.interval = self.min_interval
+            self.next_detection = frame_idx + 1
+
+    def _score(self, frame, frame_idx):
+        due = [t for t in self.tracks
+               if t.last_embed_frame is None or frame_idx - t.last_embed_frame >= self.embed_interval]
+        if not due:
+            return
+        crops = []
+        for track in due:
+            x, y, w, h = (int(round(v * self.scale)) for v in track.box)
+            crops.append(frame[y:y + h, x:x + w])
+        scores = self.score_fn(self.embed_fn(crops))
+        for track, score in zip(due, scores):
+            track.add_score(score)
+            track.last_embed_frame = frame_idx
+        self.stats['embedding_batches'] += 1
+        self.stats['embeddings'] += len(due)
+
+    def process_frame(self, frame, frame_idx):
+        gray = self._prepare(frame)
+        if frame_idx >= self.next_detection:
+            self._detect(gray, frame_idx)
+        else:
+            self._track(gray, frame_idx)
+        self._score(frame, frame_idx)
+        self.stats['frames_processed'] += 1
+
+    def run(self, capture, realtime=False, max_frames=None):
+        """Procesa la fuente hasta agotarla; devuelve el reporte"""
+        source_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        start = time.perf_counter()
+        frame_idx = -1
+        while max_frames is None or frame_idx + 1 < max_frames:
+            frame_idx += 1
+            if realtime and (time.perf_counter() - start) > (frame_idx + 1) / source_fps:
+                # Atrasados respecto al reloj del video: se salta el frame sin decodificarlo
+                if not capture.grab():
+                    break
+                self.stats['frames_read'] += 1
+                self.stats['frames_dropped'] += 1
+                continue
+            ok, frame = capture.read()
+            if not ok:
+                break
+            self.stats['frames_read'] += 1
+            self.process_frame(frame, frame_idx)
+        elapsed = time.perf_counter() - start
+        return self.report(source_fps, elapsed)
+
+    def report(self, source_fps, elapsed):
+        tracks = [t.summary(self.threshold, self.scale)
+                  for t in sorted(self.finished + self.tracks, key=lambda t: t.id)]
+        processing_fps = self.stats['frames_read'] / elapsed if elapsed > 0 else float('inf')
+        best = max((t for t in tracks if t['score_ema'] is not None), key=lambda t: t['score_ema'], default=None)
+        return {
+            'is_me': any(t['is_me'] for t in tracks),
+            'best_track': None if best is None else best['id'],
+            'threshold': self.threshold,
+            'tracks': tracks,
+            'stats': dict(self.stats),
+            'source_fps': round(source_fps, 2),
+            'processing_fps': round(processing_fps, 2),
+            'realtime_factor': round(processing_fps / source_fps, 2) if source_fps else None,
+        }
+
+
+def open_source(source):
+    capture = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not capture.isOpened():
+        raise IOError(f"No se pudo abrir la fuente de video: {source}")
+    return capture
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Verificación sobre video o stream")
+    parser.add_argument('--source', required=True, help="Archivo, URL (MJPEG/RTSP) o índice de cámara")
+    parser.add_argument('--models-dir', default='models')
+    parser.add_argument('--model-name', default='Facenet')
+    parser.add_argument('--threshold', type=float, help="Por defecto, THRESHOLD de api/config.py")
+    parser.add_argument('--realtime', action='store_true',
+                        help="Descarta frames si el procesamiento se atrasa (streams en vivo)")
+    parser.add_argument('--max-frames', type=int)
+    parser.add_argument('--output', default='reports/video_verification.json')
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+
+    try:
+        from evaluate import serving_threshold
+        threshold = args.threshold if args.threshold is not None else serving_threshold()
+        if threshold is None:
+            raise ValueError("--threshold requerido: no se pudo leer THRESHOLD de api/config.py")
+        capture = open_source(args.source)
+        verifier = VideoVerifier(haar_detector(), facenet_embedder(args.model_name),
+                                 classifier_scorer(args.models_dir), threshold=threshold)
+        try:
+            report = verifier.run(capture, realtime=args.realtime, max_frames=args.max_frames)
+        finally:
+            capture.release()
+
+        output_file = Path(args.output)
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_file, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        logger.info(f"Tracks: {len(report['tracks'])} - Es yo: {report['is_me']} - "
+                    f"{report['processing_fps']} fps procesados ({report['realtime_factor']}x tiempo real)")
+        logger.info(f"Reporte guardado en: {output_file}")
+    except Exception as e:
+        logger.error(f"Error en la verificación de video: {e}")
+        raise
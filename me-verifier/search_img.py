@@ -1,100 +1,203 @@
+import argparse
 import os
+import re
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from pathlib import Path
-import shutil
+from urllib.parse import quote_plus
+
+import requests
+from PIL import Image, UnidentifiedImageError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 sys.path.insert(0, os.path.dirname(__file__))
 
-from bing_image_downloader import downloader
 from logger import setup_logger
+from dedup import DuplicateFilter, content_hash, dhash
 
 logger = setup_logger("descargar_fotos")
 
 QUERY = "face white man"
 LIMIT = 100
 VALID_FORMATS = ['.jpg', '.jpeg', '.png']
+FORMAT_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png'}
+
+MAX_WORKERS = 16
+TIMEOUT = 10
+RETRIES = 3
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+MIN_IMAGE_SIDE = 64
+
+BING_URL = "https://www.bing.com/images/async?q={query}&first={first}&count={count}&adlt=on"
+BING_HEADERS = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko)'}
+
+
+def make_session(pool_size=MAX_WORKERS, retries=RETRIES):
+    """Sesión con pool de conexiones por host (keep-alive) y reintentos con backoff"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=['GET'],
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(BING_HEADERS)
+    return session
 
 
-def validate_downloaded_images(directory):
+def fetch_image_urls(query, limit, session, page_size=35):
+    """Obtiene URLs de imágenes desde la búsqueda de Bing (misma fuente que bing_image_downloader)"""
+    urls = []
+    seen = set()
+    first = 0
     try:
-        logger.info(f"Validando formatos de imágenes en: {directory}")
-        path = Path(directory)
-        deleted = 0
-        
-        for img_file in path.glob('*'):
-            if img_file.suffix.lower() not in VALID_FORMATS:
-                try:
-                    img_file.unlink()
-                    logger.debug(f"Eliminado archivo inválido: {img_file.name}")
-                    deleted += 1
-                except Exception as e:
-                    logger.error(f"Error al eliminar {img_file.name}: {e}")
-        
-        if deleted > 0:
-            logger.warning(f"Se eliminaron {deleted} archivo(s) con formato inválido")
-        
-        valid_images = list(path.glob('*.jpg')) + list(path.glob('*.jpeg')) + list(path.glob('*.png'))
-        logger.info(f"Imágenes válidas después de validación: {len(valid_images)}")
-        return len(valid_images)
-        
-    except Exception as e:
-        logger.error(f"Error validando imágenes: {e}")
-        return 0
+        while len(urls) < limit:
+            response = session.get(
+                BING_URL.format(query=quote_plus(query), first=first, count=page_size),
+                timeout=TIMEOUT
+            )
+            response.raise_for_status()
+            found = re.findall(r'murl&quot;:&quot;(.*?)&quot;', response.text)
+            new = [u for u in found if u not in seen]
+            if not new:
+                break
+            seen.update(new)
+            urls.extend(new)
+            first += page_size
+    except requests.RequestException as e:
+        logger.error(f"Error buscando imágenes: {e}")
+    logger.info(f"Se encontraron {len(urls)} URLs para '{query}'")
+    return urls[:limit]
 
 
-def move_images_from_temp(temp_dir, output_dir):
+def sniff_image(content):
+    """
+    Valida la imagen leyendo solo su cabecera (formato y dimensiones).
+    Devuelve (formato, (ancho, alto)) o None si no es una imagen aceptable.
+    """
     try:
-        temp_path = Path(temp_dir)
-        output_path = Path(output_dir)
-        
-        if not temp_path.exists():
-            logger.warning(f"Directorio temporal no encontrado: {temp_dir}")
-            return 0
-        
-        moved = 0
-        for img_file in temp_path.rglob('*'):
-            if img_file.is_file() and img_file.suffix.lower() in VALID_FORMATS:
-                try:
-                    shutil.move(str(img_file), str(output_path / img_file.name))
-                    moved += 1
-                    logger.debug(f"Movida imagen: {img_file.name}")
-                except Exception as e:
-                    logger.error(f"Error moviendo {img_file.name}: {e}")
-        
+        img = Image.open(BytesIO(content))
+    except (UnidentifiedImageError, OSError):
+        return None
+    if img.format not in FORMAT_EXTENSIONS:
+        return None
+    if min(img.size) < MIN_IMAGE_SIDE:
+        return None
+    return img.format, img.size
+
+
+def load_existing_hashes(output_dir, duplicate_filter):
+    """Registra las imágenes ya presentes para no volver a añadir duplicados"""
+    count = 0
+    for img_file in Path(output_dir).glob('*'):
+        if img_file.suffix.lower() not in VALID_FORMATS:
+            continue
         try:
-            shutil.rmtree(temp_path)
-            logger.debug(f"Directorio temporal eliminado: {temp_dir}")
+            content = img_file.read_bytes()
+            duplicate_filter.add(content_hash(content), dhash(content))
+            count += 1
         except Exception as e:
-            logger.error(f"Error eliminando directorio temporal: {e}")
-        
-        logger.info(f"Se movieron {moved} imágenes al directorio final")
-        return moved
-        
-    except Exception as e:
-        logger.error(f"Error moviendo imágenes: {e}")
-        return 0
+            logger.warning(f"No se pudo indexar {img_file.name}: {e}")
+    if count:
+        logger.info(f"Imágenes existentes indexadas: {count}")
+    return count
 
 
-def download_images(limit, query, output_dir):
-    try:
-        logger.info(f"Iniciando descarga: '{query}' (límite={limit})")
-        logger.info(f"Directorio temporal: {output_dir}")
-        
-        downloader.download(
-            query,
-            limit=limit,
-            output_dir=output_dir, 
-            adult_filter_off=False,
-            force_replace=False,
-            timeout=60,
-            verbose=False
-        )
-        logger.info("Descarga completada")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Error durante la descarga: {e}")
-        return False
+class ConcurrentDownloader:
+    """
+    Descarga concurrente con un pool de hilos acotado. Cada imagen se valida
+    por su cabecera y se descarta si es duplicado exacto o casi duplicado
+    antes de escribirse en el directorio de salida.
+    """
+
+    def __init__(self, output_dir, limit=LIMIT, max_workers=MAX_WORKERS, timeout=TIMEOUT,
+                 retries=RETRIES, max_bytes=MAX_IMAGE_BYTES, duplicate_filter=None, session=None):
+        self.output_dir = Path(output_dir)
+        self.limit = limit
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.session = session or make_session(max_workers, retries)
+        self.duplicate_filter = duplicate_filter or DuplicateFilter()
+        self.stats = {'saved': 0, 'failed': 0, 'invalid': 0, 'exact_duplicates': 0, 'near_duplicates': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _reserve_slot(self):
+        with self._lock:
+            if self.stats['saved'] >= self.limit:
+                return False
+            self.stats['saved'] += 1
+            return True
+
+    def _fetch(self, url):
+        with self.session.get(url, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            length = response.headers.get('Content-Length')
+            if length and int(length) > self.max_bytes:
+                return None
+            content = bytearray()
+            for block in response.iter_content(64 * 1024):
+                content.extend(block)
+                if len(content) > self.max_bytes:
+                    return None
+            return bytes(content)
+
+    def _process(self, url):
+        if self.stats['saved'] >= self.limit:
+            return None
+        try:
+            content = self._fetch(url)
+        except (requests.RequestException, ValueError) as e:
+            logger.debug(f"Falló la descarga de {url}: {e}")
+            self._count('failed')
+            return None
+
+        info = sniff_image(content) if content else None
+        if info is None:
+            self._count('invalid')
+            return None
+
+        try:
+            digest, phash = content_hash(content), dhash(content)
+        except Exception:
+            self._count('invalid')
+            return None
+
+        duplicate = self.duplicate_filter.check_and_add(digest, phash)
+        if duplicate == 'exact':
+            self._count('exact_duplicates')
+            return None
+        if duplicate == 'near':
+            self._count('near_duplicates')
+            return None
+        if not self._reserve_slot():
+            return None
+
+        output_file = self.output_dir / f"{digest[:16]}{FORMAT_EXTENSIONS[info[0]]}"
+        tmp_file = output_file.with_suffix(output_file.suffix + '.part')
+        tmp_file.write_bytes(content)
+        os.replace(tmp_file, output_file)
+        logger.debug(f"Imagen guardada: {output_file.name} ({info[1][0]}x{info[1][1]})")
+        return output_file
+
+    def run(self, urls):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        logger.info(f"Descargando hasta {self.limit} imágenes de {len(urls)} URLs "
+                    f"con {self.max_workers} hilos")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            saved = [f for f in executor.map(self._process, urls) if f is not None]
+        logger.info(f"=== Resumen de descarga === {self.stats}")
+        return saved
 
 
 def define_output_path():
@@ -102,42 +205,44 @@ def define_output_path():
     return base_dir
 
 
+def build_parser():
+    parser = argparse.ArgumentParser(description="Descarga de imágenes 'not_me'")
+    parser.add_argument('--query', default=QUERY)
+    parser.add_argument('--limit', type=int, default=LIMIT)
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--output-dir', default=None)
+    parser.add_argument('--urls-file', help="Archivo con una URL por línea (en lugar de buscar en Bing)")
+    return parser
+
+
 if __name__ == '__main__':
-    temp_dir = None
-    
+    args = build_parser().parse_args()
+
     try:
-        output_dir = define_output_path()
+        output_dir = args.output_dir or define_output_path()
         os.makedirs(output_dir, exist_ok=True)
-        
-        temp_dir = os.path.join(os.path.dirname(__file__), 'temp_download')
-        
+
         logger.info("=== Iniciando descarga de imágenes ===")
-        logger.info(f"Consulta: '{QUERY}'")
-        logger.info(f"Límite: {LIMIT}")
+        logger.info(f"Consulta: '{args.query}'")
+        logger.info(f"Límite: {args.limit}")
         logger.info(f"Directorio final: {output_dir}")
-        
-        if download_images(LIMIT, QUERY, temp_dir):
-            moved = move_images_from_temp(temp_dir, output_dir)
-            
-            if moved > 0:
-                valid_count = validate_downloaded_images(output_dir)
-                
-                if valid_count > 0:
-                    logger.info(f"Proceso completado exitosamente. {valid_count} imágenes válidas")
-                else:
-                    logger.warning("No se descargaron imágenes válidas")
-            else:
-                logger.warning("No se movieron imágenes")
+
+        downloader = ConcurrentDownloader(output_dir, limit=args.limit, max_workers=args.workers)
+        load_existing_hashes(output_dir, downloader.duplicate_filter)
+
+        if args.urls_file:
+            urls = [line.strip() for line in open(args.urls_file) if line.strip()]
         else:
-            logger.error("La descarga falló")
-            
+            # Se piden URLs de sobra: parte fallará o será duplicada
+            urls = fetch_image_urls(args.query, args.limit * 2, downloader.session)
+
+        saved = downloader.run(urls)
+
+        if saved:
+            logger.info(f"Proceso completado exitosamente. {len(saved)} imágenes válidas")
+        else:
+            logger.warning("No se descargaron imágenes válidas")
+
     except Exception as e:
         logger.error(f"Error en el script: {e}")
         raise
-    finally:
-        if temp_dir and os.path.exists(temp_dir):
-            try:
-                shutil.rmtree(temp_dir)
-                logger.debug("Directorio temporal limpiado")
-            except Exception as e:
-                logger.warning(f"No se pudo limpiar el directorio temporal: {e}")
\ No newline at end of file
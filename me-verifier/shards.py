@@ -0,0 +1,232 @@
+"""
+Shards tar al estilo WebDataset para imágenes y recortes
+
+Cada shard es un .tar sin comprimir con registros de miembros consecutivos
+que comparten clave: <clave>.jpg (imagen codificada), <clave>.cls (etiqueta
+0/1 en texto) y <clave>.json (metadatos). Se leen y escriben en streaming
+(tarfile en modo 'r|'/'w|' sobre un buffer grande), así que cada shard es
+una única lectura secuencial en lugar de miles de aperturas de archivos
+pequeños, que es lo que hace lento un sistema de archivos de red. Cada
+worker procesa shards completos: scripts/crop_faces.py y
+scripts/embeddings.py con --shards.
+
+    python shards.py pack data/me data/shards/raw --label 1 --prefix me
+    python shards.py pack data/not_me data/shards/raw --label 0 --prefix not_me
+    python shards.py info data/shards/raw
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tarfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(__file__))
+from logger import setup_logger
+
+logger = setup_logger("shards")
+
+IO_BUFFER_SIZE = 8 * 1024 * 1024
+DEFAULT_SHARD_RECORDS = 1000
+DEFAULT_SHARD_BYTES = 256 * 1024 * 1024
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def list_tar_shards(path):
+    """Un único .tar o un directorio de shards *.tar (orden estable)"""
+    path = Path(path)
+    if path.is_dir():
+        shards = sorted(path.glob('*.tar'))
+        if not shards:
+            raise FileNotFoundError(f"No hay shards .tar en: {path}")
+        return shards
+    if not path.exists():
+        raise FileNotFoundError(f"Shard no encontrado: {path}")
+    return [path]
+
+
+def shards_for_worker(shards, worker_index, num_workers):
+    """Reparto estático: el worker i procesa los shards i, i + n, i + 2n..."""
+    return list(shards)[worker_index::num_workers]
+
+
+def _decode_member(extension, data):
+    if extension == 'cls':
+        return int(data.decode().strip())
+    if extension == 'json':
+        return json.loads(data)
+    return data
+
+
+def iter_shard(shard_file):
+    """
+    Registros {'__key__', 'jpg'/'png', 'cls', 'json'} de un shard, leyendo el
+    tar de principio a fin una sola vez.
+    """
+    record = None
+    with open(shard_file, 'rb', buffering=IO_BUFFER_SIZE) as f, tarfile.open(fileobj=f, mode='r|') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            key, _, extension = member.name.partition('.')
+            data = tar.extractfile(member).read()
+            if record is not None and record['__key__'] != key:
+                yield record
+                record = None
+            if record is None:
+                record = {'__key__': key, '__shard__': Path(shard_file).name}
+            record[extension] = _decode_member(extension, data)
+    if record is not None:
+        yield record
+
+
+def iter_records(path):
+    for shard in list_tar_shards(path):
+        yield from iter_shard(shard)
+
+
+def _encode_member(extension, value):
+    if extension == 'cls':
+        return str(int(value)).encode()
+    if extension == 'json':
+        return json.dumps(value, ensure_ascii=False).encode()
+    return bytes(value)
+
+
+class ShardWriter:
+    """
+    Escribe registros en <output_dir>/<prefix>-000000.tar, pasando al
+    siguiente shard al llegar a `max_records` registros o `max_bytes` bytes.
+    Cada shard se escribe en un .tmp y se renombra al cerrarlo, así un lector
+    nunca ve un shard a medias; si el bloque `with` termina con una
+    excepción, el shard en curso se descarta.
+    """
+
+    def __init__(self, output_dir, prefix='shard', max_records=DEFAULT_SHARD_RECORDS,
+                 max_bytes=DEFAULT_SHARD_BYTES):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.files = []
+        self.records = 0
+        self._index = 0
+        self._file = None
+        self._tar = None
+        self._shard_records = 0
+        self._shard_bytes = 0
+
+    def _open(self):
+        self._path = self.output_dir / f"{self.prefix}-{self._index:06d}.tar"
+        self._file = open(self._path.with_suffix('.tar.tmp'), 'wb', buffering=IO_BUFFER_SIZE)
+        self._tar = tarfile.open(fileobj=self._file, mode='w|', format=tarfile.USTAR_FORMAT)
+        self._shard_records = self._shard_bytes = 0
+
+    def _close_shard(self):
+        if self._tar is None:
+            return
+        self._tar.close()
+        self._file.close()
+        os.replace(self._path.with_suffix('.tar.tmp'), self._path)
+        self.files.append(self._path)
+        self._tar = self._file = None
+        self._index += 1
+
+    def write(self, record):
+        """record: {'__key__': str, 'jpg': bytes, 'cls': int, 'json': dict, ...}"""
+        key = record['__key__']
+        if '.' in key or '/' in key:
+            raise ValueError(f"Clave inválida (sin '.' ni '/'): {key}")
+        if self._tar is not None and (self._shard_records >= self.max_records
+                                      or self._shard_bytes >= self.max_bytes):
+            self._close_shard()
+        if self._tar is None:
+            self._open()
+        for extension, value in record.items():
+            if extension.startswith('__'):
+                continue
+            data = _encode_member(extension, value)
+            info = tarfile.TarInfo(f"{key}.{extension}")
+            info.size = len(data)
+            self._tar.addfile(info, io.BytesIO(data))
+            self._shard_bytes += len(data)
+        self._shard_records += 1
+        self.records += 1
+
+    def abort(self):
+        """Descarta el shard en curso sin publicarlo (los ya cerrados se conservan)"""
+        if self._tar is None:
+            return
+        try:
+            self._tar.close()
+        finally:
+            self._file.close()
+            self._path.with_suffix('.tar.tmp').unlink(missing_ok=True)
+            self._tar = self._file = None
+
+    def close(self):
+        self._close_shard()
+        return self.files
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def pack_directory(input_dir, output_dir, label, prefix=None, max_records=DEFAULT_SHARD_RECORDS):
+    """Empaqueta las imágenes de un directorio (sin decodificarlas) en shards tar"""
+    input_path = Path(input_dir)
+    prefix = prefix or input_path.name
+    files = sorted(f for f in input_path.iterdir() if f.suffix.lower() in IMAGE_EXTENSIONS)
+    with ShardWriter(output_dir, prefix, max_records) as writer:
+        for img_file in files:
+            extension = 'png' if img_file.suffix.lower() == '.png' else 'jpg'
+            writer.write({
+                '__key__': f"{prefix}_{img_file.stem}".replace('.', '_'),
+                extension: img_file.read_bytes(),
+                'cls': label,
+                'json': {'source': img_file.name},
+            })
+    logger.info(f"{writer.records} imágenes de {input_path} empaquetadas en {len(writer.files)} shard(s)")
+    return writer.files
+
+
+def record_image(record):
+    """Bytes de la imagen del registro (jpg o png) o None"""
+    return record.get('jpg', record.get('png'))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Shards tar de imágenes (estilo WebDataset)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    pack = sub.add_parser('pack', help="Empaqueta un directorio de imágenes")
+    pack.add_argument('input_dir')
+    pack.add_argument('output_dir')
+    pack.add_argument('--label', type=int, choices=(0, 1), required=True)
+    pack.add_argument('--prefix')
+    pack.add_argument('--max-records', type=int, default=DEFAULT_SHARD_RECORDS)
+    info = sub.add_parser('info', help="Cuenta registros por shard")
+    info.add_argument('path')
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+
+    try:
+        if args.command == 'pack':
+            pack_directory(args.input_dir, args.output_dir, args.label, args.prefix, args.max_records)
+        else:
+            for shard in list_tar_shards(args.path):
+                labels = [record.get('cls') for record in iter_shard(shard)]
+                logger.info(f"{shard.name}: {len(labels)} registros ({labels.count(1)} yo, {labels.count(0)} no yo)")
+    except Exception as e:
+        logger.error(f"Error con los shards: {e}")
+        raise
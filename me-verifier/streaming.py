@@ -0,0 +1,245 @@
+"""
+Entrenamiento out-of-core sobre embeddings fragmentados (shards)
+
+Un shard es un .npz sin comprimir con los arrays 'embeddings' y 'labels'. Los
+arrays se abren con np.memmap directamente dentro del zip, así que nunca se
+carga un shard completo: se leen bloques de `chunk_size` filas. La partición
+entrenamiento/prueba es un hash determinista de (shard, fila), de modo que no
+depende del orden ni del tamaño de bloque y no requiere materializar nada.
+"""
+import json
+import zipfile
+import zlib
+from pathlib import Path
+
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+HASH_BUCKETS = 10000
+CLASSES = np.array([0, 1])
+
+
+def list_shards(path):
+    """Un único .npz o un directorio de shards *.npz (orden estable)"""
+    path = Path(path)
+    if path.is_dir():
+        shards = sorted(path.glob('*.npz'))
+        if not shards:
+            raise FileNotFoundError(f"No hay shards .npz en: {path}")
+        return shards
+    if not path.exists():
+        raise FileNotFoundError(f"Archivo de embeddings no encontrado: {path}")
+    return [path]
+
+
+def open_npz_array(npz_file, name):
+    """
+    Abre un array de un .npz como memmap de solo lectura. Si el miembro está
+    comprimido no es mapeable y se carga completo.
+    """
+    member = f"{name}.npy"
+    with zipfile.ZipFile(npz_file) as zf:
+        info = zf.getinfo(member)
+        if info.compress_type != zipfile.ZIP_STORED:
+            logger.warning(f"{npz_file}:{member} está comprimido; se carga en memoria")
+            with zf.open(member) as f:
+                return np.lib.format.read_array(f)
+
+    with open(npz_file, 'rb') as f:
+        # Cabecera local del zip: 30 bytes fijos + nombre + campo extra
+        f.seek(info.header_offset)
+        local_header = f.read(30)
+        name_len = int.from_bytes(local_header[26:28], 'little')
+        extra_len = int.from_bytes(local_header[28:30], 'little')
+        data_start = info.header_offset + 30 + name_len + extra_len
+        f.seek(data_start)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    return np.memmap(npz_file, dtype=dtype, mode='r', offset=offset, shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+def _splitmix64(values):
+    with np.errstate(over='ignore'):
+        z = values + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def hash_buckets(shard_name, rows, seed=42):
+    """Cubeta en [0, HASH_BUCKETS) de cada fila; determinista por (shard, fila, semilla)"""
+    shard_key = np.uint64(zlib.crc32(f"{seed}:{shard_name}".encode()))
+    keys = (shard_key << np.uint64(32)) ^ np.asarray(rows, dtype=np.uint64)
+    return _splitmix64(keys) % np.uint64(HASH_BUCKETS)
+
+
+def split_mask(buckets, split, test_size=0.2, val_size=0.1):
+    """
+    Prueba: [0, test); validación: [test, test + val); entrenamiento: el
+    resto. La validación sale del rango de entrenamiento, así que la
+    partición de prueba no cambia con `val_size`.
+    """
+    test_end = np.uint64(int(test_size * HASH_BUCKETS))
+    val_end = np.uint64(int(min(test_size + val_size, 1.0) * HASH_BUCKETS))
+    if split == 'test':
+        return buckets < test_end
+    if split == 'val':
+        return (buckets >= test_end) & (buckets < val_end)
+    if split == 'train':
+        return buckets >= val_end
+    raise ValueError(f"Partición desconocida: {split}")
+
+
+def iter_embedding_chunks(path, chunk_size=65536, split=None, test_size=0.2, seed=42,
+                          shuffle_rng=None, val_size=0.0):
+    """
+    Itera (X, y) en bloques de a lo sumo `chunk_size` filas.
+    `split` puede ser None (todo), 'train', 'val' o 'test'. Con `shuffle_rng`
+    se baraja el orden de shards y de bloques (no el contenido entre bloques).
+    """
+    shards = list_shards(path)
+    if shuffle_rng is not None:
+        shards = [shards[i] for i in shuffle_rng.permutation(len(shards))]
+
+    for shard in shards:
+        X_all = open_npz_array(shard, 'embeddings')
+        y_all = open_npz_array(shard, 'labels')
+        starts = np.arange(0, len(y_all), chunk_size)
+        if shuffle_rng is not None:
+            starts = shuffle_rng.permutation(starts)
+        for start in starts:
+            stop = min(start + chunk_size, len(y_all))
+            X = np.asarray(X_all[start:stop], dtype=np.float64)
+            y = np.asarray(y_all[start:stop])
+            if split is not None:
+                buckets = hash_buckets(shard.name, np.arange(start, stop), seed)
+                mask = split_mask(buckets, split, test_size, val_size)
+                X, y = X[mask], y[mask]
+            if len(y):
+                yield X, y
+
+
+def write_embedding_shards(X, y, output_dir, shard_size=100000, prefix='shard'):
+    """Escribe (X, y) como shards .npz sin comprimir (mapeables)"""
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    files = []
+    for idx, start in enumerate(range(0, len(y), shard_size)):
+        shard_file = output_path / f"{prefix}-{idx:05d}.npz"
+        np.savez(shard_file,
+                 embeddings=np.asarray(X[start:start + shard_size], dtype=np.float32),
+                 labels=np.asarray(y[start:start + shard_size]))
+        files.append(shard_file)
+    logger.info(f"Se escribieron {len(files)} shard(s) en: {output_path}")
+    return files
+
+
+def fit_streaming_scaler(path, chunk_size, test_size, seed, val_size=0.0):
+    scaler = StandardScaler()
+    counts = np.zeros(len(CLASSES), dtype=np.int64)
+    for X, y in iter_embedding_chunks(path, chunk_size, 'train', test_size, seed, val_size=val_size):
+        scaler.partial_fit(X)
+        counts += np.bincount(y, minlength=len(CLASSES))[:len(CLASSES)]
+    if counts.sum() == 0:
+        raise ValueError("No hay muestras de entrenamiento")
+    logger.info(f"Escalador ajustado sobre {counts.sum()} muestras "
+                f"(yo: {counts[1]}, no yo: {counts[0]})")
+    return scaler, counts
+
+
+def streaming_accuracy(model, scaler, path, chunk_size, split, test_size, seed, val_size=0.0):
+    correct = total = 0
+    for X, y in iter_embedding_chunks(path, chunk_size, split, test_size, seed, val_size=val_size):
+        correct += int((model.predict(scaler.transform(X)) == y).sum())
+        total += len(y)
+    return correct / total if total else float('nan'), total
+
+
+def train_streaming(path, chunk_size=65536, epochs=5, test_size=0.2, seed=42, alpha=1e-4,
+                    patience=2, max_test_samples=100000, val_size=0.1):
+    """
+    Entrena StandardScaler (partial_fit) y SGDClassifier(log_loss) época a época.
+    La parada temprana y la elección de la mejor época usan una partición de
+    validación (`val_size`, sacada del rango de entrenamiento); la de prueba
+    solo se mide al final y es la que se guarda para evaluate.py. La memoria
+    está acotada por `chunk_size` filas más `max_test_samples`.
+    """
+    logger.info(f"=== Entrenamiento en streaming desde: {path} ===")
+    scaler, counts = fit_streaming_scaler(path, chunk_size, test_size, seed, val_size)
+
+    # Pesos de clase como 'balanced', calculados con los conteos del primer pase
+    class_weight = {int(c): float(counts.sum() / (len(CLASSES) * max(n, 1))) for c, n in zip(CLASSES, counts)}
+    model = SGDClassifier(loss='log_loss', alpha=alpha, class_weight=class_weight, random_state=seed)
+
+    rng = np.random.default_rng(seed)
+    history = []
+    best_score, best_state, best_epoch, stale = -1.0, None, None, 0
+    for epoch in range(1, epochs + 1):
+        seen = 0
+        for X, y in iter_embedding_chunks(path, chunk_size, 'train', test_size, seed, shuffle_rng=rng,
+                                          val_size=val_size):
+            order = rng.permutation(len(y))
+            model.partial_fit(scaler.transform(X[order]), y[order], classes=CLASSES)
+            seen += len(y)
+        val_score, n_val = streaming_accuracy(model, scaler, path, chunk_size, 'val', test_size, seed, val_size)
+        history.append({'epoch': epoch, 'train_samples': seen,
+                        'val_accuracy': round(val_score, 4) if n_val else None})
+        logger.info(f"Época {epoch}/{epochs}: {seen} muestras - precisión en validación {val_score:.4f} ({n_val})")
+        if not n_val:
+            continue
+
+        if val_score > best_score:
+            best_score, best_epoch, stale = val_score, epoch, 0
+            best_state = (model.coef_.copy(), model.intercept_.copy())
+        else:
+            stale += 1
+            if stale >= patience:
+                logger.info(f"Sin mejora en {patience} épocas, se detiene el entrenamiento")
+                break
+
+    if best_state is None:
+        logger.warning("Sin muestras de validación; se conservan los pesos de la última época")
+    else:
+        model.coef_, model.intercept_ = best_state
+        logger.info(f"Pesos de la época {best_epoch} (mejor precisión en validación {best_score:.4f})")
+
+    test_score, n_test = streaming_accuracy(model, scaler, path, chunk_size, 'test', test_size, seed, val_size)
+    if n_test:
+        logger.info(f"Precisión en prueba: {test_score:.4f} ({n_test})")
+    X_test, y_test = collect_test_sample(path, chunk_size, test_size, seed, max_test_samples)
+    return model, scaler, X_test, y_test, history
+
+
+def collect_test_sample(path, chunk_size, test_size, seed, max_samples):
+    """Primeras `max_samples` filas de prueba, para guardarlas en data/test_data.npz"""
+    X_parts, y_parts, total = [], [], 0
+    for X, y in iter_embedding_chunks(path, chunk_size, 'test', test_size, seed):
+        take = min(len(y), max_samples - total)
+        X_parts.append(X[:take])
+        y_parts.append(y[:take])
+        total += take
+        if total >= max_samples:
+            break
+    if not X_parts:
+        return np.empty((0, 0)), np.empty((0,), dtype=np.int64)
+    return np.concatenate(X_parts), np.concatenate(y_parts)
+
+
+def save_history(history, reports_dir='reports'):
+    reports_path = Path(reports_dir)
+    reports_path.mkdir(exist_ok=True, parents=True)
+    history_file = reports_path / 'streaming_history.json'
+    with open(history_file, 'w') as f:
+        json.dump(history, f, indent=2)
+    logger.info(f"Historial de entrenamiento guardado en: {history_file}")
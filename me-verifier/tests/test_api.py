@@ -49,7 +49,8 @@ def test_verify_with_image(client):
                           data={'image': (img_bytes, 'test.jpg')},
                           content_type='multipart/form-data')
     
-    assert response.status_code in [200, 503]  # 503 if model not loaded
+    # 503 if model not loaded, 400 if the fast detector finds no face in the blank image
+    assert response.status_code in [200, 400, 503]
     data = response.get_json()
     
     if response.status_code == 200:
@@ -0,0 +1,94 @@
+"""
+Test suite for memory-mapped serving artifacts
+"""
+import pytest
+import sys
+from pathlib import Path
+import numpy as np
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import joblib
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+
+import artifacts
+
+
+@pytest.fixture
+def embeddings():
+    """Overlapping gaussian blobs, so probabilities are not saturated"""
+    rng = np.random.default_rng(0)
+    y = np.array([1] * 60 + [0] * 140)
+    centers = rng.normal(0, 0.3, size=(2, 16))
+    X = rng.normal(0, 1.0, size=(200, 16)) + centers[y]
+    return X, y
+
+
+@pytest.mark.filterwarnings('ignore::FutureWarning')
+@pytest.mark.parametrize('model', [
+    SVC(kernel='rbf', probability=True, random_state=42),
+    LogisticRegression(max_iter=1000),
+])
+def test_mmap_model_matches_sklearn(tmp_path, embeddings, model):
+    """Mapped arrays reproduce predict/predict_proba of the original estimator"""
+    X, y = embeddings
+    scaler = StandardScaler().fit(X)
+    model.fit(scaler.transform(X), y)
+    assert artifacts.export_serving_artifacts(model, scaler, tmp_path) is not None
+
+    mmap_model, mmap_scaler = artifacts.load_serving_artifacts(tmp_path)
+    assert isinstance(mmap_scaler.mean_, np.memmap)
+    X_scaled = mmap_scaler.transform(X)
+    assert np.allclose(X_scaled, scaler.transform(X))
+    assert np.abs(mmap_model.predict_proba(X_scaled) - model.predict_proba(X_scaled)).max() < 1e-10
+    assert np.array_equal(mmap_model.predict(X_scaled), model.predict(X_scaled))
+
+
+@pytest.mark.filterwarnings('ignore::FutureWarning')
+def test_projected_scaler_is_exported_as_one_affine_map(tmp_path, embeddings):
+    from projection import ProjectedScaler
+
+    X, y = embeddings
+    scaler = ProjectedScaler(6).fit(X)
+    model = SVC(kernel='rbf', probability=True, random_state=42).fit(scaler.transform(X), y)
+    artifacts.export_serving_artifacts(model, scaler, tmp_path)
+
+    manifest = artifacts.read_manifest(tmp_path)
+    assert manifest['scaler'] == 'affine' and manifest['n_features'] == 16
+    mmap_model, mmap_scaler = artifacts.load_serving_artifacts(tmp_path)
+    assert mmap_scaler.n_features_in_ == 16
+    X_scaled = mmap_scaler.transform(X)
+    assert X_scaled.shape == (len(X), 6)
+    assert np.abs(mmap_model.predict_proba(X_scaled) - model.predict_proba(scaler.transform(X))).max() < 1e-10
+
+
+def test_unsupported_model_is_not_exported(tmp_path, embeddings):
+    X, y = embeddings
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y)
+    assert artifacts.export_serving_artifacts(model, scaler, tmp_path) is None
+    assert artifacts.read_manifest(tmp_path) is None
+
+
+@pytest.mark.filterwarnings('ignore::FutureWarning')
+def test_reexport_replaces_files_and_detects_stale(tmp_path, embeddings):
+    """A new export swaps the manifest and removes the previous arrays"""
+    X, y = embeddings
+    scaler = StandardScaler().fit(X)
+    model_file, scaler_file = tmp_path / 'model.joblib', tmp_path / 'scaler.joblib'
+    joblib.dump(LogisticRegression().fit(scaler.transform(X), y), model_file)
+    joblib.dump(scaler, scaler_file)
+    serving_dir = tmp_path / 'serving'
+
+    assert artifacts.ensure_serving_artifacts(model_file, scaler_file, serving_dir)
+    first = artifacts.read_manifest(serving_dir)
+    assert not artifacts.is_stale(first, model_file, scaler_file)
+
+    joblib.dump(LogisticRegression(C=0.01).fit(scaler.transform(X), y), model_file)
+    assert artifacts.is_stale(first, model_file, scaler_file)
+    assert artifacts.ensure_serving_artifacts(model_file, scaler_file, serving_dir)
+    second = artifacts.read_manifest(serving_dir)
+    assert second['arrays'] != first['arrays']
+    assert sorted(p.name for p in serving_dir.glob('*.npy')) == sorted(second['arrays'].values())
@@ -0,0 +1,42 @@
+"""
+Test suite for near-duplicate detection
+"""
+import sys
+from pathlib import Path
+import numpy as np
+from PIL import Image
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import dedup
+
+
+def test_dedup_embeddings_keeps_one_per_cluster_and_label():
+    """Near-identical embeddings collapse to one, but never across labels"""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(50, 32))
+    X[10:15] = X[3] + rng.normal(0, 1e-3, size=(5, 32))
+    y = np.zeros(50, dtype=int)
+    y[14] = 1
+
+    keep, report = dedup.dedup_embeddings(X, y, max_cosine_distance=0.01)
+
+    assert keep.sum() == 50 - 4
+    assert keep[14]
+    assert report['labels'][0]['removed'] == 4
+
+
+def test_dedup_image_directory_moves_lower_resolution_copies(tmp_path):
+    """The largest image of a cluster is kept; the rest are moved aside"""
+    rng = np.random.default_rng(1)
+    base = Image.fromarray(np.kron((rng.random((20, 20, 3)) * 255).astype(np.uint8),
+                                   np.ones((10, 10, 1), dtype=np.uint8)))
+    other = Image.fromarray((rng.random((200, 200, 3)) * 255).astype(np.uint8))
+    base.save(tmp_path / 'big.jpg', quality=95)
+    base.resize((120, 120)).save(tmp_path / 'small.jpg', quality=70)
+    other.save(tmp_path / 'other.png')
+
+    report = dedup.dedup_image_directory(tmp_path, duplicates_dir=tmp_path / 'dups')
+
+    assert report['removed'] == 1
+    assert report['clusters'] == [{'kept': 'big.jpg', 'removed': ['small.jpg']}]
+    assert (tmp_path / 'dups' / 'small.jpg').exists()
@@ -0,0 +1,82 @@
+"""
+Test suite for the shared-directory distributed embedding queue
+"""
+import pytest
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+pytest.importorskip('embeddings')
+
+from distributed_embeddings import claim, merge, plan, requeue_stale, status, work
+from shards import ShardWriter
+
+
+def mean_color(img):
+    return img.mean(axis=(0, 1))
+
+
+def write_crop_shards(output_dir, n_shards, per_shard=3):
+    keys = []
+    for s in range(n_shards):
+        with ShardWriter(output_dir, f"crops{s}") as writer:
+            for i in range(per_shard):
+                img = np.full((16, 16, 3), 10 * s + i, dtype=np.uint8)
+                key = f"s{s}_img{i}"
+                writer.write({'__key__': key, 'jpg': cv2.imencode('.png', img)[1].tobytes(), 'cls': i % 2})
+                keys.append(key)
+    return keys
+
+
+def run_worker(queue, worker_id):
+    work(queue, worker_id, lease_s=0.5, poll_s=0.02, embed_fn=mean_color)
+
+
+def test_workers_share_the_queue_and_recover_a_dead_claim(tmp_path):
+    queue = tmp_path / 'queue'
+    keys = write_crop_shards(tmp_path / 'crops', 6)
+    assert plan(tmp_path / 'crops', queue) == 6
+    assert plan(tmp_path / 'crops', queue) == 0
+
+    # Un worker que tomó una unidad y murió sin latir más
+    dead = claim(queue, 'dead-worker')
+    old = time.time() - 60
+    os.utime(dead, (old, old))
+
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=run_worker, args=(queue, f"w{i}")) for i in range(3)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    assert status(queue) == {'todo': 0, 'claimed': 0, 'done': 6, 'failed': 0}
+    with np.load(merge(queue, tmp_path / 'embeddings.npz')) as data:
+        assert data['keys'].tolist() == keys
+        assert data['labels'].tolist() == [i % 3 % 2 for i in range(18)]
+        assert np.allclose(data['embeddings'][:, 0], [10 * s + i for s in range(6) for i in range(3)])
+
+
+def test_failed_units_and_partial_merge(tmp_path):
+    queue = tmp_path / 'queue'
+    write_crop_shards(tmp_path / 'crops', 2)
+    (tmp_path / 'crops' / 'crops1-000000.tar').write_bytes(b'not a tar')
+    plan(tmp_path / 'crops', queue)
+
+    live = claim(queue, 'slow-worker')
+    assert requeue_stale(queue, lease_s=60) == 0
+    with pytest.raises(RuntimeError):
+        merge(queue, tmp_path / 'out.npz')
+
+    os.rename(live, queue / 'todo' / f"{live.stem.split('@')[0]}.json")
+    assert work(queue, 'w0', lease_s=1, poll_s=0.01, embed_fn=mean_color) == 1
+    assert status(queue) == {'todo': 0, 'claimed': 0, 'done': 1, 'failed': 1}
+    with np.load(merge(queue, tmp_path / 'out.npz')) as data:
+        assert len(data['labels']) == 3
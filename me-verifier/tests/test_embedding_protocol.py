@@ -0,0 +1,91 @@
+"""
+Test suite for POST /verify/embedding
+"""
+import json
+import pytest
+import sys
+from pathlib import Path
+import numpy as np
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+
+from api.app import app
+from api.config import THRESHOLD
+from api.embedding_protocol import RESPONSE_DTYPE
+from api.init import model_loader
+
+
+@pytest.fixture
+def client(monkeypatch):
+    rng = np.random.default_rng(0)
+    y = np.array([1] * 40 + [0] * 60)
+    X = rng.normal(0, 1, (100, 8)) + 2.0 * y[:, None]
+    scaler = StandardScaler().fit(X)
+    model = SVC(probability=True, random_state=0).fit(scaler.transform(X), y)
+    monkeypatch.setattr(model_loader, 'model', model)
+    monkeypatch.setattr(model_loader, 'scaler', scaler)
+    monkeypatch.setattr(model_loader, 'model_loaded', True)
+    monkeypatch.setattr(model_loader, 'scaler_loaded', True)
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client, model, scaler
+
+
+def expected(model, scaler, X):
+    X_scaled = scaler.transform(X)
+    scores = model.predict_proba(X_scaled)[:, 1]
+    return scores, (model.predict(X_scaled) == 1) & (scores >= THRESHOLD)
+
+
+@pytest.mark.filterwarnings('ignore::FutureWarning')
+def test_binary_float32_roundtrip(client):
+    client, model, scaler = client
+    X = np.vstack([np.full(8, 2.5), np.full(8, -0.5), np.full(8, 1.0)]).astype('<f4')
+    response = client.post('/verify/embedding', data=X.tobytes(), content_type='application/octet-stream')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/octet-stream'
+    records = np.frombuffer(response.data, dtype=RESPONSE_DTYPE)
+    scores, matches = expected(model, scaler, X)
+    assert np.allclose(records['score'], scores, atol=1e-6)
+    assert records['is_me'].astype(bool).tolist() == matches.tolist()
+
+
+@pytest.mark.filterwarnings('ignore::FutureWarning')
+def test_json_fallback(client):
+    client, model, scaler = client
+    X = [[2.5] * 8]
+    response = client.post('/verify/embedding', data=json.dumps({'embeddings': X}),
+                           content_type='application/json')
+    assert response.status_code == 200
+    data = response.get_json()
+    scores, matches = expected(model, scaler, np.array(X))
+    assert data['scores'] == [round(float(scores[0]), 4)]
+    assert data['is_me'] == matches.tolist()
+    assert data['threshold'] == THRESHOLD
+
+
+@pytest.mark.filterwarnings('ignore::FutureWarning')
+def test_msgpack_accepts_raw_float32_bytes(client):
+    msgpack = pytest.importorskip('msgpack')
+    client, model, scaler = client
+    X = np.full((2, 8), 2.5, dtype='<f4')
+    response = client.post('/verify/embedding', data=msgpack.packb({'embeddings': X.tobytes()}),
+                           content_type='application/msgpack')
+    assert response.status_code == 200
+    assert len(msgpack.unpackb(response.data)['scores']) == 2
+
+
+@pytest.mark.parametrize('body,content_type,status', [
+    (b'\x00' * 12, 'application/octet-stream', 400),
+    (np.full((1, 8), np.nan, '<f4').tobytes(), 'application/octet-stream', 400),
+    (json.dumps({'embeddings': [[1.0] * 7]}), 'application/json', 400),
+    (b'abc', 'text/plain', 415),
+])
+def test_invalid_bodies_are_rejected(client, body, content_type, status):
+    client, _, _ = client
+    response = client.post('/verify/embedding', data=body, content_type=content_type)
+    assert response.status_code == status
+    assert 'error' in response.get_json()
@@ -0,0 +1,77 @@
+"""
+Test suite for evaluation
+"""
+import json
+import pytest
+import sys
+from pathlib import Path
+import numpy as np
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import evaluate
+
+
+@pytest.fixture
+def scores():
+    """Overlapping genuine/impostor score distributions with ties"""
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 2, 5000)
+    return np.round(rng.normal(labels * 2.0, 1.0), 2), labels
+
+
+def test_threshold_sweep_matches_sklearn_roc(scores):
+    """Cumulative-sum sweep gives the same ROC as sklearn"""
+    from sklearn.metrics import roc_curve
+    s, y = scores
+    sweep = evaluate.threshold_sweep(s, y)
+    far, tpr, _ = roc_curve(y, s, drop_intermediate=False)
+    assert np.allclose(sweep['far'], far)
+    assert np.allclose(sweep['tpr'], tpr)
+
+
+def test_weighted_sweep_equals_repeated_scores(scores):
+    """Sample weights behave like repeated scores (used for histograms)"""
+    s, y = scores
+    w = np.random.default_rng(1).integers(1, 4, len(s))
+    weighted = evaluate.threshold_sweep(s, y, w)
+    repeated = evaluate.threshold_sweep(np.repeat(s, w), np.repeat(y, w))
+    assert np.allclose(weighted['far'], repeated['far'])
+    assert np.allclose(weighted['frr'], repeated['frr'])
+
+
+def test_operating_point_respects_target_far(scores):
+    """The recommended threshold never exceeds the target FAR"""
+    s, y = scores
+    analysis = evaluate.analyze_thresholds(s, y, target_far=0.05)
+    assert analysis['operating_point']['far'] <= 0.05
+    assert 0 < analysis['eer'] < 0.5
+    assert analysis['recommended_threshold'] == analysis['operating_point']['threshold']
+    assert analysis['target_far_reachable']
+
+
+def test_unreachable_target_far_recommends_no_threshold():
+    """When the top score is an impostor, only rejecting everything meets FAR 0: no Infinity in the JSON"""
+    s = np.array([0.99, 0.9, 0.8, 0.3, 0.2])
+    y = np.array([0, 1, 1, 0, 0])
+    analysis = evaluate.analyze_thresholds(s, y, target_far=0.1)
+    assert analysis['target_far_reachable'] is False
+    assert analysis['recommended_threshold'] is None
+    assert analysis['operating_point']['far'] == 0.0 and analysis['operating_point']['frr'] == 1.0
+    assert 'Infinity' not in json.dumps(analysis)
+
+
+def test_blocked_pair_histograms_match_brute_force():
+    """Tiled scoring counts every valid pair exactly once"""
+    rng = np.random.default_rng(2)
+    n = 300
+    identities = rng.integers(0, 10, n)
+    unknown = rng.random(n) < 0.3
+    X = rng.normal(size=(n, 16))
+
+    genuine, impostor, _ = evaluate.blocked_pair_histograms(X, identities, unknown, tile_size=64, bins=500)
+
+    rows, cols = np.triu_indices(n, k=1)
+    valid = ~(unknown[rows] & unknown[cols])
+    same = identities[rows] == identities[cols]
+    assert genuine.sum() == (valid & same).sum()
+    assert impostor.sum() == (valid & ~same).sum()
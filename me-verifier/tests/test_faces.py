@@ -0,0 +1,83 @@
+"""
+Test suite for multi-face verification
+"""
+import pytest
+import sys
+from io import BytesIO
+from pathlib import Path
+import numpy as np
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from PIL import Image
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+import api.faces as faces
+from api.app import app
+from api.init import model_loader
+
+
+class FakeEmbeddingModel:
+    """Embedding = mean colour of the face; records every forward call"""
+    input_shape = (160, 160)
+
+    def __init__(self):
+        self.batches = []
+
+    def forward(self, batch):
+        self.batches.append(batch.shape)
+        return batch.mean(axis=(1, 2))
+
+
+def fake_face(x, w, value):
+    return {'face': np.full((w, w, 3), value, dtype=np.float64),
+            'facial_area': {'x': x, 'y': 5, 'w': w, 'h': w}, 'confidence': 0.9}
+
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    model = FakeEmbeddingModel()
+    detected = [fake_face(10, 20, 0.2), fake_face(40, 50, 0.9), fake_face(100, 30, 0.5)]
+    monkeypatch.setattr(faces.DeepFace, 'extract_faces', lambda **kwargs: detected)
+    monkeypatch.setattr(faces.modeling, 'build_model', lambda **kwargs: model)
+    return model
+
+
+def test_embed_faces_runs_one_batched_forward(fake_backend):
+    face_objs, embeddings = faces.embed_faces(np.zeros((200, 200, 3), np.uint8), 'Facenet', max_faces=2)
+    assert fake_backend.batches == [(2, 160, 160, 3)]
+    assert embeddings.shape == (2, 3)
+    # Los de mayor área primero
+    assert [f['facial_area']['w'] for f in face_objs] == [50, 30]
+
+
+def test_verify_all_faces_returns_scores_and_best_match(monkeypatch, fake_backend):
+    rng = np.random.default_rng(0)
+    X = np.vstack([rng.normal(0.9, 0.05, (20, 3)), rng.normal(0.3, 0.05, (20, 3))])
+    y = np.array([1] * 20 + [0] * 20)
+    scaler = StandardScaler().fit(X)
+    monkeypatch.setattr(model_loader, 'model', LogisticRegression().fit(scaler.transform(X), y))
+    monkeypatch.setattr(model_loader, 'scaler', scaler)
+    monkeypatch.setattr(model_loader, 'model_loaded', True)
+    monkeypatch.setattr(model_loader, 'scaler_loaded', True)
+    # Las caras falsas no están en la imagen; el detector rápido las descartaría
+    monkeypatch.setattr(sys.modules['api.app'], 'quality_gate', None)
+
+    img = BytesIO()
+    Image.new('RGB', (200, 200), color='red').save(img, format='JPEG')
+    img.seek(0)
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        response = client.post('/verify?faces=all', data={'image': (img, 'group.jpg')},
+                               content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data['faces']) == 3
+    assert fake_backend.batches == [(3, 160, 160, 3)]
+    best = data['faces'][data['best_face']]
+    assert best['box'] == {'x': 40, 'y': 5, 'w': 50, 'h': 50}
+    assert best['p_me'] == data['p_me'] == max(f['p_me'] for f in data['faces'])
+    assert all('score' not in f for f in data['faces'])
+    assert data['is_me'] is True
+    assert [f['is_me'] for f in data['faces']] == [True, False, False]
@@ -0,0 +1,86 @@
+"""
+Test suite for the prototype fast path in front of the SVC
+"""
+import pytest
+import sys
+from pathlib import Path
+import joblib
+import numpy as np
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+
+from fast_path import FastPathModel, attach_fast_path, calibrate_prototypes, full_decisions, save_prototypes
+
+THRESHOLD = 0.75
+
+
+class CountingModel:
+    """Delegates to the SVC and records how many rows reach it"""
+
+    def __init__(self, model):
+        self.model = model
+        self.classes_ = model.classes_
+        self.rows = 0
+
+    def predict(self, X):
+        return self.model.predict(X)
+
+    def predict_proba(self, X):
+        self.rows += len(X)
+        return self.model.predict_proba(X)
+
+
+@pytest.fixture(scope='module')
+def trained():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(0, 1, size=(2, 16))
+    y = np.array([1] * 80 + [0] * 220)
+    X = rng.normal(0, 0.6, size=(300, 16)) + centers[y]
+    scaler = StandardScaler().fit(X[:200])
+    X_scaled = scaler.transform(X)
+    model = SVC(probability=True, random_state=0).fit(X_scaled[:200], y[:200])
+    prototypes = calibrate_prototypes(model, X_scaled[:200], y[:200], THRESHOLD, n_probes=5000)
+    return model, prototypes, X_scaled[200:]
+
+
+def test_fast_path_agrees_with_the_full_model(trained):
+    model, prototypes, X_test = trained
+    counting = CountingModel(model)
+    fast_model = FastPathModel(counting, prototypes)
+
+    _, expected = full_decisions(model, X_test, THRESHOLD)
+    scores, decisions = full_decisions(fast_model, X_test, THRESHOLD)
+
+    assert np.array_equal(decisions, expected)
+    stats = fast_model.stats()
+    assert stats['fast_fraction'] > 0.5
+    assert counting.rows == stats['full'] < len(X_test)
+    # Un es_yo rápido siempre llega con score >= umbral
+    assert (scores[decisions] >= THRESHOLD).all()
+
+
+def test_attach_requires_prototypes_for_the_same_model(trained, tmp_path):
+    model, prototypes, _ = trained
+    model_file = tmp_path / 'model.joblib'
+    joblib.dump(model, model_file)
+    assert attach_fast_path(model, tmp_path, model_file) is model
+
+    from artifacts import file_digest
+    save_prototypes(prototypes, tmp_path, file_digest(model_file))
+    assert isinstance(attach_fast_path(model, tmp_path, model_file), FastPathModel)
+
+    joblib.dump(SVC(probability=True).fit([[0.0], [1.0]] * 5, [0, 1] * 5), model_file)
+    assert attach_fast_path(model, tmp_path, model_file) is model
+
+
+def test_attach_refuses_prototypes_calibrated_for_another_threshold(trained, tmp_path):
+    model, prototypes, _ = trained
+    model_file = tmp_path / 'model.joblib'
+    joblib.dump(model, model_file)
+    from artifacts import file_digest
+    save_prototypes(prototypes, tmp_path, file_digest(model_file))
+
+    assert isinstance(attach_fast_path(model, tmp_path, model_file, THRESHOLD), FastPathModel)
+    assert attach_fast_path(model, tmp_path, model_file, 0.9) is model
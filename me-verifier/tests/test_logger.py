@@ -0,0 +1,94 @@
+"""
+Test suite for async/structured logging
+"""
+import json
+import logging
+import os
+import sys
+import threading
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import logger as logger_module
+from logger import SamplingFilter, setup_logger
+
+
+class Recorder:
+    """Argument that remembers which thread formatted it"""
+
+    def __init__(self):
+        self.threads = []
+
+    def __str__(self):
+        self.threads.append(threading.get_ident())
+        return 'payload'
+
+
+def flush():
+    logger_module._async_logging.stop()
+    logger_module._async_logging.start()
+
+
+def test_async_json_logging_formats_in_listener_thread(tmp_path, monkeypatch):
+    monkeypatch.setenv('ME_VERIFIER_ASYNC_LOGS', '1')
+    monkeypatch.setenv('ME_VERIFIER_LOG_JSON', '1')
+    log = setup_logger('test_async_json', log_dir=str(tmp_path))
+    # Sin propagar a los handlers de captura de pytest (formatean en este hilo)
+    monkeypatch.setattr(log, 'propagate', False)
+    arg = Recorder()
+    log.info("valor: %s", arg)
+    flush()
+
+    assert arg.threads and threading.get_ident() not in arg.threads
+    entry = json.loads((tmp_path / 'test_async_json.log').read_text().splitlines()[-1])
+    assert entry['message'] == 'valor: payload'
+    assert entry['level'] == 'INFO' and entry['logger'] == 'test_async_json'
+
+
+def test_sampling_keeps_one_in_n_debug_records():
+    sampler = SamplingFilter(5)
+    make = lambda level, msg: logging.LogRecord('x', level, __file__, 1, msg, (), None)
+    kept = sum(sampler.filter(make(logging.DEBUG, 'frame %d')) for _ in range(100))
+    assert kept == 20
+    assert all(sampler.filter(make(logging.INFO, 'frame %d')) for _ in range(10))
+
+
+def test_forked_child_restarts_listener(tmp_path, monkeypatch):
+    monkeypatch.setenv('ME_VERIFIER_ASYNC_LOGS', '1')
+    log = setup_logger('test_async_fork', log_dir=str(tmp_path))
+    log.info("padre")
+    pid = os.fork()
+    if pid == 0:
+        try:
+            log.info("hijo")
+            logger_module._async_logging.stop()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    flush()
+    text = (tmp_path / 'test_async_fork.log').read_text()
+    assert 'padre' in text and 'hijo' in text
+
+
+def test_debug_sampling_enables_sampled_debug_records(tmp_path, monkeypatch):
+    monkeypatch.delenv('ME_VERIFIER_ASYNC_LOGS', raising=False)
+    monkeypatch.delenv('ME_VERIFIER_LOG_LEVEL', raising=False)
+    monkeypatch.setenv('ME_VERIFIER_LOG_DEBUG_SAMPLE', '10')
+    log = setup_logger('test_debug_sample', log_dir=str(tmp_path))
+    monkeypatch.setattr(log, 'propagate', False)
+    for i in range(30):
+        log.debug("frame %d", i)
+    log.info("fin")
+    for handler in log.handlers:
+        handler.flush()
+
+    lines = (tmp_path / 'test_debug_sample.log').read_text().splitlines()
+    assert [line.split(' - ', 2)[2] for line in lines] == ['frame 0', 'frame 10', 'frame 20', 'fin']
+
+
+def test_log_level_from_environment(tmp_path, monkeypatch):
+    monkeypatch.delenv('ME_VERIFIER_LOG_DEBUG_SAMPLE', raising=False)
+    monkeypatch.setenv('ME_VERIFIER_LOG_LEVEL', 'warning')
+    assert setup_logger('test_level_env', log_dir=str(tmp_path)).level == logging.WARNING
+    monkeypatch.delenv('ME_VERIFIER_LOG_LEVEL')
+    assert setup_logger('test_level_default', log_dir=str(tmp_path)).level == logging.INFO
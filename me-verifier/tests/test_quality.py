@@ -0,0 +1,92 @@
+"""
+Test suite for the pre-embedding quality cascade
+"""
+import pytest
+import sys
+from io import BytesIO
+from pathlib import Path
+import cv2
+import numpy as np
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from PIL import Image
+
+from quality import QualityGate, face_issue, face_metrics
+
+
+class FakeCascade:
+    """Devuelve cajas fijas (en coordenadas de la imagen reducida) y guarda el tamaño recibido"""
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+        self.shapes = []
+
+    def detectMultiScale(self, gray, **kwargs):
+        self.shapes.append(gray.shape)
+        return np.array(self.boxes, dtype=np.int32).reshape(-1, 4)
+
+
+def textured(side, mean=128.0, std=40.0, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.clip(rng.normal(mean, std, (side, side, 3)), 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize('face,issue', [
+    (textured(120), None),
+    (cv2.GaussianBlur(textured(120), (0, 0), 6), 'blurry'),
+    (textured(120, mean=15, std=10), 'too_dark'),
+    (textured(120, mean=240, std=10), 'too_bright'),
+    (textured(24), 'face_too_small'),
+])
+def test_face_gates(face, issue):
+    assert face_issue(face_metrics(face)) == issue
+
+
+def test_cascade_detects_on_a_downscaled_copy():
+    img = textured(800)
+    cascade = FakeCascade([(100, 50, 60, 60)])
+    reason, box = QualityGate(cascade).check(img)
+
+    assert cascade.shapes == [(400, 400)]
+    assert reason is None
+    assert box == (200, 100, 120, 120)
+
+
+def test_cascade_rejects_and_counts():
+    gate = QualityGate(FakeCascade([]))
+    assert gate.check(textured(32))[0] == 'image_too_small'
+    assert gate.check(textured(300))[0] == 'no_face'
+    assert QualityGate(None).check(textured(300)) == (None, None)
+
+    stats = gate.stats()
+    assert stats['checked'] == 2 and stats['passed'] == 0
+    assert stats['rejected']['image_too_small'] == stats['rejected']['no_face'] == 1
+
+
+def test_verify_skips_the_embedding_model_without_a_face(monkeypatch):
+    from api.app import app
+    from api.init import model_loader
+    from api.singleflight import SingleFlight
+
+    app_module = sys.modules['api.app']
+    monkeypatch.setattr(model_loader, 'model', object())
+    monkeypatch.setattr(model_loader, 'scaler', object())
+    monkeypatch.setattr(model_loader, 'model_loaded', True)
+    monkeypatch.setattr(model_loader, 'scaler_loaded', True)
+    monkeypatch.setattr(app_module, 'inflight', SingleFlight())
+    monkeypatch.setattr(app_module, 'quality_gate', QualityGate(FakeCascade([])))
+
+    def represent(**kwargs):
+        raise AssertionError("the embedding model must not run")
+
+    monkeypatch.setattr(app_module.DeepFace, 'represent', represent)
+    buffer = BytesIO()
+    Image.fromarray(textured(200)).save(buffer, format='JPEG')
+    buffer.seek(0)
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        response = client.post('/verify', data={'image': (buffer, 'noise.jpg')},
+                               content_type='multipart/form-data')
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'No face detected in image'
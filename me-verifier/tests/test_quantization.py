@@ -0,0 +1,95 @@
+"""
+Test suite for compact embedding storage (float16, product quantization)
+"""
+import pytest
+import sys
+from pathlib import Path
+import numpy as np
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import evaluate
+from quantization import ProductQuantizer, decode_embeddings, encode_embeddings, roundtrip
+
+
+@pytest.fixture(scope='module')
+def clustered():
+    """Embeddings de 32 dimensiones alrededor de 40 identidades"""
+    rng = np.random.default_rng(0)
+    identities = np.repeat(np.arange(40), 25)
+    centers = rng.normal(0, 1, (40, 32))
+    X = centers[identities] + rng.normal(0, 0.3, (len(identities), 32))
+    return X, identities
+
+
+@pytest.fixture(scope='module')
+def quantizer(clustered):
+    X, _ = clustered
+    return ProductQuantizer(n_subspaces=8).fit(X)
+
+
+@pytest.mark.parametrize('precision,itemsize', [('float64', 8), ('float32', 4), ('float16', 2)])
+def test_float_precisions(clustered, precision, itemsize):
+    X, _ = clustered
+    arrays = encode_embeddings(X, precision)
+    assert arrays['embeddings'].nbytes == X.size * itemsize
+    decoded, bytes_per_embedding, _ = roundtrip(X, precision)
+    assert bytes_per_embedding == 32 * itemsize
+    assert decoded.dtype != np.float16
+    assert np.abs(decoded - X).max() < 1e-2
+
+
+def test_pq_codes_are_compact_and_close(clustered, quantizer):
+    X, _ = clustered
+    codes = quantizer.encode(X)
+    assert codes.shape == (len(X), 8) and codes.dtype == np.uint8
+    error = np.linalg.norm(quantizer.decode(codes) - X, axis=1) / np.linalg.norm(X, axis=1)
+    assert error.mean() < 0.2
+
+
+def test_adc_matches_scoring_the_reconstruction(clustered, quantizer):
+    X, _ = clustered
+    codes = quantizer.encode(X[100:])
+    decoded = quantizer.decode(codes)
+    assert np.allclose(quantizer.adc_inner(X[:10], codes), X[:10] @ decoded.T, atol=1e-3)
+    assert np.allclose(quantizer.code_norms(codes), np.linalg.norm(decoded, axis=1), atol=1e-4)
+
+
+def test_gallery_search_finds_the_same_identity(clustered, quantizer):
+    X, identities = clustered
+    codes = quantizer.encode(X)
+    idx, similarity = quantizer.search(X[7], codes, k=5)
+    assert np.all(np.diff(similarity) <= 0)
+    assert (identities[idx] == identities[7]).all()
+
+
+def test_npz_roundtrip_for_every_format(clustered, tmp_path):
+    X, identities = clustered
+    for precision in ('float16', 'pq'):
+        path = tmp_path / f"{precision}.npz"
+        np.savez(path, labels=(identities == 0).astype(int), **encode_embeddings(X, precision, n_subspaces=8))
+        with np.load(path) as data:
+            assert decode_embeddings(data).shape == X.shape
+        loaded, _, _ = evaluate.load_labeled_embeddings(path)
+        assert loaded.shape == X.shape
+
+
+def test_pair_histograms_with_adc(clustered):
+    X, identities = clustered
+    Xn = X / np.linalg.norm(X, axis=1, keepdims=True)
+    pq = ProductQuantizer(n_subspaces=8).fit(Xn)
+    exact = evaluate.blocked_pair_histograms(X, identities, tile_size=300, bins=200)
+    adc = evaluate.blocked_pair_histograms(X, identities, tile_size=300, bins=200, pq=pq, pq_codes=pq.encode(Xn))
+    for exact_counts, adc_counts in zip(exact[:2], adc[:2]):
+        assert exact_counts.sum() == adc_counts.sum()
+    mean = lambda counts, centers: (counts * centers).sum() / counts.sum()
+    assert abs(mean(exact[0], exact[2]) - mean(adc[0], adc[2])) < 0.05
+
+
+def test_codebook_rows_exclude_the_test_set(clustered):
+    """PQ for the precision report is fitted without the test samples"""
+    X, _ = clustered
+    X32 = X.astype(np.float32)
+    X_test = X32[::5]
+    X_fit = evaluate.exclude_rows(X32, X_test)
+    assert len(X_fit) == len(X) - len(X_test)
+    assert len(evaluate.exclude_rows(X_test, X_fit)) == len(X_test)
@@ -0,0 +1,104 @@
+"""
+Test suite for the per-tenant model registry
+"""
+import pytest
+import sys
+import threading
+import time
+from pathlib import Path
+import numpy as np
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import joblib
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+from api.app import app
+from api.registry import ModelRegistry, TenantError
+
+
+def fake_loader(calls, nbytes=100, delay=0.0):
+    def load(tenant_dir):
+        calls.append(tenant_dir.name)
+        time.sleep(delay)
+        if tenant_dir.name.startswith('missing'):
+            raise FileNotFoundError(tenant_dir)
+        return f"model-{tenant_dir.name}", f"scaler-{tenant_dir.name}", nbytes, 'joblib'
+    return load
+
+
+def test_lru_eviction_respects_pins_and_counts(tmp_path):
+    calls = []
+    registry = ModelRegistry(tmp_path, max_models=2, pinned=['a'], loader=fake_loader(calls))
+    assert registry.get('a') == ('model-a', 'scaler-a')
+    registry.get('b')
+    registry.get('b')
+    registry.get('c')
+
+    assert 'a' in registry and 'c' in registry and 'b' not in registry
+    stats = registry.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 3 and stats['evictions'] == 1
+    assert calls == ['a', 'b', 'c']
+
+
+def test_byte_budget_evicts_least_recently_used(tmp_path):
+    registry = ModelRegistry(tmp_path, max_models=10, max_bytes=250, loader=fake_loader([], nbytes=100))
+    for tenant in ('a', 'b', 'c'):
+        registry.get(tenant)
+    assert 'a' not in registry
+    assert registry.stats()['bytes'] == 200
+
+
+def test_concurrent_misses_load_once(tmp_path):
+    calls = []
+    registry = ModelRegistry(tmp_path, loader=fake_loader(calls, delay=0.05))
+    threads = [threading.Thread(target=registry.get, args=('a',)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == ['a']
+
+
+@pytest.mark.parametrize('tenant,status', [('../models', 400), ('serving', 400), ('', 400), ('missing-1', 404)])
+def test_invalid_or_unknown_tenants(tmp_path, tenant, status):
+    registry = ModelRegistry(tmp_path, loader=fake_loader([]))
+    with pytest.raises(TenantError) as excinfo:
+        registry.get(tenant)
+    assert excinfo.value.status_code == status
+
+
+def test_corrupt_model_is_a_clean_load_error(tmp_path):
+    """A truncated model.joblib counts as a load error and does not leave the tenant loading"""
+    (tmp_path / 'alice').mkdir()
+    (tmp_path / 'alice' / 'model.joblib').write_bytes(b'\x80\x04')
+    (tmp_path / 'alice' / 'scaler.joblib').write_bytes(b'\x80\x04')
+    registry = ModelRegistry(tmp_path)
+    with pytest.raises(TenantError) as excinfo:
+        registry.get('alice')
+    assert excinfo.value.status_code == 500
+    assert registry.stats()['load_errors'] == 1
+    assert 'alice' not in registry._loading
+
+
+def test_verify_embedding_uses_tenant_model(tmp_path, monkeypatch):
+    """Each tenant is scored with its own model from models/<tenant>/"""
+    rng = np.random.default_rng(0)
+    X = rng.normal(0, 1, (60, 4))
+    for tenant, sign in (('alice', 1), ('bob', -1)):
+        y = (sign * X[:, 0] > 0).astype(int)
+        scaler = StandardScaler().fit(X)
+        (tmp_path / tenant).mkdir()
+        joblib.dump(LogisticRegression().fit(scaler.transform(X), y), tmp_path / tenant / 'model.joblib')
+        joblib.dump(scaler, tmp_path / tenant / 'scaler.joblib')
+    monkeypatch.setattr(sys.modules['api.app'], 'model_registry', ModelRegistry(tmp_path))
+
+    probe = {'embeddings': [[3.0, 0.0, 0.0, 0.0]]}
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        alice = client.post('/verify/embedding', json=probe, headers={'X-Tenant-Id': 'alice'}).get_json()
+        bob = client.post('/verify/embedding?tenant=bob', json=probe).get_json()
+        unknown = client.post('/verify/embedding', json=probe, headers={'X-Tenant-Id': 'carol'})
+
+    assert alice['scores'][0] > 0.5 > bob['scores'][0]
+    assert unknown.status_code == 404
@@ -0,0 +1,99 @@
+"""
+Test suite for the priority inference scheduler
+"""
+import pytest
+import sys
+import threading
+import time
+from pathlib import Path
+import numpy as np
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+from api.app import app
+from api.init import model_loader
+from api.scheduler import PriorityScheduler, SchedulerError
+
+
+def run_blocked(scheduler, requests):
+    """Encola `requests` con el único slot ocupado y devuelve el orden de despacho"""
+    order = []
+    scheduler.acquire('interactive')
+
+    def worker(priority):
+        with scheduler.slot(priority):
+            order.append(priority)
+
+    threads = [threading.Thread(target=worker, args=(p,)) for p in requests]
+    for t in threads:
+        t.start()
+    deadline = time.time() + 5
+    while sum(m['queued'] for m in scheduler.metrics.values()) < len(requests):
+        assert time.time() < deadline
+        time.sleep(0.001)
+    scheduler.release('interactive')
+    for t in threads:
+        t.join()
+    return order
+
+
+def test_weighted_fair_queuing_shares_slots_by_weight():
+    scheduler = PriorityScheduler(slots=1, weights={'interactive': 4, 'batch': 1})
+    order = run_blocked(scheduler, ['batch'] * 8 + ['interactive'] * 8)
+
+    assert order[:10].count('interactive') == 8
+    assert order[10:] == ['batch'] * 6
+
+
+def test_bulk_only_runs_when_nothing_else_waits():
+    scheduler = PriorityScheduler(slots=1)
+    order = run_blocked(scheduler, ['bulk', 'bulk', 'batch', 'interactive'])
+
+    assert order == ['interactive', 'batch', 'bulk', 'bulk']
+    stats = scheduler.stats()['classes']
+    assert stats['bulk']['requests'] == 2 and stats['bulk']['queued'] == 0
+    assert sum(stats['bulk']['wait_histogram_ms'].values()) == 2
+
+
+def test_timeouts_and_limits():
+    scheduler = PriorityScheduler(slots=1, max_queued=1)
+    scheduler.acquire('interactive')
+
+    with pytest.raises(SchedulerError) as excinfo:
+        scheduler.acquire('batch', timeout_s=0.01)
+    assert excinfo.value.status_code == 503
+    with pytest.raises(SchedulerError) as excinfo:
+        scheduler.acquire('urgent')
+    assert excinfo.value.status_code == 400
+
+    metrics = scheduler.stats()['classes']['batch']
+    assert metrics['timeouts'] == 1 and metrics['queued'] == 0
+    scheduler.release('interactive')
+    assert scheduler.stats()['free_slots'] == 1
+
+
+@pytest.fixture
+def client(monkeypatch):
+    rng = np.random.default_rng(0)
+    X = rng.normal(0, 1, (60, 4))
+    scaler = StandardScaler().fit(X)
+    model = LogisticRegression().fit(scaler.transform(X), (X[:, 0] > 0).astype(int))
+    monkeypatch.setattr(model_loader, 'model', model)
+    monkeypatch.setattr(model_loader, 'scaler', scaler)
+    monkeypatch.setattr(model_loader, 'model_loaded', True)
+    monkeypatch.setattr(model_loader, 'scaler_loaded', True)
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def test_priority_header(client):
+    body = {'embeddings': [[0.0, 0.0, 0.0, 0.0]]}
+    ok = client.post('/verify/embedding', json=body, headers={'X-Priority': 'bulk'})
+    bad = client.post('/verify/embedding', json=body, headers={'X-Priority': 'urgent'})
+
+    assert ok.status_code == 200
+    assert float(ok.headers['X-Queue-Wait-Ms']) >= 0
+    assert bad.status_code == 400
@@ -0,0 +1,89 @@
+"""
+Test suite for the concurrent image downloader
+"""
+import pytest
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from pathlib import Path
+import numpy as np
+from PIL import Image
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from search_img import ConcurrentDownloader, make_session
+
+
+def make_jpeg(seed, size=320, quality=90):
+    """Blocky random image so that different seeds have distant hashes"""
+    rng = np.random.default_rng(seed)
+    blocks = (rng.random((40, 40, 3)) * 255).astype(np.uint8)
+    img = Image.fromarray(np.kron(blocks, np.ones((8, 8, 1), dtype=np.uint8))).resize((size, size))
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def image_server():
+    """Local HTTP stand-in for the image hosts"""
+    first, second = make_jpeg(1), make_jpeg(2)
+    routes = {
+        '/a.jpg': first,
+        '/b.jpg': second,
+        '/a-copy.jpg': first,                        # exact duplicate
+        '/a-small.jpg': make_jpeg(1, 280, 60),       # near duplicate
+        '/fake.jpg': b'<html>not an image</html>',   # invalid content
+        '/flaky.jpg': make_jpeg(3),                  # fails once, then works
+    }
+    hits = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            hits[self.path] = hits.get(self.path, 0) + 1
+            body = routes.get(self.path)
+            if body is None or (self.path == '/flaky.jpg' and hits[self.path] == 1):
+                self.send_response(404 if body is None else 503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", routes, hits
+    server.shutdown()
+
+
+def test_downloader_validates_and_deduplicates(image_server, tmp_path):
+    """Only valid, unique images reach the output directory"""
+    base_url, routes, hits = image_server
+    urls = [base_url + path for path in list(routes) + ['/missing.jpg']]
+
+    downloader = ConcurrentDownloader(tmp_path, limit=10, max_workers=4, session=make_session(4, retries=2))
+    saved = downloader.run(urls)
+
+    assert len(saved) == 3
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(p.name for p in saved)
+    assert downloader.stats['exact_duplicates'] + downloader.stats['near_duplicates'] == 2
+    assert downloader.stats['invalid'] == 1
+    assert downloader.stats['failed'] == 1
+    assert hits['/flaky.jpg'] == 2
+
+
+def test_downloader_respects_limit(image_server, tmp_path):
+    """No more than `limit` images are written"""
+    base_url, routes, _ = image_server
+    downloader = ConcurrentDownloader(tmp_path, limit=1, max_workers=4)
+    downloader.run([base_url + '/a.jpg', base_url + '/b.jpg', base_url + '/flaky.jpg'])
+    assert len(list(tmp_path.iterdir())) == 1
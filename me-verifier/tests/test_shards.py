@@ -0,0 +1,108 @@
+"""
+Test suite for tar shards and the shard-based preprocessing stages
+"""
+import pytest
+import sys
+import tarfile
+from pathlib import Path
+import cv2
+import numpy as np
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from shards import ShardWriter, iter_records, iter_shard, list_tar_shards, pack_directory, shards_for_worker
+from streaming import iter_embedding_chunks
+
+
+class FakeCascade:
+    """Un rostro fijo por imagen"""
+
+    def detectMultiScale(self, gray, *args, **kwargs):
+        return np.array([[20, 20, 80, 80]], dtype=np.int32)
+
+
+def jpeg(seed, side=120):
+    rng = np.random.default_rng(seed)
+    img = np.clip(rng.normal(128, 40, (side, side, 3)), 0, 255).astype(np.uint8)
+    return cv2.imencode('.jpg', img)[1].tobytes()
+
+
+def write_records(output_dir, n, max_records=4):
+    with ShardWriter(output_dir, 'raw', max_records=max_records) as writer:
+        for i in range(n):
+            writer.write({'__key__': f"img{i:03d}", 'jpg': jpeg(i), 'cls': i % 2, 'json': {'i': i}})
+    return writer.files
+
+
+def test_roundtrip_groups_members_by_key(tmp_path):
+    files = write_records(tmp_path, 10)
+
+    assert [f.name for f in files] == ['raw-000000.tar', 'raw-000001.tar', 'raw-000002.tar']
+    assert list_tar_shards(tmp_path) == files
+    assert not list(tmp_path.glob('*.tmp'))
+    with tarfile.open(files[0]) as tar:
+        assert tar.getnames()[:3] == ['img000.jpg', 'img000.cls', 'img000.json']
+
+    records = list(iter_records(tmp_path))
+    assert [r['__key__'] for r in records] == [f"img{i:03d}" for i in range(10)]
+    assert records[3]['jpg'] == jpeg(3)
+    assert records[3]['cls'] == 1 and records[3]['json'] == {'i': 3}
+
+
+def test_rejects_keys_that_break_grouping(tmp_path):
+    with ShardWriter(tmp_path) as writer, pytest.raises(ValueError):
+        writer.write({'__key__': 'a.b', 'cls': 0})
+
+
+def test_failed_writer_does_not_publish_a_partial_shard(tmp_path):
+    with pytest.raises(RuntimeError):
+        with ShardWriter(tmp_path, 'x', max_records=2) as writer:
+            for i in range(3):
+                writer.write({'__key__': f"img{i}", 'jpg': jpeg(i), 'cls': 0})
+            raise RuntimeError("crop failed")
+
+    # The full first shard stays published; the half-written second one is discarded
+    assert [f.name for f in tmp_path.iterdir()] == ['x-000000.tar']
+    assert len(list(iter_shard(tmp_path / 'x-000000.tar'))) == 2
+
+
+def test_shards_are_split_across_workers():
+    shards = [f"s{i}" for i in range(7)]
+    parts = [shards_for_worker(shards, i, 3) for i in range(3)]
+    assert parts == [['s0', 's3', 's6'], ['s1', 's4'], ['s2', 's5']]
+
+
+def test_pack_directory(tmp_path):
+    input_dir = tmp_path / 'me'
+    input_dir.mkdir()
+    for i in range(3):
+        (input_dir / f"photo.{i}.jpg").write_bytes(jpeg(i))
+    (input_dir / 'notes.txt').write_text('x')
+
+    files = pack_directory(input_dir, tmp_path / 'shards', label=1)
+    records = list(iter_shard(files[0]))
+    assert [r['__key__'] for r in records] == ['me_photo_0', 'me_photo_1', 'me_photo_2']
+    assert all(r['cls'] == 1 for r in records)
+    assert records[0]['json'] == {'source': 'photo.0.jpg'}
+
+
+def test_crop_and_embed_shards_feed_streaming_training(tmp_path):
+    from crop_faces import crop_shard
+    embeddings = pytest.importorskip('embeddings')
+
+    raw = write_records(tmp_path / 'raw', 6, max_records=3)
+    for shard in raw:
+        stats = crop_shard(shard, tmp_path / 'cropped', quality_gates=False, face_cascade=FakeCascade())
+        assert stats['faces'] == 3
+
+    crops = list(iter_records(tmp_path / 'cropped'))
+    assert len(crops) == 6
+    assert crops[0]['__key__'] == 'img000_face0' and crops[0]['json']['box'] == [20, 20, 80, 80]
+    assert cv2.imdecode(np.frombuffer(crops[0]['jpg'], np.uint8), cv2.IMREAD_COLOR).shape == (160, 160, 3)
+
+    for shard in list_tar_shards(tmp_path / 'cropped'):
+        embeddings.embed_shard(shard, tmp_path / 'emb', embed_fn=lambda img: img.mean(axis=(0, 1)))
+
+    X, y = zip(*iter_embedding_chunks(tmp_path / 'emb', chunk_size=4))
+    assert np.concatenate(y).tolist() == [0, 1, 0, 1, 0, 1]
+    assert np.concatenate(X).shape == (6, 3)
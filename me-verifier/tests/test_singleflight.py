@@ -0,0 +1,159 @@
+"""
+Test suite for single-flight coalescing of identical requests
+"""
+import multiprocessing
+import pytest
+import sys
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+import numpy as np
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from PIL import Image
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+from api.app import app
+from api.init import model_loader
+from api.singleflight import SingleFlight, content_key
+
+
+def run_concurrently(n, target):
+    results = [None] * n
+
+    def worker(i):
+        results[i] = target()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_calls_share_one_computation():
+    flight = SingleFlight()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return {'embedding': [1.0, 2.0]}
+
+    results = run_concurrently(6, lambda: flight.do('k', compute))
+
+    assert len(calls) == 1
+    assert all(value == {'embedding': [1.0, 2.0]} for value, _ in results)
+    assert sorted(shared for _, shared in results) == [False] + [True] * 5
+    stats = flight.stats()
+    assert stats['leaders'] == 1 and stats['coalesced_local'] == 5 and stats['saved_s'] >= 0.5
+    # Terminado el cálculo, la misma clave se vuelve a calcular
+    flight.do('k', compute)
+    assert len(calls) == 2
+
+
+def test_followers_receive_the_leader_error():
+    flight = SingleFlight()
+
+    def fail():
+        time.sleep(0.05)
+        raise ValueError('bad image')
+
+    def call():
+        try:
+            flight.do('k', fail)
+        except ValueError as e:
+            return str(e)
+
+    assert run_concurrently(3, call) == ['bad image'] * 3
+
+
+def _worker_call(lock_dir, key, calls_file, queue):
+    flight = SingleFlight(lock_dir)
+
+    def compute():
+        with open(calls_file, 'a') as f:
+            f.write('x')
+        time.sleep(0.3)
+        return [0.5, 0.25]
+
+    queue.put(flight.do(key, compute))
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="requiere fcntl")
+def test_identical_requests_coalesce_across_processes(tmp_path):
+    ctx = multiprocessing.get_context('fork')
+    queue = ctx.Queue()
+    calls_file = tmp_path / 'calls'
+    processes = [ctx.Process(target=_worker_call, args=(tmp_path / 'inflight', 'a' * 32, calls_file, queue))
+                 for _ in range(3)]
+    for p in processes:
+        p.start()
+    results = [queue.get(timeout=10) for _ in processes]
+    for p in processes:
+        p.join()
+
+    assert calls_file.read_text() == 'x'
+    assert all(value == [0.5, 0.25] for value, _ in results)
+    assert sum(shared for _, shared in results) == 2
+
+
+def test_verify_coalesces_identical_uploads(monkeypatch):
+    app_module = sys.modules['api.app']
+    rng = np.random.default_rng(0)
+    X = rng.normal(0, 1, (60, 4))
+    scaler = StandardScaler().fit(X)
+    model = LogisticRegression().fit(scaler.transform(X), (X[:, 0] > 0).astype(int))
+    monkeypatch.setattr(model_loader, 'model', model)
+    monkeypatch.setattr(model_loader, 'scaler', scaler)
+    monkeypatch.setattr(model_loader, 'model_loaded', True)
+    monkeypatch.setattr(model_loader, 'scaler_loaded', True)
+    monkeypatch.setattr(app_module, 'inflight', SingleFlight())
+    calls = []
+
+    def fake_extract(data, priority, all_faces):
+        calls.append(content_key(data))
+        time.sleep(0.2)
+        return {'embedding': [2.0, 0.0, 0.0, 0.0]}
+
+    monkeypatch.setattr(app_module, 'extract_embeddings', fake_extract)
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), color='red').save(buffer, format='JPEG')
+    app.config['TESTING'] = True
+
+    def post():
+        with app.test_client() as client:
+            return client.post('/verify', data={'image': (BytesIO(buffer.getvalue()), 'a.jpg')},
+                               content_type='multipart/form-data').get_json()
+
+    results = run_concurrently(4, post)
+
+    assert len(calls) == 1
+    assert all(r['score'] == results[0]['score'] for r in results)
+    assert app_module.inflight.stats()['coalesced_local'] == 3
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="requiere fcntl")
+def test_shared_directory_and_results_are_private(tmp_path):
+    lock_dir = tmp_path / 'inflight'
+    flight = SingleFlight(lock_dir)
+    flight.do('b' * 32, lambda: [1.0])
+
+    assert lock_dir.stat().st_mode & 0o777 == 0o700
+    assert (lock_dir / ('b' * 32 + '.json')).stat().st_mode & 0o777 == 0o600
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="requiere fcntl")
+def test_open_shared_directory_disables_cross_worker_coalescing(tmp_path):
+    lock_dir = tmp_path / 'inflight'
+    lock_dir.mkdir(mode=0o777)
+    lock_dir.chmod(0o777)
+    flight = SingleFlight(lock_dir)
+
+    assert flight.do('c' * 32, lambda: 7) == (7, False)
+    stats = flight.stats()
+    assert not stats['cross_worker'] and 'otros usuarios' in stats['lock_dir_error']
+    assert not list(lock_dir.iterdir())
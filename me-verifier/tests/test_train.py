@@ -0,0 +1,167 @@
+"""
+Test suite for training
+"""
+import pytest
+import sys
+from pathlib import Path
+import numpy as np
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import train
+from classifiers import PrototypeClassifier
+
+
+@pytest.fixture
+def embeddings():
+    """Two separable gaussian blobs"""
+    rng = np.random.default_rng(0)
+    y = np.array([1] * 60 + [0] * 140)
+    centers = rng.normal(0, 1, size=(2, 16))
+    X = rng.normal(0, 0.5, size=(200, 16)) + centers[y]
+    return X, y
+
+
+@pytest.mark.parametrize('trainer', train.TRAINERS)
+def test_trainers_fit_and_predict_proba(embeddings, trainer):
+    """Every trainer exposes predict/predict_proba like the SVC"""
+    X, y = embeddings
+    model = train.train_classifier(X, y, trainer)
+    proba = model.predict_proba(X)
+    assert proba.shape == (len(X), 2)
+    assert np.allclose(proba.sum(axis=1), 1)
+    assert model.score(X, y) > 0.9
+
+
+def test_prototype_classifier_probabilities_follow_margin(embeddings):
+    """Higher cosine margin towards 'me' means higher probability"""
+    X, y = embeddings
+    model = PrototypeClassifier().fit(X, y)
+    margin = model.decision_function(X)
+    proba = model.predict_proba(X)[:, 1]
+    order = np.argsort(margin)
+    assert np.all(np.diff(proba[order]) >= 0)
+
+
+def test_precomputed_rbf_svc_matches_feature_svc(embeddings):
+    """The distance-based SVC decides like SVC(kernel='rbf') on features"""
+    from sklearn.svm import SVC
+    from model_selection import PrecomputedRBFSVC, _squared_distances
+    from sklearn.metrics.pairwise import euclidean_distances
+
+    X, y = embeddings
+    X_train, X_test, y_train = X[:150], X[150:], y[:150]
+    model = PrecomputedRBFSVC(C=10, gamma=0.05).fit(_squared_distances(X_train), y_train)
+    reference = SVC(kernel='rbf', C=10, gamma=0.05).fit(X_train, y_train)
+    D_test = euclidean_distances(X_test, X_train, squared=True)
+    assert np.allclose(model.decision_function(D_test), reference.decision_function(X_test), atol=1e-6)
+
+
+def test_run_search_returns_servable_winner(embeddings, tmp_path, monkeypatch):
+    """The search winner is refit on features and exposes predict_proba"""
+    import model_selection
+    monkeypatch.setattr(model_selection, 'CACHE_DIR', tmp_path)
+
+    X, y = embeddings
+    model, report = model_selection.run_search(
+        X, y, families=('rbf_svm', 'logreg'), strategy='grid', cv=3, n_jobs=1
+    )
+    assert report['winner']['family'] in ('rbf_svm', 'logreg')
+    assert set(report['families']) == {'rbf_svm', 'logreg'}
+    assert model.predict_proba(X).shape == (len(X), 2)
+
+
+def test_streaming_split_is_independent_of_chunk_size(embeddings, tmp_path):
+    """The hash split assigns the same rows to test whatever the chunk size"""
+    from streaming import write_embedding_shards, iter_embedding_chunks
+
+    X, y = embeddings
+    write_embedding_shards(X, y, tmp_path, shard_size=70)
+    small = np.concatenate([c for c, _ in iter_embedding_chunks(tmp_path, 16, 'test')])
+    large = np.concatenate([c for c, _ in iter_embedding_chunks(tmp_path, 1000, 'test')])
+    train_rows = sum(len(t) for _, t in iter_embedding_chunks(tmp_path, 16, 'train', val_size=0.1))
+    val_rows = sum(len(t) for _, t in iter_embedding_chunks(tmp_path, 16, 'val', val_size=0.1))
+    assert np.array_equal(small, large)
+    assert val_rows > 0
+    assert len(small) + val_rows + train_rows == len(X)
+
+
+def test_open_npz_array_memory_maps_uncompressed_members(embeddings, tmp_path):
+    """Shard arrays are memory mapped and match np.load"""
+    from streaming import open_npz_array
+
+    X, y = embeddings
+    np.savez(tmp_path / 'shard.npz', embeddings=X, labels=y)
+    mapped = open_npz_array(tmp_path / 'shard.npz', 'embeddings')
+    assert isinstance(mapped, np.memmap)
+    assert np.array_equal(mapped, X)
+
+
+def test_train_streaming_learns_separable_data(embeddings, tmp_path):
+    """SGD over chunks reaches high accuracy on separable blobs"""
+    from streaming import write_embedding_shards, train_streaming
+
+    X, y = embeddings
+    write_embedding_shards(X, y, tmp_path, shard_size=64)
+    model, scaler, X_test, y_test, history = train_streaming(tmp_path, chunk_size=32, epochs=3)
+    assert history[-1]['val_accuracy'] > 0.9
+    assert model.score(scaler.transform(X_test), y_test) > 0.9
+    assert model.predict_proba(scaler.transform(X_test)).shape == (len(y_test), 2)
+
+
+def test_train_streaming_without_validation_or_test_rows(embeddings, tmp_path):
+    """Empty validation/test splits keep the last epoch instead of crashing"""
+    from streaming import write_embedding_shards, train_streaming
+
+    X, y = embeddings
+    write_embedding_shards(np.r_[X[:6], X[-6:]], np.r_[y[:6], y[-6:]], tmp_path)
+    model, scaler, X_test, y_test, history = train_streaming(tmp_path, chunk_size=8, epochs=2,
+                                                             test_size=0.0, val_size=0.0)
+    assert len(y_test) == 0
+    assert [h['val_accuracy'] for h in history] == [None, None]
+    assert model.coef_.shape == (1, X.shape[1])
+
+
+@pytest.mark.parametrize('whiten', [True, False])
+def test_projected_scaler_equals_scaler_then_pca(embeddings, whiten):
+    """The fused affine transform reproduces StandardScaler followed by PCA"""
+    from sklearn.decomposition import PCA
+    from sklearn.preprocessing import StandardScaler
+    from projection import ProjectedScaler
+
+    X, _ = embeddings
+    scaler = ProjectedScaler(0.9, whiten=whiten).fit(X)
+    X_std = StandardScaler().fit_transform(X)
+    expected = PCA(n_components=0.9, whiten=whiten, svd_solver='full').fit(X_std).transform(X_std)
+    assert scaler.n_components_ == expected.shape[1] < X.shape[1]
+    assert scaler.explained_variance_ratio_ >= 0.9
+    assert np.allclose(scaler.transform(X), expected)
+
+
+def test_pca_dimension_prefers_the_smallest_within_tolerance(embeddings):
+    X, y = embeddings
+    chosen = train.choose_pca_dimension(X, y, 'logreg', candidates=(2, 4, 8), cv=3)
+    # Separable blobs: the smallest dimension already reaches the best accuracy
+    assert chosen == 2
+
+
+def test_train_model_writes_only_to_the_given_directories(embeddings, tmp_path, monkeypatch):
+    """A tenant run must not overwrite the shared data/test_data.npz or reports/"""
+    X, y = embeddings
+    np.savez(tmp_path / 'embeddings.npz', embeddings=X, labels=y)
+    monkeypatch.chdir(tmp_path)
+
+    tenant = {name: tmp_path / name / 'alice' for name in ('models', 'data', 'reports')}
+    train.train_model(tmp_path / 'embeddings.npz', trainer='logreg', compare=['logreg'],
+                      models_dir=tenant['models'], data_dir=tenant['data'], reports_dir=tenant['reports'])
+
+    assert (tenant['data'] / 'test_data.npz').exists()
+    assert (tenant['reports'] / 'training_report.json').exists()
+    assert not (tmp_path / 'data' / 'test_data.npz').exists()
+    assert not list((tmp_path / 'reports').glob('*.json'))
+
+
+def test_streaming_rejects_in_memory_only_options(capsys):
+    assert train.parse_args(['--streaming', '--epochs', '2']).epochs == 2
+    with pytest.raises(SystemExit):
+        train.parse_args(['--streaming', '--trainer', 'logreg', '--pca', '0.9'])
+    assert '--trainer, --pca' in capsys.readouterr().err
@@ -0,0 +1,77 @@
+"""
+Test suite for upload reading and header sniffing
+"""
+import pytest
+import sys
+from io import BytesIO
+from pathlib import Path
+import numpy as np
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from PIL import Image
+
+from api.app import app
+from api.init import model_loader
+from api.upload import ImageRejected, decode_upload, read_upload, sniff_image_header
+
+
+def encode(fmt, size, **kwargs):
+    buffer = BytesIO()
+    Image.new('RGB', size, color='red').save(buffer, format=fmt, **kwargs)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('fmt,kwargs', [
+    ('JPEG', {}),
+    ('JPEG', {'progressive': True}),
+    ('JPEG', {'exif': b'Exif\x00\x00' + b'\x00' * 2000}),
+    ('PNG', {}),
+])
+def test_sniff_reads_dimensions_from_header(fmt, kwargs):
+    data = encode(fmt, (321, 123), **kwargs)
+    assert sniff_image_header(np.frombuffer(data, np.uint8)) == (fmt.lower(), 321, 123)
+
+
+def test_sniff_rejects_other_formats():
+    assert sniff_image_header(np.frombuffer(encode('GIF', (10, 10)), np.uint8)) is None
+    assert sniff_image_header(np.frombuffer(b'not an image', np.uint8)) is None
+
+
+def test_read_upload_grows_and_reuses_thread_buffer():
+    payload = bytes(range(256)) * 4000
+    data = read_upload(BytesIO(payload), max_bytes=2 * len(payload))
+    assert data.tobytes() == payload
+    again = read_upload(BytesIO(b'abc'), max_bytes=10 * len(payload))
+    assert again.tobytes() == b'abc'
+    assert np.shares_memory(data, again)
+
+
+def test_read_upload_rejects_oversized_stream():
+    with pytest.raises(ImageRejected) as excinfo:
+        read_upload(BytesIO(b'x' * 1001), max_bytes=1000)
+    assert excinfo.value.status_code == 413
+
+
+def test_decode_reduces_large_images_and_rejects_huge_dimensions():
+    data = np.frombuffer(encode('JPEG', (2000, 1400)), np.uint8)
+    img, info = decode_upload(data, max_pixels=10_000_000, target_side=320)
+    assert info['reduction'] == 4
+    assert img.shape == (350, 500, 3)
+
+    with pytest.raises(ImageRejected) as excinfo:
+        decode_upload(data, max_pixels=1_000_000, target_side=320)
+    assert excinfo.value.status_code == 413
+
+
+def test_content_length_limit_is_enforced_before_reading(monkeypatch):
+    monkeypatch.setattr(model_loader, 'model', object())
+    monkeypatch.setattr(model_loader, 'scaler', object())
+    monkeypatch.setattr(model_loader, 'model_loaded', True)
+    monkeypatch.setattr(model_loader, 'scaler_loaded', True)
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        response = client.post('/verify',
+                               data={'image': (BytesIO(b'0' * (app.config['MAX_CONTENT_LENGTH'] + 1)), 'big.jpg')},
+                               content_type='multipart/form-data')
+    assert response.status_code == 413
+    assert 'error' in response.get_json()
@@ -0,0 +1,118 @@
+"""
+Test suite for video verification with tracking
+"""
+import pytest
+import sys
+from pathlib import Path
+import numpy as np
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+import cv2
+
+from verify_video import VideoVerifier, iou
+
+
+N_FRAMES = 90
+PATCH = 48
+
+
+def patch_position(i):
+    return 40 + 2 * i, 60 + i // 2
+
+
+@pytest.fixture
+def video(tmp_path):
+    """MJPEG clip with a textured square moving across a flat background"""
+    rng = np.random.default_rng(0)
+    patch = cv2.resize(rng.integers(0, 255, (12, 12, 3), dtype=np.uint8), (PATCH, PATCH),
+                       interpolation=cv2.INTER_NEAREST)
+    path = tmp_path / 'clip.avi'
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 30, (320, 240))
+    for i in range(N_FRAMES):
+        frame = np.full((240, 320, 3), 90, dtype=np.uint8)
+        x, y = patch_position(i)
+        frame[y:y + PATCH, x:x + PATCH] = patch
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def test_tracks_between_sparse_detections(video):
+    calls = []
+
+    def detect(gray):
+        # La posición real del frame actual, según el índice que registra el verificador
+        x, y = patch_position(verifier.current)
+        calls.append(verifier.current)
+        return [(x, y, PATCH, PATCH)]
+
+    batches = []
+
+    def embed(crops):
+        batches.append(len(crops))
+        return np.array([[crop.mean()] for crop in crops])
+
+    verifier = VideoVerifier(detect, embed, lambda X: np.full(len(X), 0.9), threshold=0.75,
+                             embed_interval=10)
+    original = verifier.process_frame
+
+    def process_frame(frame, frame_idx):
+        verifier.current = frame_idx
+        original(frame, frame_idx)
+        for track in verifier.tracks:
+            assert iou(track.box, (*patch_position(frame_idx), PATCH, PATCH)) > 0.7
+    verifier.process_frame = process_frame
+
+    capture = cv2.VideoCapture(str(video))
+    report = verifier.run(capture)
+    capture.release()
+
+    assert report['stats']['frames_processed'] == N_FRAMES
+    # El intervalo de detección crece mientras la escena es estable
+    assert len(calls) < N_FRAMES / 4
+    assert len(report['tracks']) == 1
+    track = report['tracks'][0]
+    assert track['observations'] == len(batches) >= N_FRAMES // 10
+    assert track['is_me'] and report['is_me']
+    assert report['best_track'] == track['id']
+
+
+def test_lost_track_triggers_detection_and_new_track(video):
+    detections = iter([[(40, 60, PATCH, PATCH)], [], [], []])
+    verifier = VideoVerifier(lambda gray: next(detections, []), lambda crops: np.zeros((len(crops), 1)),
+                             lambda X: np.full(len(X), 0.2))
+    empty = np.full((240, 320, 3), 90, dtype=np.uint8)
+    frame = empty.copy()
+    frame[60:60 + PATCH, 40:40 + PATCH] = np.random.default_rng(0).integers(0, 255, (PATCH, PATCH, 3))
+    verifier.process_frame(frame, 0)
+    assert len(verifier.tracks) == 1
+    # El rostro desaparece: el template ya no coincide, el track se cierra y se re-detecta enseguida
+    verifier.process_frame(empty, 1)
+    assert not verifier.tracks and verifier.next_detection == 2
+    report = verifier.report(30.0, 1.0)
+    assert report['is_me'] is False
+    assert report['tracks'][0]['score_ema'] == pytest.approx(0.2)
+
+
+def test_crops_get_the_training_preprocessing():
+    """Haar crops go through 160x160 + extract_faces like DeepFace.represent on crop_faces output"""
+    pytest.importorskip('deepface')
+    from verify_video import training_faces
+    calls = []
+
+    def extract_faces(img_path, **kwargs):
+        calls.append((img_path.shape, kwargs))
+        face = np.zeros((100, 80, 3))
+        face[..., 0] = 1.0  # canal R
+        return [{'face': face, 'facial_area': {'x': 0, 'y': 0, 'w': 80, 'h': 100}},
+                {'face': np.zeros((10, 10, 3)), 'facial_area': {'x': 0, 'y': 0, 'w': 10, 'h': 10}}]
+
+    crops = [np.zeros((70, 50, 3), dtype=np.uint8), np.zeros((300, 280, 3), dtype=np.uint8)]
+    batch = training_faces(crops, (160, 160), extract_faces=extract_faces)
+
+    assert [shape for shape, _ in calls] == [(160, 160, 3)] * 2
+    assert calls[0][1] == {'detector_backend': 'opencv', 'enforce_detection': False, 'align': True}
+    assert batch.shape == (2, 160, 160, 3)
+    # Primer rostro, convertido a BGR
+    assert batch[0, 80, 80, 2] == 1.0 and batch[0, 80, 80, 0] == 0.0
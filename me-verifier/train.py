@@ -1,23 +1,40 @@
+import argparse
+import io
+import json
+import time
 import numpy as np
 import joblib
 import sys
 from pathlib import Path
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import StratifiedKFold, cross_val_score, train_test_split
 from sklearn.preprocessing import StandardScaler
-from sklearn.svm import SVC
+from sklearn.svm import SVC, LinearSVC
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.pipeline import make_pipeline
 
 sys.path.insert(0, str(Path(__file__).parent))
 from logger import setup_logger
+from classifiers import PrototypeClassifier
+from projection import ProjectedScaler
+from quantization import decode_embeddings
 
 logger = setup_logger(__name__)
 
+# Número de componentes de las aproximaciones del kernel RBF
+KERNEL_APPROX_COMPONENTS = 1000
+# Dimensiones probadas por --pca auto y margen de precisión CV para preferir la menor
+PCA_CANDIDATES = (8, 16, 24, 32, 48, 64, 96)
+PCA_CV_TOLERANCE = 0.005
+
 
 def load_embeddings(embeddings_file='data/embeddings.npz'):
     try:
         logger.info(f"Cargando embeddings desde: {embeddings_file}")
         data = np.load(embeddings_file)
-        X = data['embeddings']
+        X = decode_embeddings(data)
         y = data['labels']
         logger.info(f"Se cargaron {len(X)} muestras")
         logger.info(f"Muestras positivas (yo): {sum(y == 1)}")
@@ -46,12 +63,19 @@ def split_data(X, y, test_size=0.2, random_state=42):
         raise
 
 
-def scale_data(X_train, X_test):
+def scale_data(X_train, X_test, pca=None, whiten=True):
+    """
+    StandardScaler, o con `pca` (componentes o fracción de varianza) el
+    escalador fusionado con la proyección PCA de projection.py
+    """
     try:
         logger.info("Escalando datos...")
-        scaler = StandardScaler()
+        scaler = StandardScaler() if pca is None else ProjectedScaler(pca, whiten=whiten)
         X_train_scaled = scaler.fit_transform(X_train)
         X_test_scaled = scaler.transform(X_test)
+        if pca is not None:
+            logger.info(f"Proyección PCA{' con blanqueo' if whiten else ''}: {scaler.n_features_in_} -> "
+                        f"{scaler.n_components_} dimensiones ({scaler.explained_variance_ratio_:.1%} de la varianza)")
         logger.debug("Datos escalados exitosamente")
         return X_train_scaled, X_test_scaled, scaler
     except Exception as e:
@@ -72,6 +96,124 @@ def train_svm_model(X_train_scaled, y_train):
         raise
 
 
+def build_classifier(trainer, n_features, random_state=42):
+    """
+    Construye el clasificador indicado. Todos exponen predict/predict_proba,
+    por lo que la API los sirve igual que al SVC.
+    """
+    # Mismo gamma que SVC(gamma='scale') sobre datos estandarizados
+    gamma = 1.0 / n_features
+    if trainer == 'svm':
+        return SVC(kernel='rbf', probability=True, random_state=random_state)
+    if trainer == 'linear_svm':
+        return CalibratedClassifierCV(LinearSVC(C=1.0, random_state=random_state), cv=3)
+    if trainer == 'logreg':
+        return LogisticRegression(max_iter=1000, random_state=random_state)
+    if trainer == 'nystroem':
+        return make_pipeline(
+            Nystroem(kernel='rbf', gamma=gamma, n_components=KERNEL_APPROX_COMPONENTS, random_state=random_state),
+            LogisticRegression(max_iter=1000, random_state=random_state)
+        )
+    if trainer == 'rff':
+        return make_pipeline(
+            RBFSampler(gamma=gamma, n_components=KERNEL_APPROX_COMPONENTS, random_state=random_state),
+            LogisticRegression(max_iter=1000, random_state=random_state)
+        )
+    if trainer == 'prototype':
+        return PrototypeClassifier()
+    raise ValueError(f"Entrenador desconocido: {trainer}")
+
+
+TRAINERS = ('svm', 'linear_svm', 'logreg', 'nystroem', 'rff', 'prototype')
+
+
+def train_classifier(X_train_scaled, y_train, trainer='svm'):
+    if trainer == 'svm':
+        return train_svm_model(X_train_scaled, y_train)
+    try:
+        logger.info(f"Entrenando modelo '{trainer}'...")
+        model = build_classifier(trainer, X_train_scaled.shape[1])
+        # Nystroem no puede tener más componentes que muestras
+        if trainer == 'nystroem':
+            model.set_params(nystroem__n_components=min(KERNEL_APPROX_COMPONENTS, len(X_train_scaled)))
+        model.fit(X_train_scaled, y_train)
+        logger.info(f"Modelo '{trainer}' entrenado exitosamente")
+        return model
+    except Exception as e:
+        logger.error(f"Error entrenando modelo '{trainer}': {e}")
+        raise
+
+
+def choose_pca_dimension(X_train, y_train, trainer='svm', candidates=PCA_CANDIDATES, whiten=True, cv=5,
+                         tolerance=PCA_CV_TOLERANCE, random_state=42):
+    """
+    Menor dimensión cuya precisión CV queda a `tolerance` de la mejor,
+    comparando también con la dimensión completa sin proyección (None).
+    """
+    n_features = X_train.shape[1]
+    splitter = StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state)
+    max_components = min(n_features, len(X_train) - len(X_train) // cv)
+    scores = {}
+    for n_components in [k for k in candidates if k < max_components] + [None]:
+        scaler = StandardScaler() if n_components is None else ProjectedScaler(n_components, whiten=whiten)
+        classifier = build_classifier(trainer, n_components or n_features, random_state)
+        if trainer == 'nystroem':
+            classifier.set_params(nystroem__n_components=min(KERNEL_APPROX_COMPONENTS, max_components))
+        pipeline = make_pipeline(scaler, classifier)
+        scores[n_components] = float(cross_val_score(pipeline, X_train, y_train, cv=splitter).mean())
+        logger.info(f"PCA {n_components or n_features} dimensiones: precisión CV {scores[n_components]:.4f}")
+
+    best = max(scores.values())
+    chosen = min((k for k, score in scores.items() if score >= best - tolerance),
+                 key=lambda k: n_features if k is None else k)
+    logger.info(f"Dimensión elegida: {chosen or n_features} (mejor precisión CV {best:.4f})")
+    return chosen
+
+
+def compare_trainers(trainers, X_train_scaled, X_test_scaled, y_train, y_test, reports_dir='reports'):
+    """Entrena cada clasificador sobre la misma partición y guarda tiempo vs. precisión"""
+    logger.info(f"=== Comparando entrenadores: {', '.join(trainers)} ===")
+    results = []
+    for trainer in trainers:
+        start = time.perf_counter()
+        model = train_classifier(X_train_scaled, y_train, trainer)
+        train_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        test_score = model.score(X_test_scaled, y_test)
+        predict_time = time.perf_counter() - start
+
+        results.append({
+            'trainer': trainer,
+            'train_time_s': round(train_time, 4),
+            'predict_time_ms_per_sample': round(predict_time * 1000 / max(len(X_test_scaled), 1), 4),
+            'train_accuracy': round(float(model.score(X_train_scaled, y_train)), 4),
+            'test_accuracy': round(float(test_score), 4),
+            'model_size_kb': round(len(_serialized(model)) / 1024, 1),
+        })
+        logger.info(f"{trainer}: {train_time:.3f}s - precisión en prueba {test_score:.4f}")
+
+    report = {
+        'train_samples': int(len(X_train_scaled)),
+        'test_samples': int(len(X_test_scaled)),
+        'n_features': int(X_train_scaled.shape[1]),
+        'results': results,
+    }
+    reports_path = Path(reports_dir)
+    reports_path.mkdir(exist_ok=True, parents=True)
+    report_file = reports_path / 'training_report.json'
+    with open(report_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Reporte de entrenamiento guardado en: {report_file}")
+    return report
+
+
+def _serialized(model):
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.getvalue()
+
+
 def evaluate_model(model, X_train_scaled, X_test_scaled, y_train, y_test):
     try:
         logger.info("Evaluando modelo...")
@@ -99,11 +241,37 @@ def save_model(model, scaler, models_dir='models'):
         joblib.dump(scaler, scaler_file)
         logger.info(f"Modelo guardado en: {model_file}")
         logger.info(f"Escalador guardado en: {scaler_file}")
+        # Copia mapeable en memoria para los workers de la API (si el modelo lo permite)
+        from artifacts import export_serving_artifacts, file_digest
+        sources = {'model': file_digest(model_file), 'scaler': file_digest(scaler_file)}
+        export_serving_artifacts(model, scaler, models_path / 'serving', sources)
     except Exception as e:
         logger.error(f"Error guardando modelo: {e}")
         raise
 
 
+def save_fast_path(model, X_train_scaled, y_train, models_dir='models'):
+    """Prototipos y banda de incertidumbre para la vía rápida de la API (fast_path.py)"""
+    if not hasattr(model, 'predict_proba'):
+        logger.info("El modelo no tiene predict_proba; se omite la vía rápida")
+        return None
+    try:
+        from artifacts import file_digest
+        from evaluate import serving_threshold
+        from fast_path import calibrate_prototypes, save_prototypes
+        
+        threshold = serving_threshold()
+        if threshold is None:
+            logger.warning("Umbral de la API no disponible; se omite la vía rápida")
+            return None
+        prototypes = calibrate_prototypes(model, X_train_scaled, y_train, threshold)
+        model_file = Path(models_dir) / 'model.joblib'
+        return save_prototypes(prototypes, models_dir, file_digest(model_file))
+    except Exception as e:
+        logger.error(f"Error calibrando la vía rápida: {e}")
+        raise
+
+
 def save_test_data(X_test, y_test, data_dir='data'):
     try:
         logger.info("Guardando datos de prueba...")
@@ -118,17 +286,47 @@ def save_test_data(X_test, y_test, data_dir='data'):
         raise
 
 
-def train_model(embeddings_file='data/embeddings.npz'):
+def remove_near_duplicates(X, y, max_cosine_distance, reports_dir='reports'):
+    """Deja un representante por grupo de casi duplicados antes de dividir (evita fugas train/test)"""
+    from dedup import dedup_embeddings, save_report
+    keep, report = dedup_embeddings(X, y, max_cosine_distance)
+    logger.info(f"Casi duplicados eliminados: {int((~keep).sum())} de {len(y)} "
+                f"(distancia coseno <= {max_cosine_distance})")
+    save_report(report, 'dedup_embeddings.json', reports_dir)
+    return X[keep], y[keep]
+
+
+def train_model(embeddings_file='data/embeddings.npz', trainer='svm', compare=None, search=None,
+                search_options=None, dedup_threshold=None, models_dir='models', pca=None, whiten=True,
+                data_dir='data', reports_dir='reports'):
     logger.info("=== Iniciando entrenamiento del modelo ===")
     
     try:
         X, y = load_embeddings(embeddings_file)
+        if dedup_threshold:
+            X, y = remove_near_duplicates(X, y, dedup_threshold, reports_dir)
         X_train, X_test, y_train, y_test = split_data(X, y)
-        X_train_scaled, X_test_scaled, scaler = scale_data(X_train, X_test)
-        model = train_svm_model(X_train_scaled, y_train)
-        evaluate_model(model, X_train_scaled, X_test_scaled, y_train, y_test)
-        save_model(model, scaler)
-        save_test_data(X_test, y_test)
+        if pca == 'auto':
+            pca = choose_pca_dimension(X_train, y_train, trainer, whiten=whiten)
+        X_train_scaled, X_test_scaled, scaler = scale_data(X_train, X_test, pca, whiten)
+        if compare:
+            compare_trainers(compare, X_train_scaled, X_test_scaled, y_train, y_test, reports_dir)
+        search_report = None
+        if search:
+            from model_selection import run_search
+            model, search_report = run_search(
+                X_train_scaled, y_train, strategy=search, **(search_options or {})
+            )
+        else:
+            model = train_classifier(X_train_scaled, y_train, trainer)
+        _, test_score = evaluate_model(model, X_train_scaled, X_test_scaled, y_train, y_test)
+        save_model(model, scaler, models_dir)
+        save_fast_path(model, X_train_scaled, y_train, models_dir)
+        if search_report is not None:
+            from model_selection import save_search_report
+            search_report['winner']['test_accuracy'] = round(float(test_score), 4)
+            save_search_report(search_report, models_dir)
+        save_test_data(X_test, y_test, data_dir)
         logger.info("=== Entrenamiento completado exitosamente ===")
         return model, scaler
     except Exception as e:
@@ -136,11 +334,116 @@ def train_model(embeddings_file='data/embeddings.npz'):
         raise
 
 
+def train_model_streaming(embeddings_path, chunk_size=65536, epochs=5, max_test_samples=100000,
+                          models_dir='models', data_dir='data', reports_dir='reports'):
+    """Entrenamiento con memoria acotada sobre un .npz o un directorio de shards"""
+    from streaming import train_streaming, save_history
+    logger.info("=== Iniciando entrenamiento en streaming ===")
+    
+    try:
+        model, scaler, X_test, y_test, history = train_streaming(
+            embeddings_path, chunk_size=chunk_size, epochs=epochs,
+            max_test_samples=max_test_samples
+        )
+        save_model(model, scaler, models_dir)
+        if len(y_test):
+            save_test_data(X_test, y_test, data_dir)
+        save_history(history, reports_dir)
+        logger.info("=== Entrenamiento completado exitosamente ===")
+        return model, scaler
+    except Exception as e:
+        logger.error(f"Error en el entrenamiento en streaming: {e}")
+        raise
+
+
+def pca_argument(value):
+    if value == 'auto':
+        return value
+    number = float(value)
+    if 0 < number < 1:
+        return number
+    if number >= 1 and number.is_integer():
+        return int(number)
+    raise argparse.ArgumentTypeError(f"--pca espera un entero >= 1, una fracción en (0, 1) o 'auto': {value}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Entrenamiento del verificador")
+    parser.add_argument('--embeddings', default='data/embeddings.npz')
+    parser.add_argument('--trainer', choices=TRAINERS, default='svm',
+                        help="Clasificador a entrenar y guardar (svm es O(n^2)-O(n^3))")
+    parser.add_argument('--compare', nargs='*', choices=TRAINERS,
+                        help="Compara entrenadores (todos si no se indican) y escribe "
+                             "reports/training_report.json")
+    parser.add_argument('--search', choices=('grid', 'random'),
+                        help="Selección de modelo: búsqueda CV con successive halving en paralelo")
+    parser.add_argument('--families', nargs='+', choices=('rbf_svm', 'logreg', 'random_forest'),
+                        default=['rbf_svm', 'logreg', 'random_forest'])
+    parser.add_argument('--n-candidates', type=int, default=20,
+                        help="Candidatos iniciales por familia en la búsqueda aleatoria")
+    parser.add_argument('--cv', type=int, default=5)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--dedup-threshold', type=float,
+                        help="Elimina embeddings casi duplicados (distancia coseno) antes de dividir")
+    parser.add_argument('--pca', type=pca_argument,
+                        help="Proyección PCA tras el escalador: nº de componentes, fracción de varianza "
+                             "(p. ej. 0.95) o 'auto' (elige por precisión CV)")
+    parser.add_argument('--no-whiten', action='store_true', help="PCA sin blanqueo")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Entrenamiento out-of-core (SGD) desde un .npz o directorio de shards")
+    parser.add_argument('--chunk-size', type=int, default=65536)
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--max-test-samples', type=int, default=100000)
+    parser.add_argument('--tenant',
+                        help="Guarda el modelo en models/<tenant>/, los datos de prueba en data/<tenant>/ "
+                             "y los reportes en reports/<tenant>/ (verificación multi-tenant en la API)")
+    return parser
+
+
+# Opciones del entrenamiento en memoria que --streaming (SGD por chunks) no usa
+STREAMING_INCOMPATIBLE = ('trainer', 'compare', 'search', 'dedup_threshold', 'pca', 'no_whiten')
+
+
+def parse_args(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.streaming:
+        ignored = [f"--{dest.replace('_', '-')}" for dest in STREAMING_INCOMPATIBLE
+                   if getattr(args, dest) != parser.get_default(dest)]
+        if ignored:
+            parser.error(f"--streaming no admite {', '.join(ignored)}")
+    return args
+
+
 if __name__ == '__main__':
     logger.info("Iniciando script de entrenamiento")
+    args = parse_args()
     
     try:
-        train_model()
+        models_dir, data_dir, reports_dir = 'models', 'data', 'reports'
+        if args.tenant:
+            from artifacts import is_valid_tenant_id
+            if not is_valid_tenant_id(args.tenant):
+                raise ValueError(f"Tenant inválido: {args.tenant}")
+            # Nada compartido: otro tenant no pisa el conjunto de prueba ni los reportes
+            models_dir, data_dir, reports_dir = (str(Path(base) / args.tenant)
+                                                 for base in (models_dir, data_dir, reports_dir))
+        if args.streaming:
+            train_model_streaming(args.embeddings, args.chunk_size, args.epochs, args.max_test_samples,
+                                  models_dir=models_dir, data_dir=data_dir, reports_dir=reports_dir)
+        else:
+            compare = None if args.compare is None else (args.compare or list(TRAINERS))
+            search_options = {
+                'families': args.families,
+                'n_candidates': args.n_candidates,
+                'cv': args.cv,
+                'n_jobs': args.n_jobs,
+            }
+            train_model(args.embeddings, trainer=args.trainer, compare=compare,
+                        search=args.search, search_options=search_options,
+                        dedup_threshold=args.dedup_threshold, models_dir=models_dir,
+                        pca=args.pca, whiten=not args.no_whiten, data_dir=data_dir,
+                        reports_dir=reports_dir)
         logger.info("Script completado exitosamente")
     except Exception as e:
         logger.error(f"Error en el script: {e}")